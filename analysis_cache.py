@@ -0,0 +1,191 @@
+"""
+Persistent engine analysis cache shared across sessions.
+
+Stockfish results are stored in SQLite keyed by (normalized FEN, engine id, search limit, multipv), so
+positions that were analysed before (openings, reviewed games) come back in microseconds instead of costing
+another engine call. Lookups go to a small in-memory LRU first and then to the database. Writes are queued
+and committed in batches by a background thread, which also evicts the least recently used rows once the
+cache grows past `max_entries`.
+"""
+import collections
+import json
+import sqlite3
+import threading
+import time
+
+import telemetry
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analysis (
+    fen TEXT NOT NULL,
+    engine TEXT NOT NULL,
+    lim TEXT NOT NULL,
+    multipv INTEGER NOT NULL,
+    result TEXT NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (fen, engine, lim, multipv)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS analysis_last_used ON analysis (last_used);
+"""
+MATE_SCORE = 10000  # centipawn value used for mate scores, as in GameState.get_eval
+
+
+def normalize_fen(board):
+    """Position part of the FEN only: move clocks do not change the analysis, and ep only when capturable."""
+    return " ".join(board.fen(en_passant='legal').split()[:4])
+
+
+def limit_key(limit):
+    """A stable text form of a chess.engine.Limit, e.g. 'depth=20' or 'time=0.1'."""
+    fields = [f"{name}={value}" for name, value in sorted(vars(limit).items()) if value is not None]
+    return ",".join(fields)
+
+
+def full_strength_id(engine):
+    """Engine id of an engine at its default (full) strength, keyed like GameState.engine_id at Skill Level 20."""
+    return f"{engine.id.get('name', 'stockfish')}|skill=20"
+
+
+def lines_from_info(infos):
+    """
+    Converts python-chess analysis info dicts to the cached form.
+
+    :return: list of {'cp', 'mate', 'depth', 'pv'} with scores relative to the side to move.
+    """
+    if isinstance(infos, dict):
+        infos = [infos]
+    lines = []
+    for info in infos:
+        score = info["score"].relative
+        lines.append({'cp': score.score(mate_score=MATE_SCORE), 'mate': score.mate(), 'depth': info.get('depth'),
+                      'pv': [move.uci() for move in info.get('pv', [])]})
+    return lines
+
+
+class AnalysisCache:
+    def __init__(self, path, max_entries=500_000, flush_interval=0.5, memory_entries=4096):
+        """
+        :param path: SQLite database file.
+        :param max_entries: Rows kept before the least recently used ones are evicted.
+        :param flush_interval: Seconds between batched writes.
+        :param memory_entries: Size of the in-memory LRU in front of the database.
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.flush_interval = flush_interval
+        self.memory_entries = memory_entries
+        self.hits = self.misses = 0
+
+        self._memory = collections.OrderedDict()
+        self._pending = {}    # key -> (result json, last_used) waiting to be written
+        self._touched = {}    # key -> last_used of rows read from the database
+        self._lock = threading.Lock()
+        self._reader = sqlite3.connect(path, check_same_thread=False)
+        self._reader.executescript("PRAGMA journal_mode=WAL;" + SCHEMA)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="analysis-cache", daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def key(board, engine_id, limit, multipv=1):
+        return normalize_fen(board), engine_id, limit_key(limit), multipv
+
+    def get(self, board, engine_id, limit, multipv=1):
+        """:return: cached lines (see lines_from_info) or None."""
+        key = self.key(board, engine_id, limit, multipv)
+        with self._lock:
+            lines = self._memory.get(key)
+            if lines is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return lines
+            row = self._reader.execute("SELECT result FROM analysis WHERE fen=? AND engine=? AND lim=? AND multipv=?",
+                                       key).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            lines = json.loads(row[0])
+            self._remember(key, lines)
+            self._touched[key] = time.time()
+            return lines
+
+    def put(self, board, engine_id, limit, multipv, lines):
+        key = self.key(board, engine_id, limit, multipv)
+        with self._lock:
+            self._remember(key, lines)
+            self._pending[key] = (json.dumps(lines, separators=(',', ':')), time.time())
+
+    def _remember(self, key, lines):
+        self._memory[key] = lines
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / lookups if lookups else 0.0,
+                'memory_entries': len(self._memory)}
+
+    # Writer thread
+    def _run(self):
+        writer = sqlite3.connect(self.path)
+        try:
+            while not self._stop.wait(self.flush_interval):
+                self._flush(writer)
+            self._flush(writer)
+        finally:
+            writer.close()
+
+    def _flush(self, writer):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            touched, self._touched = self._touched, {}
+        if not pending and not touched:
+            return
+        with writer:
+            writer.executemany("INSERT OR REPLACE INTO analysis VALUES (?, ?, ?, ?, ?, ?)",
+                               [key + value for key, value in pending.items()])
+            writer.executemany("UPDATE analysis SET last_used=? WHERE fen=? AND engine=? AND lim=? AND multipv=?",
+                               [(used,) + key for key, used in touched.items()])
+        if pending:
+            self._evict(writer)
+
+    def _evict(self, writer):
+        (count,) = writer.execute("SELECT COUNT(*) FROM analysis").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            with writer:
+                writer.execute("DELETE FROM analysis WHERE (fen, engine, lim, multipv) IN "
+                               "(SELECT fen, engine, lim, multipv FROM analysis ORDER BY last_used LIMIT ?)", (excess,))
+
+    def close(self):
+        """Writes everything still pending and stops the writer thread."""
+        self._stop.set()
+        self._thread.join()
+        self._reader.close()
+
+
+def analyse(engine, board, limit, multipv=1, cache=None, engine_id=None):
+    """
+    Analyses a position, consulting the cache before calling the engine.
+
+    :param engine: chess.engine.SimpleEngine.
+    :param cache: Optional AnalysisCache.
+    :param engine_id: Cache key part identifying the engine and its options (default: the engine's name).
+    :return: list of lines (see lines_from_info), best first.
+    """
+    if engine_id is None:
+        engine_id = engine.id.get('name', 'engine')
+    if cache is not None:
+        lines = cache.get(board, engine_id, limit, multipv)
+        if lines is not None:
+            return lines
+    with telemetry.span("engine.analyse"):
+        infos = engine.analyse(board, limit, multipv=multipv if multipv > 1 else None)
+    telemetry.record_engine_info(infos[0] if isinstance(infos, list) else infos)
+    lines = lines_from_info(infos)
+    if cache is not None:
+        cache.put(board, engine_id, limit, multipv, lines)
+    return lines
@@ -0,0 +1,158 @@
+"""
+Pre-scaled sprite atlases for the chess piece sets.
+
+Decoding the 1024px source PNGs and scaling them down is by far the slowest part of startup,
+so every (piece set, square size) pair is packed once into a single atlas and cached on disk.
+The cache is keyed by the mtime and size of every source image, so replacing an image rebuilds it.
+"""
+import json
+import os
+import struct
+
+import pygame as pg
+
+
+CACHE_DIR = ".cache/sprites"
+ATLAS_MAGIC = b"CATL"
+ATLAS_VERSION = 1
+
+# piece name -> image file, per piece set. Piece names match the keys of `pieces` in chess_main_v2
+PIECE_SETS = {
+    'option2': ("assets/images/option2/1024px",
+                {name: name + ".png" for name in ('wP', 'wR', 'wN', 'wB', 'wQ', 'wK',
+                                                  'bP', 'bR', 'bN', 'bB', 'bQ', 'bK')}),
+    'option1': ("assets/images/option1",
+                {color[0] + letter: f"{color} {piece}.png"
+                 for color in ('white', 'black')
+                 for letter, piece in (('P', 'pawn'), ('R', 'rook'), ('N', 'knight'),
+                                       ('B', 'bishop'), ('Q', 'queen'), ('K', 'king'))}),
+}
+
+PAWN_SCALE = 0.8   # pawns are slightly smaller
+PIECE_SCALE = 0.9  # chess pieces are slightly bigger
+
+
+def piece_symbol(name):
+    """Converts a piece name ('wP', 'bK') to the python-chess symbol used as IMAGES key ('P', 'k')."""
+    return name[1] if name[0] == 'w' else name[1].lower()
+
+
+def sprite_size(name, sq_size):
+    scale = PAWN_SCALE if name[1] == 'P' else PIECE_SCALE
+    return int(sq_size * scale), int(sq_size * scale)
+
+
+def source_key(set_name, sq_size):
+    """
+    Builds the cache key for a piece set: square size plus mtime and size of every source image.
+
+    :return: A dict that is stored in the atlas header and compared on load.
+    """
+    directory, files = PIECE_SETS[set_name]
+    sources = {}
+    for name, filename in sorted(files.items()):
+        stat = os.stat(os.path.join(directory, filename))
+        sources[name] = [stat.st_mtime_ns, stat.st_size]
+    return {'version': ATLAS_VERSION, 'set': set_name, 'sq_size': sq_size, 'sources': sources}
+
+
+def atlas_path(set_name, sq_size, cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, f"{set_name}_{sq_size}.atlas")
+
+
+def build_atlas(set_name, sq_size):
+    """
+    Decodes and scales every source image of a piece set and packs them side by side into one surface.
+
+    :return: (atlas surface, {piece name: (x, y, w, h)})
+    """
+    directory, files = PIECE_SETS[set_name]
+    cell = int(sq_size * PIECE_SCALE)
+    atlas = pg.Surface((cell * len(files), cell), pg.SRCALPHA)
+    rects = {}
+    for i, (name, filename) in enumerate(sorted(files.items())):
+        size = sprite_size(name, sq_size)
+        image = pg.image.load(os.path.join(directory, filename))
+        atlas.blit(pg.transform.scale(image, size), (i * cell, 0))
+        rects[name] = (i * cell, 0, size[0], size[1])
+    return atlas, rects
+
+
+def write_atlas(path, atlas, rects, key):
+    """Writes the atlas as raw RGBA pixels behind a small JSON header, so loading it needs no PNG decode."""
+    header = json.dumps({'key': key, 'size': atlas.get_size(), 'rects': rects}).encode()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(ATLAS_MAGIC + struct.pack('<I', len(header)) + header)
+        f.write(pg.image.tobytes(atlas, 'RGBA'))
+    os.replace(tmp_path, path)  # never leave a half written atlas behind
+
+
+def read_atlas(path, key):
+    """
+    Reads a cached atlas.
+
+    :return: (atlas surface, rects) or None if the file is missing, corrupt or was built from other sources.
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    if data[:4] != ATLAS_MAGIC or len(data) < 8:
+        return None
+    (header_len,) = struct.unpack_from('<I', data, 4)
+    try:
+        header = json.loads(data[8:8 + header_len])
+    except ValueError:
+        return None
+    if header.get('key') != key:
+        return None
+    width, height = header['size']
+    pixels = data[8 + header_len:]
+    if len(pixels) != width * height * 4:
+        return None
+    atlas = pg.image.frombytes(pixels, (width, height), 'RGBA')
+    return atlas, {name: tuple(rect) for name, rect in header['rects'].items()}
+
+
+def load_piece_set(set_name='option2', sq_size=80, cache_dir=CACHE_DIR):
+    """
+    Loads a piece set as sprites cut out of its cached atlas, building the atlas first if needed.
+
+    :param set_name: Key of PIECE_SETS (e.g. 'option2').
+    :param sq_size: Size of a board square in pixels.
+    :return: Dict of piece symbol ('P', 'k', ...) -> subsurface of the atlas.
+    """
+    key = source_key(set_name, sq_size)
+    path = atlas_path(set_name, sq_size, cache_dir)
+    cached = read_atlas(path, key)
+    if cached is None:
+        atlas, rects = build_atlas(set_name, sq_size)
+        try:
+            write_atlas(path, atlas, rects, key)
+        except OSError as e:  # a read-only install still works, it just starts slower
+            print(f"Could not write sprite atlas cache: {e}")
+    else:
+        atlas, rects = cached
+    if pg.display.get_surface() is not None:  # convert_alpha needs a display mode
+        atlas = atlas.convert_alpha()
+    return {piece_symbol(name): atlas.subsurface(rect) for name, rect in rects.items()}
+
+
+class PieceSets:
+    """Lazily loaded piece sets: a set's atlas is only read the first time the set is requested."""
+
+    def __init__(self, sq_size, cache_dir=CACHE_DIR):
+        self.sq_size = sq_size
+        self.cache_dir = cache_dir
+        self._loaded = {}
+
+    def __getitem__(self, set_name):
+        if set_name not in self._loaded:
+            self._loaded[set_name] = load_piece_set(set_name, self.sq_size, self.cache_dir)
+        return self._loaded[set_name]
+
+    def is_loaded(self, set_name):
+        return set_name in self._loaded
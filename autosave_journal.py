@@ -0,0 +1,161 @@
+"""
+Crash-safe autosave journal.
+
+Every move, AI move, promotion and undo is appended to a write-ahead journal as a small record. Recording
+only appends to an in-memory list; a background thread writes the pending records in one go and fsyncs
+every `flush_interval_ms`, so persistence never stalls a frame. After a crash the last unfinished game is
+rebuilt by replaying the journal. When a game ends (or a new one starts) the journal is rotated: the old
+file is kept as <path>.prev and a fresh, compact journal is started.
+
+Record: kind u8 | payload length u16 | payload | crc32 u32 (of everything before it)
+"""
+import os
+import struct
+import threading
+import zlib
+
+import chess
+
+import save_format
+
+
+START, MOVE, AI_MOVE, PROMOTION, UNDO, END = 1, 2, 3, 4, 5, 6
+RECORD_HEADER = struct.Struct('<BH')
+CRC = struct.Struct('<I')
+_ROTATE = object()  # queued marker: rotate the journal file at this point
+
+
+def encode_record(kind, payload=b""):
+    body = RECORD_HEADER.pack(kind, len(payload)) + payload
+    return body + CRC.pack(zlib.crc32(body))
+
+
+def read_records(path):
+    """
+    Reads a journal up to the first torn or corrupt record.
+
+    :return: list of (kind, payload)
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return []
+    records = []
+    position = 0
+    while position + RECORD_HEADER.size + CRC.size <= len(data):
+        kind, length = RECORD_HEADER.unpack_from(data, position)
+        end = position + RECORD_HEADER.size + length
+        if end + CRC.size > len(data):
+            break
+        (crc,) = CRC.unpack_from(data, end)
+        if crc != zlib.crc32(data[position:end]):
+            break
+        records.append((kind, data[position + RECORD_HEADER.size:end]))
+        position = end + CRC.size
+    return records
+
+
+def recover(path):
+    """
+    Finds the last game in a journal and replays it.
+
+    :return: (starting FEN, list of chess.Move) of an unfinished game, or None if the last game ended
+             or the journal is empty.
+    """
+    start_fen, moves, finished = None, [], True
+    for kind, payload in read_records(path):
+        if kind == START:
+            start_fen, moves, finished = payload.decode(), [], False
+        elif kind in (MOVE, AI_MOVE, PROMOTION):
+            moves.append(save_format.unpack_move(struct.unpack('<H', payload)[0]))
+        elif kind == UNDO and moves:
+            moves.pop()
+        elif kind == END:
+            finished = True
+    if start_fen is None or finished:
+        return None
+    return start_fen, moves
+
+
+class Journal:
+    def __init__(self, path, flush_interval_ms=200):
+        """
+        Opens a journal for appending and starts its writer thread.
+
+        :param flush_interval_ms: How often pending records are written and fsynced.
+        """
+        self.path = path
+        self.flush_interval = flush_interval_ms / 1000
+        self._pending = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._file = open(path, 'ab')
+        self._thread = threading.Thread(target=self._run, name="autosave-journal", daemon=True)
+        self._thread.start()
+
+    # Recording (called from the game loop, never blocks on I/O)
+    def _append(self, *items):
+        with self._lock:
+            self._pending.extend(items)
+
+    def start_game(self, start_fen=chess.STARTING_FEN, moves=()):
+        """Rotates the journal and records a new game, including moves already played (e.g. a loaded game)."""
+        records = [encode_record(START, start_fen.encode())]
+        records += [encode_record(MOVE, struct.pack('<H', save_format.pack_move(move))) for move in moves]
+        self._append(_ROTATE, *records)
+
+    def move(self, move, kind=MOVE):
+        self._append(encode_record(kind, struct.pack('<H', save_format.pack_move(move))))
+
+    def ai_move(self, move):
+        self.move(move, AI_MOVE)
+
+    def promotion(self, move):
+        self.move(move, PROMOTION)
+
+    def undo(self):
+        self._append(encode_record(UNDO))
+
+    def end_game(self, result="*"):
+        """Marks the game as finished and rotates the journal, so it is not offered for recovery."""
+        self._append(encode_record(END, result.encode()), _ROTATE)
+
+    # Writer thread
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self._flush()
+        self._flush()
+
+    def _flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return
+        batch = []
+        for item in pending:
+            if item is _ROTATE:
+                self._write(batch)
+                batch = []
+                self._rotate()
+            else:
+                batch.append(item)
+        self._write(batch)
+
+    def _write(self, batch):
+        if batch:
+            self._file.write(b"".join(batch))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def _rotate(self):
+        self._file.close()
+        if os.path.getsize(self.path):
+            os.replace(self.path, self.path + ".prev")
+        self._file = open(self.path, 'ab')
+
+    def close(self):
+        """Writes everything still pending and stops the writer thread."""
+        self._stop.set()
+        self._thread.join()
+        self._file.close()
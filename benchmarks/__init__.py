@@ -0,0 +1,4 @@
+"""
+Benchmarks for the chess GUI and engine wrapper. Run from the repository root, e.g.
+python -m benchmarks.bench_startup
+"""
@@ -0,0 +1,57 @@
+"""
+Measures import time of the headless core and of the GUI frontend with `python -X importtime`.
+
+headless: chess_engine_v2 (GameState), what servers and tools import.
+gui: chess_main_v2 plus initGUI(), what the game window needs before its first frame.
+
+Each path runs in a fresh interpreter a few times and the fastest run is kept. The modules with the
+largest own import time in that run are listed, so regressions (a top-level import of pygame_gui, numpy
+or chess.engine) are easy to spot.
+"""
+import os
+import subprocess
+import sys
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PATHS = {
+    'headless': "import chess_engine_v2",
+    'gui': "import chess_main_v2; chess_main_v2.initGUI()",
+}
+
+
+def import_times(code):
+    """
+    Runs code in a fresh interpreter with -X importtime.
+
+    :return: (total microseconds, list of (own microseconds, module name) heaviest first)
+    """
+    env = dict(os.environ, SDL_VIDEODRIVER="dummy", SDL_AUDIODRIVER="dummy", PYGAME_HIDE_SUPPORT_PROMPT="1")
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    total = 0
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        modules.append((int(own), name.strip()))
+        if not name.startswith("  "):  # nested imports are indented below the module that imports them
+            total += int(cumulative)
+    modules.sort(reverse=True)
+    return total, modules
+
+
+def main(repeat=5, top=8):
+    results = {}
+    for path, code in PATHS.items():
+        total, modules = min(import_times(code) for _ in range(repeat))
+        results[path] = total / 1e6
+        print(f"{path}: {total / 1000:8.2f} ms")
+        for us, name in modules[:top]:
+            print(f"    {us / 1000:8.2f} ms  {name}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Per-move cost of updating the move list panel as a game grows to thousands of plies.
+
+legacy: rebuild the whole HTML move string and UITextBox.set_text, as drawText did before.
+panel: MoveListPanel.sync + draw, which only touches the last row.
+"""
+import os
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame as pg
+import pygame_gui as pgui
+
+import move_list_panel
+
+SAN_CYCLE = ["Nf3", "Nf6", "Ng1", "Ng8"]  # a legal (if dull) game of any length
+RECT = pg.Rect(650, 10, 300, 300)
+
+
+def legacy_move_string(move_log):
+    move_list = []
+    line = ""
+    for i, move in enumerate(move_log):
+        line += f"<b>{i // 2 + 1}.</b> {move} " if i % 2 == 0 else f"{move}  "
+        if (i + 1) % 6 == 0:
+            move_list.append(line.strip())
+            line = ""
+    if line:
+        move_list.append(line.strip())
+    return "\n".join(move_list)
+
+
+def main(plies=3000, checkpoints=(100, 500, 1000, 2000, 3000), legacy_limit=1000):
+    pg.init()
+    screen = pg.display.set_mode((960, 720))
+    manager = pgui.UIManager((960, 720))
+    textbox = pgui.elements.UITextBox("", relative_rect=RECT, manager=manager)
+    panel = move_list_panel.MoveListPanel(RECT, pg.font.SysFont('arial', 18), pg.font.SysFont('arial', 18, True))
+
+    move_log = []
+    print(f"{'ply':>6} {'legacy ms':>10} {'panel ms':>9}")
+    for ply in range(1, plies + 1):
+        move_log.append(SAN_CYCLE[ply % len(SAN_CYCLE)])
+        legacy_ms = None
+        if ply <= legacy_limit:  # the legacy path gets too slow to run to the end
+            start = time.perf_counter()
+            textbox.set_text(legacy_move_string(move_log))
+            manager.update(0)
+            legacy_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        panel.sync(move_log)
+        panel.draw(screen)
+        panel_ms = (time.perf_counter() - start) * 1000
+        if ply in checkpoints:
+            legacy = f"{legacy_ms:10.2f}" if legacy_ms is not None else f"{'-':>10}"
+            print(f"{ply:>6} {legacy} {panel_ms:9.3f}")
+
+
+if __name__ == "__main__":
+    main()
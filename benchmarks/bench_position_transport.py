@@ -0,0 +1,86 @@
+"""
+Cost per task of sending positions to worker processes: pickled chess.Board objects, whose size grows with
+the move stack, against fixed-size records in shared memory (position_transport).
+
+serialize: pickle.dumps + loads of a board, against pack_position + unpack_position.
+pool:      tasks per second through a process pool whose workers do almost nothing, so the transport
+           dominates; boards are submitted directly, or through position_transport.map_positions.
+"""
+import os
+import pickle
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import chess
+
+import position_transport
+
+
+def random_game(plies, seed):
+    rng = random.Random(seed)
+    board = chess.Board()
+    while len(board.move_stack) < plies:
+        moves = list(board.legal_moves)
+        if not moves:
+            board = chess.Board()
+            continue
+        board.push(rng.choice(moves))
+    return board
+
+
+def material(board):
+    """The worker's task: trivial, so that the transport dominates."""
+    score = sum(len(board.pieces(piece_type, chess.WHITE)) - len(board.pieces(piece_type, chess.BLACK))
+                for piece_type in chess.PIECE_TYPES)
+    return score, None, 0
+
+
+def time_per_call(fn, number):
+    start = time.perf_counter()
+    for _ in range(number):
+        fn()
+    return (time.perf_counter() - start) / number
+
+
+def bench_serialize(board, number=2000):
+    buffer = bytearray(position_transport.SLOT_SIZE)
+    pickled = time_per_call(lambda: pickle.loads(pickle.dumps(board)), number)
+
+    def pack_and_unpack():
+        position_transport.pack_position(board, buffer)
+        return position_transport.unpack_position(buffer)
+    packed = time_per_call(pack_and_unpack, number)
+    return pickled, len(pickle.dumps(board)), packed, position_transport.POSITION.size
+
+
+def bench_pool(boards, workers):
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for _ in pool.map(material, boards, chunksize=1):
+            pass
+    pickled = len(boards) / (time.perf_counter() - start)
+    start = time.perf_counter()
+    for _ in position_transport.map_positions(material, boards, workers=workers):
+        pass
+    shared = len(boards) / (time.perf_counter() - start)
+    return pickled, shared
+
+
+def main():
+    print(f"{'plies':>6} {'pickle us':>10} {'bytes':>7} {'record us':>10} {'bytes':>6}")
+    for plies in (0, 40, 200, 1000):
+        pickled, pickled_size, packed, packed_size = bench_serialize(random_game(plies, plies))
+        print(f"{plies:>6} {pickled * 1e6:10.1f} {pickled_size:7} {packed * 1e6:10.1f} {packed_size:6}")
+
+    workers = min(4, os.cpu_count() or 1)
+    print(f"\nprocess pool, {workers} workers (tasks/s)")
+    print(f"{'plies':>6} {'pickled boards':>15} {'shared memory':>14}")
+    for plies in (40, 200, 1000):
+        boards = [random_game(plies, seed) for seed in range(20)] * 100
+        pickled, shared = bench_pool(boards, workers)
+        print(f"{plies:>6} {pickled:15.0f} {shared:14.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Measures cold and warm startup cost of the piece sprites.
+
+cold: no atlas on disk, the 1024px PNGs are decoded, scaled and the atlas is written.
+warm: the cached atlas is read back and cut into subsurfaces.
+legacy: the original per-image load + scale done by loadImages before the atlas cache.
+"""
+import os
+import shutil
+import tempfile
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame as pg
+
+import asset_cache
+
+
+def time_call(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def legacy_load(sq_size):
+    directory, files = asset_cache.PIECE_SETS['option2']
+    images = {}
+    for name, filename in files.items():
+        size = asset_cache.sprite_size(name, sq_size)
+        images[name] = pg.transform.scale(pg.image.load(os.path.join(directory, filename)).convert_alpha(), size)
+    return images
+
+
+def main(sq_size=80, repeat=5):
+    pg.display.init()
+    pg.display.set_mode((1, 1))
+    cache_dir = tempfile.mkdtemp()
+    try:
+        def cold():
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            asset_cache.load_piece_set('option2', sq_size, cache_dir)
+
+        def warm():
+            asset_cache.load_piece_set('option2', sq_size, cache_dir)
+
+        results = {
+            'legacy': time_call(lambda: legacy_load(sq_size), repeat),
+            'cold': time_call(cold, repeat),
+            'warm': time_call(warm, repeat),
+        }
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    for name, seconds in results.items():
+        print(f"{name:>6}: {seconds * 1000:8.2f} ms")
+    print(f"warm speedup over legacy: {results['legacy'] / results['warm']:.1f}x")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Deterministic stand-in for Stockfish that speaks enough UCI for python-chess.
+
+Every search takes a fixed, configurable time and returns the same moves and scores for the same
+position: the lines are the legal moves in UCI order, and the score is derived from a hash of the FEN.
+Engine benchmarks and tools can therefore run reproducibly without a Stockfish binary.
+It advertises the options the game sets (Skill Level, UCI_LimitStrength, UCI_Elo, MultiPV) and accepts them.
+
+Usage:
+    python benchmarks/fake_uci_engine.py --latency-ms 5
+    chess.engine.SimpleEngine.popen_uci([sys.executable, "benchmarks/fake_uci_engine.py", "--latency-ms", "5"])
+"""
+import argparse
+import sys
+import time
+import zlib
+
+import chess
+
+
+OPTIONS = (
+    "option name Hash type spin default 16 min 1 max 33554432",
+    "option name Threads type spin default 1 min 1 max 1024",
+    "option name MultiPV type spin default 1 min 1 max 500",
+    "option name Skill Level type spin default 20 min 0 max 20",
+    "option name UCI_LimitStrength type check default false",
+    "option name UCI_Elo type spin default 1320 min 1320 max 3190",
+    "option name Latency type spin default 0 min 0 max 100000",
+)
+
+
+def score_of(board):
+    """A stable pseudo evaluation in centipawns, from the side to move."""
+    return zlib.crc32(board.fen().encode()) % 201 - 100
+
+
+def parse_position(tokens):
+    if tokens[0] == "startpos":
+        board, rest = chess.Board(), tokens[1:]
+    else:  # fen <6 fields>
+        board, rest = chess.Board(" ".join(tokens[1:7])), tokens[7:]
+    if rest and rest[0] == "moves":
+        for uci in rest[1:]:
+            board.push_uci(uci)
+    return board
+
+
+def search(board, multipv, latency):
+    """Prints the info lines and bestmove of a search after `latency` seconds."""
+    time.sleep(latency)
+    moves = sorted(board.legal_moves, key=lambda move: move.uci())
+    if not moves:
+        print("info depth 0 score mate 0" if board.is_check() else "info depth 0 score cp 0")
+        print("bestmove (none)", flush=True)
+        return
+    base = score_of(board)
+    nodes = 1000 + zlib.crc32(board.fen().encode()) % 1000
+    for rank, move in enumerate(moves[:multipv], 1):
+        print(f"info depth 10 seldepth 12 multipv {rank} score cp {base - 10 * (rank - 1)} nodes {nodes} "
+              f"nps {int(nodes / max(latency, 0.001))} hashfull {rank} time {int(latency * 1000)} pv {move.uci()}")
+    print(f"bestmove {moves[0].uci()}", flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Deterministic fake UCI engine.")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="time every search takes")
+    args = parser.parse_args(argv)
+
+    latency = args.latency_ms / 1000
+    multipv = 1
+    board = chess.Board()
+    for line in sys.stdin:
+        tokens = line.split()
+        if not tokens:
+            continue
+        command = tokens[0]
+        if command == "uci":
+            print("id name FakeUCI\nid author benchmarks")
+            print("\n".join(OPTIONS))
+            print("uciok", flush=True)
+        elif command == "isready":
+            print("readyok", flush=True)
+        elif command == "setoption" and "value" in tokens:
+            name = " ".join(tokens[tokens.index("name") + 1:tokens.index("value")])
+            value = tokens[tokens.index("value") + 1]
+            if name == "MultiPV":
+                multipv = int(value)
+            elif name == "Latency":
+                latency = int(value) / 1000
+        elif command == "position":
+            board = parse_position(tokens[1:])
+        elif command == "go":
+            search(board, multipv, latency)
+        elif command == "quit":
+            break
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,228 @@
+"""
+Benchmark suite for the game core, the headless renderer and engine round trips.
+
+Engine benchmarks talk to benchmarks/fake_uci_engine.py, which answers after a fixed artificial latency,
+so results do not depend on a Stockfish binary and only measure our side of the round trip plus that
+latency. Every benchmark reports per-operation times (median and min over several repeats) and the
+results are written as JSON. `compare` flags benchmarks whose median got slower than a threshold.
+
+Usage:
+    python -m benchmarks.run --out bench_results.json
+    python -m benchmarks.run --only make_move --only draw_game_state
+    python -m benchmarks.run compare old.json new.json --threshold 10
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import chess
+
+import chess_engine_v2
+
+
+FAKE_ENGINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_uci_engine.py")
+# a short game given as (row, col) coordinates, the way the board UI calls makeMove
+GAME = ("e2e4", "e7e5", "g1f3", "b8c6", "f1b5", "a7a6", "b5a4", "g8f6", "e1g1", "f8e7", "f1e1", "b7b5",
+        "a4b3", "d7d6", "c2c3", "e8g8")
+MIDDLEGAME_FEN = "r1bq1rk1/2p1bppp/p1np1n2/1p2p3/4P3/1BP2N1P/PP1P1PP1/RNBQR1K1 b - - 0 9"
+
+
+def coords(square_name):
+    square = chess.parse_square(square_name)
+    return 7 - chess.square_rank(square), chess.square_file(square)
+
+
+GAME_COORDS = [(coords(uci[:2]), coords(uci[2:4])) for uci in GAME]
+
+
+def measure(operation, number, repeat=5, setup=None):
+    """
+    Times `number` calls of operation, `repeat` times.
+
+    :param setup: Optional callable run before every repeat (not timed), its result is passed to operation.
+    :return: dict with median and min microseconds per call
+    """
+    per_call = []
+    for _ in range(repeat):
+        state = setup() if setup else None
+        start = time.perf_counter()
+        for _ in range(number):
+            operation(state)
+        per_call.append((time.perf_counter() - start) / number * 1e6)
+    return {'median_us': statistics.median(per_call), 'min_us': min(per_call), 'number': number, 'repeat': repeat}
+
+
+def middlegame_state():
+    gs = chess_engine_v2.GameState()
+    gs.chessBoard = chess.Board(MIDDLEGAME_FEN)
+    return gs
+
+
+"""
+Benchmarks
+"""
+def bench_make_move(args):
+    def play_game(_):
+        gs = chess_engine_v2.GameState()
+        for start, end in GAME_COORDS:
+            gs.makeMove(start, end)
+    result = measure(play_game, 50)
+    result['per_move_us'] = result['median_us'] / len(GAME_COORDS)
+    return result
+
+
+def bench_get_valid_moves(args):
+    squares = [(row, col) for row in range(8) for col in range(8)]
+
+    def all_squares(gs):
+        for square in squares:
+            gs.getValidMoves(square)
+    return measure(all_squares, 50, setup=middlegame_state)
+
+
+def bench_check_game_status(args):
+    return measure(lambda gs: gs.check_game_status(), 2000, setup=middlegame_state)
+
+
+def bench_undo_move(args):
+    move = next(iter(chess.Board(MIDDLEGAME_FEN).legal_moves))
+
+    def make_and_undo(gs):
+        gs.makeAIMove(move)
+        gs.undoMove()
+    return measure(make_and_undo, 2000, setup=middlegame_state)
+
+
+def bench_san_logging(args):
+    board = chess.Board(MIDDLEGAME_FEN)
+    moves = list(board.legal_moves)
+
+    def san_all(_):
+        for move in moves:
+            board.san(move)
+    result = measure(san_all, 200)
+    result['per_move_us'] = result['median_us'] / len(moves)
+    return result
+
+
+def bench_draw_game_state(args):
+    import pygame as pg
+    import chess_main_v2
+    pg.init()
+    screen = pg.display.set_mode((chess_main_v2.WIDTH, chess_main_v2.HEIGHT))
+    chess_main_v2.loadImages()
+    gs = middlegame_state()
+    return measure(lambda _: chess_main_v2.drawGameState(screen, gs, None, False), 100)
+
+
+def engine_state(latency_ms):
+    gs = chess_engine_v2.GameState()
+    gs.initialize_stockfish([sys.executable, FAKE_ENGINE, "--latency-ms", str(latency_ms)])
+    gs.chessBoard = chess.Board(MIDDLEGAME_FEN)
+    return gs
+
+
+def bench_engine_play(args):
+    gs = engine_state(args.engine_latency_ms)
+    try:
+        result = measure(lambda _: gs.get_ai_move(time_limit=0.05), 20)
+    finally:
+        gs.close_stockfish()
+    result['overhead_us'] = result['median_us'] - args.engine_latency_ms * 1000
+    return result
+
+
+def bench_engine_eval(args):
+    gs = engine_state(args.engine_latency_ms)
+    try:
+        result = measure(lambda _: gs.get_eval(), 20)
+    finally:
+        gs.close_stockfish()
+    result['overhead_us'] = result['median_us'] - args.engine_latency_ms * 1000
+    return result
+
+
+BENCHMARKS = {
+    'make_move': bench_make_move,
+    'get_valid_moves': bench_get_valid_moves,
+    'check_game_status': bench_check_game_status,
+    'undo_move': bench_undo_move,
+    'san_logging': bench_san_logging,
+    'draw_game_state': bench_draw_game_state,
+    'engine_play': bench_engine_play,
+    'engine_eval': bench_engine_eval,
+}
+
+
+"""
+Running and comparing
+"""
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    names = args.only or list(BENCHMARKS)
+    results = {}
+    for name in names:
+        results[name] = BENCHMARKS[name](args)
+        print(f"{name:<20} {results[name]['median_us']:12.2f} us  (min {results[name]['min_us']:.2f})")
+    report = {'meta': {'time': time.strftime("%Y-%m-%dT%H:%M:%S"), 'revision': git_revision(),
+                       'python': platform.python_version(), 'platform': platform.platform(),
+                       'engine_latency_ms': args.engine_latency_ms},
+              'results': results}
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=1)
+    print(f"Wrote {args.out}")
+    return 0
+
+
+def compare(args):
+    """Prints the change of every benchmark; exits with 1 if any median is slower by more than the threshold."""
+    with open(args.old) as f:
+        old = json.load(f)['results']
+    with open(args.new) as f:
+        new = json.load(f)['results']
+    regressions = []
+    for name in sorted(old.keys() & new.keys()):
+        before, after = old[name]['median_us'], new[name]['median_us']
+        change = (after - before) / before * 100 if before else 0.0
+        flag = "REGRESSION" if change > args.threshold else ""
+        if flag:
+            regressions.append(name)
+        print(f"{name:<20} {before:12.2f} -> {after:12.2f} us  {change:+7.1f}%  {flag}")
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.threshold}%: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == "compare":
+        parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+        parser.add_argument("old")
+        parser.add_argument("new")
+        parser.add_argument("--threshold", type=float, default=10.0, help="allowed slowdown in percent")
+        return compare(parser.parse_args(argv[1:]))
+    parser = argparse.ArgumentParser(description="Run the benchmark suite.")
+    parser.add_argument("--out", default="bench_results.json", help="JSON file to write")
+    parser.add_argument("--only", action="append", choices=list(BENCHMARKS), help="run only these benchmarks")
+    parser.add_argument("--engine-latency-ms", type=float, default=5.0, help="artificial latency of the fake engine")
+    return run(parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+"""
+Headless batch renderer for board diagrams.
+
+Renders positions to PNG with the same drawing code, piece images and board colours as the game window,
+using the SDL dummy video driver so it runs on servers without a display. Work is spread over a
+process pool; every worker sets up pygame once and then renders its share of the positions.
+
+Usage:
+    python board_render.py positions.fen chess_save_games/*.json --out diagrams --size 320
+"""
+import argparse
+import itertools
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import chess
+
+import save_format
+
+
+_gui = None  # chess_main_v2, imported inside each worker after the dummy driver is selected
+
+
+def init_worker():
+    """Selects the dummy video/audio drivers and loads the piece images once per worker process."""
+    global _gui
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    import pygame as pg
+    import chess_main_v2
+    pg.font.init()  # drawBoard labels ranks and files; the rest of the GUI (initGUI) is not needed
+    pg.display.set_mode((1, 1))  # convert_alpha needs a display mode, even a dummy one
+    chess_main_v2.loadImages()
+    _gui = chess_main_v2
+
+
+def load_position(source):
+    """A source is either a FEN string or the path of a saved game (v2 or legacy JSON)."""
+    if not os.path.isfile(source):
+        return chess.Board(source)
+    if source.endswith(".json"):
+        board, _ = save_format.replay(chess.STARTING_FEN, save_format.read_legacy_moves(source))
+        return board
+    board, _, _ = save_format.load_game(source)
+    return board
+
+
+def render_board(board, size=None, last_move=True, check=True):
+    """
+    Draws a position onto an off-screen surface with the game's own drawing functions.
+
+    :param size: Optional edge length in pixels to scale the diagram to (default is 8 * SQ_SIZE).
+    :return: pygame Surface with the board.
+    """
+    import pygame as pg
+    import chess_engine_v2 as chess_engine
+    gs = chess_engine.GameState()
+    gs.chessBoard = board
+    screen = pg.Surface((_gui.WIDTH, _gui.HEIGHT))
+    _gui.drawBoard(screen, gs, False)
+    if last_move:
+        _gui.highlightLastMove(screen, gs)
+    if check:
+        _gui.inCheck(screen, gs, gs.check_game_status())
+    _gui.drawPieces(screen, gs)
+    board_size = _gui.SQ_SIZE * _gui.DIMENSION
+    diagram = screen.subsurface((0, 0, board_size, board_size))
+    if size and size != board_size:
+        diagram = pg.transform.smoothscale(diagram, (size, size))
+    return diagram
+
+
+def render_job(job):
+    """Worker entry point: renders one (source, output path, options) job."""
+    import pygame as pg
+    source, out_path, size, last_move, check = job
+    pg.image.save(render_board(load_position(source), size, last_move, check), out_path)
+    return out_path
+
+
+def make_jobs(sources, out_dir, size, last_move, check):
+    for i, source in enumerate(sources):
+        if os.path.isfile(source):
+            name = os.path.splitext(os.path.basename(source))[0]
+        else:
+            name = f"position_{i:06d}"
+        yield source, os.path.join(out_dir, name + ".png"), size, last_move, check
+
+
+def render_batch(sources, out_dir, size=None, last_move=True, check=True, workers=None, chunksize=16):
+    """
+    Renders every source (FEN string or saved game path) to a PNG in out_dir.
+
+    :param workers: Number of worker processes (default: all cores).
+    :return: (number of images written, elapsed seconds)
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    start = time.perf_counter()
+    count = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+        jobs = make_jobs(sources, out_dir, size, last_move, check)
+        for _ in pool.map(render_job, jobs, chunksize=chunksize):
+            count += 1
+    return count, time.perf_counter() - start
+
+
+def read_sources(paths, fens):
+    """FEN files (one position per line) are expanded, saved games and FEN strings are passed through."""
+    for path in paths:
+        if path.endswith((".json", save_format.EXTENSION)):
+            yield path
+        else:
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        yield line.strip()
+    yield from fens
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render board diagrams to PNG without a display.")
+    parser.add_argument("inputs", nargs="*", help="FEN files (one per line) or saved games (.chs, .json)")
+    parser.add_argument("--fen", action="append", default=[], help="a FEN string to render (repeatable)")
+    parser.add_argument("--out", default="diagrams", help="output directory")
+    parser.add_argument("--size", type=int, default=None, help="diagram edge length in pixels")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--no-last-move", action="store_true", help="do not highlight the last move")
+    parser.add_argument("--no-check", action="store_true", help="do not highlight a king in check")
+    parser.add_argument("--limit", type=int, default=None, help="only render the first N positions")
+    args = parser.parse_args(argv)
+
+    sources = read_sources(args.inputs, args.fen)
+    if args.limit:
+        sources = itertools.islice(sources, args.limit)
+    count, elapsed = render_batch(sources, args.out, args.size, not args.no_last_move, not args.no_check,
+                                  args.workers)
+    rate = count / elapsed if elapsed else 0.0
+    print(f"Rendered {count} diagrams in {elapsed:.2f}s ({rate:.1f} images/s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -40,6 +40,10 @@ class Button:
             self.surf = font_or_image.render(text_or_image, True, font_color)  # Render the text
             self.text_rect = self.surf.get_rect(center=self.top_rect.center)
 
+    def set_text(self, text, font, font_color):
+        self.surf = font.render(text, True, font_color)
+        self.text_rect = self.surf.get_rect(center=self.top_rect.center)
+
     def draw(self, screen):
         # Elevation logic
         self.top_rect.y = self.original_y_pos - self.dynamic_elevation
@@ -1,6 +1,51 @@
+"""
+Game logic, free of any GUI code: importing it loads python-chess and the save formats only. The engine
+bindings (chess.engine, which pulls in asyncio) and the analysis cache are imported on first use.
+"""
+import json
+import threading
+import time
 
 import chess as chess
-import chess.engine
+
+import save_format
+import autosave_journal
+import evaluator
+import telemetry
+import variation_tree
+
+
+# AI Elo label -> Stockfish Skill Level, set by hand; elo_calibration.py measures the real ratings and
+# writes them to DIFFICULTY_TABLE_PATH, which replaces this table when present
+DEFAULT_DIFFICULTY = {'1250': 1, '1350': 2, '1450': 3, '1550': 4, '1650': 5, '1750': 6, '1850': 7, '1950': 8,
+                      '2050': 9, '2150': 10, '2250': 11, '2350': 12, '2450': 13, '2550': 14, '2650': 15,
+                      '2750': 16, '2850': 17, '2950': 18, '3050': 19, '3150': 20}
+DIFFICULTY_TABLE_PATH = "difficulty_table.json"
+
+
+def load_difficulty_table(path=DIFFICULTY_TABLE_PATH):
+    """
+    Reads the difficulty table written by elo_calibration.py.
+
+    :return: dict of AI Elo label -> Skill Level, the hand-made DEFAULT_DIFFICULTY if there is no table.
+    """
+    try:
+        with open(path) as f:
+            levels = json.load(f)['levels']
+    except (OSError, ValueError, KeyError):
+        return dict(DEFAULT_DIFFICULTY)
+    table = {}
+    for level in sorted(levels, key=lambda level: level['skill']):
+        elo = level['elo']
+        while str(elo) in table:  # labels must stay unique even if two levels measured the same
+            elo += 1
+        table[str(elo)] = level['skill']
+    return table
+
+
+def normalize_score(score):
+    """Normalizes a centipawn score to [-1, 1]."""
+    return max(-1000, min(1000, score)) / 1000
 
 
 class GameState():
@@ -8,10 +53,20 @@ class GameState():
         #Chess Board is 8x8 square that is defined by positional numbers (0 - 63) and pieceType characters (R, K, q, Q, etc)
         self.chessBoard = chess.Board()
         self.move_log = []
+        self.evaluator = evaluator.Evaluator(self.chessBoard)  # instant static eval, updated on every push and pop
+        self.tree = variation_tree.VariationTree()  # every line tried on this board, undone moves included
+        self._tree_board = self.chessBoard
         self.stockfish_engine = None
-        self.stockfishDifficultyDict = {'1250': 1, '1350': 2, '1450': 3, '1550': 4, '1650': 5, '1750': 6, '1850': 7, '1950': 8, '2050': 9, '2150': 10,
-                                    '2250': 11, '2350': 12, '2450': 13, '2550': 14, '2650': 15, '2750': 16, '2850': 17, '2950': 18, '3050': 19, '3150': 20} 
-        self.stockfishDifficulty = '1250'  # Default difficulty level
+        self.stockfishDifficultyDict = load_difficulty_table()
+        self.stockfishDifficulty = min(self.stockfishDifficultyDict, key=self.stockfishDifficultyDict.get)  # Default difficulty level (lowest)
+        self.journal = None  # autosave_journal.Journal, records every move so a crashed game can be recovered
+        self.analysis_cache = None  # analysis_cache.AnalysisCache, engine results shared across sessions
+        self.premoves = []  # (from square, to square) queued by the player while the AI thinks
+        # the AI may think in a background thread; a second command to the engine would cancel its search
+        self.engine_lock = threading.Lock()
+        self.engine_status = None  # 'loading', 'ready' or 'failed' once an engine has been requested
+        self.engine_ready_time = None  # time.perf_counter() when the engine finished its handshake
+        self._pending_skill = None  # Skill Level chosen while the engine may be busy, applied before its next search
         # Initialize the Stockfish engine if a path is provided
         if stockfish_path:
             self.initialize_stockfish(stockfish_path)
@@ -23,14 +78,36 @@ class GameState():
         
         :param stockfish_path: Path to the Stockfish executable.
         """
-        try:
-            self.stockfish_engine = chess.engine.SimpleEngine.popen_uci(stockfish_path)
-            print("Stockfish initialized successfully.")
-            self.stockfish_engine.configure({"Skill Level": self.stockfishDifficultyDict[self.stockfishDifficulty]})  # Set skill level to 10 (medium difficulty)
-           
-        except FileNotFoundError:
-            print("Error: Stockfish executable not found. Check the path.")
-            
+        import chess.engine
+        self.engine_status = 'loading'
+        with self.engine_lock, telemetry.span("engine.startup"):
+            try:
+                self.stockfish_engine = chess.engine.SimpleEngine.popen_uci(stockfish_path)
+                print("Stockfish initialized successfully.")
+                self.stockfish_engine.configure({"Skill Level": self.stockfishDifficultyDict[self.stockfishDifficulty]})  # Set skill level to 10 (medium difficulty)
+                self.engine_ready_time = time.perf_counter()
+                self.engine_status = 'ready'  # published last: the UI reads engine_ready_time once it sees 'ready'
+            except FileNotFoundError:
+                print("Error: Stockfish executable not found. Check the path.")
+                self.engine_status = 'failed'
+            except (OSError, chess.engine.EngineError) as e:
+                print(f"Error: Stockfish could not be started ({e}).")
+                self.engine_status = 'failed'
+
+    def start_stockfish(self, stockfish_path):
+        """
+        Initializes the Stockfish engine in a background thread, so that launching it and the UCI handshake
+        do not hold up the caller. engine_status tells when it is ready.
+
+        :param stockfish_path: Path to the Stockfish executable.
+        :return: The started thread.
+        """
+        self.engine_status = 'loading'
+        thread = threading.Thread(target=self.initialize_stockfish, args=(stockfish_path,), name="engine-startup",
+                                  daemon=True)
+        thread.start()
+        return thread
+
     def set_stockfish_difficulty(self, difficulty):
         """
         Sets the Stockfish engine's difficulty level.
@@ -38,9 +115,9 @@ class GameState():
         :param difficulty: A string representing the desired difficulty (e.g., '1250', '1350').
         """
         if self.stockfish_engine:
-            # Reconfigure the Stockfish engine with the new skill level
-            skill_level = difficulty
-            self.stockfish_engine.configure({"Skill Level": skill_level})
+            # Configuring during a search would cancel it, and waiting for the search would block the UI:
+            # the new skill level is applied by whichever thread next takes the engine lock
+            self._pending_skill = difficulty
             reverse_dict = {v: k for k, v in self.stockfishDifficultyDict.items()}
             rating = reverse_dict.get(difficulty)
             print(f"Stockfish difficulty set to {rating} (Skill Level {difficulty}).")
@@ -48,17 +125,29 @@ class GameState():
         else:
             print(f"Invalid difficulty: {difficulty}. Please choose a valid difficulty.")
 
-    def get_ai_move(self, time_limit=1.0):
+    def _apply_pending_skill(self):
+        """Sends a skill level chosen with set_stockfish_difficulty to the engine; call it holding engine_lock."""
+        skill_level, self._pending_skill = self._pending_skill, None
+        if skill_level is not None:
+            self.stockfish_engine.configure({"Skill Level": skill_level})
+
+    def get_ai_move(self, time_limit=1.0, board=None):
         """
         Gets the best move from Stockfish for the current board position.
         :param time_limit: Time in seconds for Stockfish to calculate the move.
+        :param board: Position to search instead of the current one, e.g. a copy when thinking in the background.
         :return: The best move as a chess.Move object.
         """
         if not self.stockfish_engine:
             print("Error: Stockfish engine is not initialized.")
             return None
 
-        result = self.stockfish_engine.play(self.chessBoard, chess.engine.Limit(time=time_limit))
+        import chess.engine
+        with self.engine_lock, telemetry.span("engine.play"):
+            self._apply_pending_skill()
+            result = self.stockfish_engine.play(board or self.chessBoard, chess.engine.Limit(time=time_limit),
+                                                info=chess.engine.INFO_BASIC)
+        telemetry.record_engine_info(result.info)
         return result.move
 
 
@@ -86,7 +175,9 @@ class GameState():
             self.move_log.append(san_move)  # Add the SAN move to the move log
 
             # Make the move on the board
-            self.chessBoard.push(self.move)  
+            self.pushMove(self.move)
+            if self.journal:
+                self.journal.move(self.move)
             return True  # Move was successful
         else:
             if self.move:  # Ensure a move exists
@@ -101,11 +192,145 @@ class GameState():
                         return ('pawnPromotion', self.move)  # Pawn promotion detected
             return False  # Move was invalid
 
+    def makeAIMove(self, move):
+        """
+        Plays a move chosen by the engine.
+
+        :param move: chess.Move returned by get_ai_move.
+        """
+        self.move_log.append(self.chessBoard.san(move))  # Register move in log
+        self.pushMove(move)
+        if self.journal:
+            self.journal.ai_move(move)
+
+    def makeTextMove(self, text):
+        """
+        Plays a move given as text, in UCI ('e2e4', 'e7e8q') or SAN ('e4', 'Nf3', 'O-O') notation.
+
+        :return: The move in SAN.
+        :raises ValueError: If the move cannot be parsed or is illegal in the current position.
+        """
+        try:
+            move = chess.Move.from_uci(text)
+        except ValueError:
+            move = self.chessBoard.parse_san(text)
+        else:
+            if not self.chessBoard.is_legal(move):
+                raise ValueError(f"illegal move: {text}")
+        san = self.chessBoard.san(move)
+        self.move_log.append(san)
+        self.pushMove(move)
+        if self.journal:
+            self.journal.move(move)
+        return san
+
+    def pushMove(self, move):
+        """Pushes a move on the board, keeping the incremental evaluator and the variation tree in step."""
+        self.evaluator.push(self.chessBoard, move)
+        self.variationTree().push(move)
+        self.chessBoard.push(move)
+
+    def popMove(self):
+        """Takes back the last move on the board, keeping the incremental evaluator and the variation tree in step."""
+        self.evaluator.pop(self.chessBoard)
+        self.variationTree().pop()
+        return self.chessBoard.pop()
+
+    def _recordMove(self, move):
+        self.move_log.append(self.chessBoard.san(move))
+        self.pushMove(move)
+        if self.journal:
+            self.journal.move(move)
+
+    def variationTree(self):
+        """The variation tree of the game, started afresh when the board was replaced (e.g. a loaded game)."""
+        if self._tree_board is not self.chessBoard or self.tree.current.ply != len(self.chessBoard.move_stack):
+            self.tree = variation_tree.VariationTree.from_board(self.chessBoard)
+            self._tree_board = self.chessBoard
+        return self.tree
+
+    def redoMove(self):
+        """
+        Plays the main continuation of the current move again, e.g. after undoMove.
+
+        :return: The move, or None at the end of the line.
+        """
+        node = self.variationTree().current
+        if not node.children:
+            return None
+        self._recordMove(node.children[0].move)
+        return node.children[0].move
+
+    def switchVariation(self, node):
+        """
+        Goes to any node of the variation tree: moves are taken back to the common ancestor, then the moves
+        of the node's branch are played, so only the differing part of the two lines is touched.
+        """
+        tree = self.variationTree()
+        common = tree.common_ancestor(tree.current, node)
+        while tree.current is not common:
+            self.undoMove()
+        for move in tree.path(node, common):
+            self._recordMove(move)
+
+    def nextVariation(self):
+        """
+        Switches to the next alternative to the last move (wrapping around).
+
+        :return: False if there is no alternative.
+        """
+        tree = self.variationTree()
+        siblings = tree.variations(tree.current)
+        if len(siblings) < 2:
+            return False
+        self.switchVariation(siblings[(siblings.index(tree.current) + 1) % len(siblings)])
+        return True
+
+    def promoteVariation(self):
+        """Makes the line of the current move the main line of the variation tree."""
+        self.variationTree().promote()
+
+    def queuePremove(self, start_coord, end_coord):
+        """
+        Queues a move for the player while the AI is thinking. It is only checked when it is applied, right
+        after the AI reply, so it may start on a square another premove is going to occupy.
+        """
+        self.premoves.append((chess.parse_square(self.coordToChessSquare(start_coord)),
+                              chess.parse_square(self.coordToChessSquare(end_coord))))
+
+    def applyPremove(self):
+        """
+        Plays the first queued premove. Pawns reaching the last rank are promoted to a queen.
+
+        :return: None if no premove is queued, else (True, move) if it was played or (False, move) if it had
+                 become illegal; then the rest of the queue, which built on it, is discarded too.
+        """
+        if not self.premoves:
+            return None
+        from_square, to_square = self.premoves.pop(0)
+        move = chess.Move(from_square, to_square)
+        piece = self.chessBoard.piece_at(from_square)
+        if piece and piece.piece_type == chess.PAWN and chess.square_rank(to_square) in (0, 7):
+            move.promotion = chess.QUEEN
+        if not self.chessBoard.is_legal(move):
+            self.premoves.clear()
+            return False, move
+        self.move_log.append(self.chessBoard.san(move))
+        self.pushMove(move)
+        if self.journal and move.promotion:
+            self.journal.promotion(move)
+        elif self.journal:
+            self.journal.move(move)
+        return True, move
+
     def undoMove(self):
+        self.premoves.clear()  # they were planned for a position that no longer comes
         if len(self.chessBoard.move_stack) > 0:
-            self.chessBoard.pop()
+            self.popMove()
             if self.move_log:
                 self.move_log.pop()  # Remove the last move from the move log
+            if self.journal:
+                self.journal.undo()
 
 
     def getValidMoves(self, sqSelected):
@@ -157,23 +382,152 @@ class GameState():
 
             # Now, execute the move
             if move in self.chessBoard.legal_moves:
-                self.chessBoard.push(move)
+                self.move_log.append(self.chessBoard.san(move))  # keep the move log in step with the board
+                self.pushMove(move)
+                if self.journal:
+                    self.journal.promotion(move)
                 print(f"Pawn promoted to {promotionPiece}")
             else:
                 print("Invalid move.")
 
+    def engine_id(self):
+        """Identifies the engine and the options that change its analysis (part of the analysis cache key)."""
+        name = self.stockfish_engine.id.get('name', 'stockfish')
+        return f"{name}|skill={self.stockfishDifficultyDict.get(self.stockfishDifficulty)}"
+
+    def analyse(self, limit, multipv=1, board=None):
+        """
+        Analyses a position (default: the current one), answered from the analysis cache when possible.
+
+        :param limit: chess.engine.Limit of the search.
+        :return: list of lines {'cp', 'mate', 'depth', 'pv'} relative to the side to move, best first.
+        """
+        import analysis_cache
+        with self.engine_lock:
+            self._apply_pending_skill()  # engine_id() already names the new level
+            return analysis_cache.analyse(self.stockfish_engine, board or self.chessBoard, limit, multipv,
+                                          self.analysis_cache, self.engine_id())
+
+    def quick_eval(self):
+        """Static estimate of the current position without the engine, normalized like get_eval."""
+        return normalize_score(self.evaluator.score(self.chessBoard))
+
     def get_eval(self):
         """Get evaluation from Stockfish and normalize it."""
-        info = self.stockfish_engine.analyse(self.chessBoard, chess.engine.Limit(time=0.1))
-        score = info["score"].relative.score(mate_score=10000)  # Use high value for mate
-        return max(-1000, min(1000, score)) / 1000  # Normalize to [-1,1]
+        import chess.engine
+        with telemetry.span("engine.eval"):
+            score = self.analyse(chess.engine.Limit(time=0.1))[0]['cp']  # mate scores are +-10000
+        return normalize_score(score)
+
+
+
+    def save_game(self, path, tags=None):
+        """
+        Saves the game in the compact v2 format (starting FEN + 16 bit moves).
+
+        :param path: File to write, by convention ending in '.chs'.
+        :param tags: Optional dict of PGN tags (White, Black, Result, Date, ...).
+        """
+        root = self.chessBoard.root()
+        save_format.write_game(path, self.chessBoard.move_stack, root.fen(), tags)
+
+    def load_game(self, path):
+        """
+        Loads a v2 save, or a legacy JSON save from chess_save_games/, replacing the current game.
+
+        :return: The tags stored with the game.
+        """
+        if path.endswith(".json"):
+            board, self.move_log = save_format.replay(chess.STARTING_FEN, save_format.read_legacy_moves(path))
+            tags = {}
+        else:
+            board, self.move_log, tags = save_format.load_game(path)
+        self.chessBoard = board
+        return tags
+
+    def load_stored_game(self, database, game_id):
+        """
+        Loads a game from a game_database.GameDatabase, replacing the current game.
+
+        :return: The tags stored with the game.
+        """
+        start_fen, tags, moves = database.get(game_id)
+        self.chessBoard, self.move_log = save_format.replay(start_fen, moves)
+        return tags
+
+    def store_game(self, database, tags=None, position_index=None):
+        """
+        Appends the current game to a game_database.GameDatabase.
+
+        :param position_index: Optional position_index.PositionIndex the game is added to as well.
+        :return: The new game id.
+        """
+        root = self.chessBoard.root()
+        tags = dict(tags or {})
+        tags.setdefault('Result', self.chessBoard.result())
+        game_id = database.append(self.chessBoard.move_stack, root.fen(), tags)
+        if position_index is not None:
+            position_index.add_game(game_id, self.chessBoard.move_stack, root.fen(), tags['Result'])
+        return game_id
 
+    def export_pgn(self, path=None, tags=None, variations=False):
+        """
+        Exports the game as PGN.
 
+        :param path: Optional file to write the PGN to.
+        :param variations: Export the whole variation tree, main line first, instead of the current line.
+        :return: The PGN text.
+        """
+        if variations:
+            pgn = self.variationTree().to_pgn(tags)
+        else:
+            pgn = save_format.game_to_pgn(self.chessBoard, tags)
+        if path:
+            with open(path, 'w') as f:
+                f.write(pgn)
+        return pgn
+
+    def attach_journal(self, journal):
+        """
+        Starts recording the game to an autosave journal. Moves already played are written as well.
+
+        :param journal: autosave_journal.Journal
+        """
+        self.journal = journal
+        journal.start_game(self.chessBoard.root().fen(), self.chessBoard.move_stack)
+
+    def recover_from_journal(self, path):
+        """
+        Restores the last unfinished game recorded in an autosave journal.
+
+        :return: True if a game was recovered.
+        """
+        unfinished = autosave_journal.recover(path)
+        if unfinished is None:
+            return False
+        try:
+            self.chessBoard, self.move_log = save_format.replay(*unfinished)
+        except ValueError as e:
+            print(f"Could not recover the autosaved game: {e}")
+            return False
+        print(f"Recovered unfinished game ({len(self.move_log)} moves).")
+        return True
+
+    def end_game(self):
+        """Marks the game as finished in the autosave journal so it is not recovered on the next start."""
+        if self.journal:
+            self.journal.end_game(self.chessBoard.result(claim_draw=True))
 
     def close_stockfish(self):
         """
         Closes the Stockfish engine.
         """
-        if self.stockfish_engine:
-            self.stockfish_engine.quit()
-            print("Stockfish engine closed.")
\ No newline at end of file
+        import chess.engine
+        with self.engine_lock:  # waits for a startup or search still running
+            if self.stockfish_engine:
+                try:
+                    self.stockfish_engine.quit()
+                    print("Stockfish engine closed.")
+                except chess.engine.EngineTerminatedError:
+                    print("Stockfish engine had already terminated.")
+                self.stockfish_engine = None
\ No newline at end of file
@@ -1,22 +1,24 @@
 
 #Import Modules
 import sys
+import os
 import pygame as pg
 import chess
-import chess.engine
-import numpy as np
+import chess.polyglot
 import math 
-import pygame_gui as pgui
-import random
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 
 #Import files
 import chess_engine_v2 as chess_engine
 import button_logic
+import asset_cache
+import move_list_panel
+import profiler
+import telemetry
 
 
-pg.init()
-
 #Global Variables
 global colors
 colors = {'chessSquares': [pg.Color(235, 236, 211), pg.Color(125, 148, 93)], 'mainBackground': pg.Color("black"),
@@ -30,29 +32,52 @@ DIMENSION = 8
 WIDTH, HEIGHT = (SQ_SIZE * (DIMENSION+4)), (SQ_SIZE * (DIMENSION+1))
 MAX_FPS = 15
 IMAGES = {}
-coordinate_list = [(int(row), int(col)) for row, col in np.ndindex(DIMENSION, DIMENSION)]
-manager = pgui.UIManager((WIDTH, HEIGHT))
-manager.get_theme().load_theme("theme.json")
+PIECE_SETS = asset_cache.PieceSets(SQ_SIZE) # piece sets are loaded lazily from the sprite atlas cache
+coordinate_list = [(row, col) for row in range(DIMENSION) for col in range(DIMENSION)]
+manager = None # pygame_gui.UIManager, created by initGUI
 #Chess Object Variables intended for UI
 pieces = {'wP': 'P', 'wR': 'R', 'wN': 'N', 'wB': 'B', 'wQ': 'Q', 'wK': 'K', 
           'bP': 'p', 'bR': 'r', 'bN': 'n', 'bB': 'b', 'bQ': 'q', 'bK': 'k'}
 BOARDRANGE = 64 #number of squares on the board
 
+# game storage
+GAME_DATABASE_PATH = "chess_save_games/games.cgdb" # finished games are appended here
+POSITION_INDEX_PATH = "chess_save_games/positions" # opening explorer index, built by pgn_import.py --positions and finished games
+JOURNAL_PATH = "chess_save_games/autosave.journal" # write-ahead journal of the game in progress
+ANALYSIS_CACHE_PATH = ".cache/analysis.sqlite" # engine results reused across sessions
+TELEMETRY_PATH = ".cache/telemetry.jsonl" # periodic telemetry snapshots (a path ending in .prom writes Prometheus text)
+PROFILE_DIR = ".cache/profiles" # F9 captures: collapsed stacks for flamegraphs and a hotspot summary
+PROFILE_SECONDS = 10
+# target dots of the selected piece, by the verdict of the background evaluation (grey until it is known)
+PREVIEW_COLORS = {'good': (60, 170, 60, 150), 'neutral': (100, 100, 100, 100), 'blunder': (200, 50, 50, 150)}
+MATE_THRESHOLD = 9000 # centipawn scores beyond this are forced mates
+PREMOVE_COLOR = (70, 110, 220, 110) # squares of queued premoves
+PREMOVE_DISCARD_COLOR = (220, 50, 50, 130) # flashed on a premove that became illegal
+PREMOVE_DISCARD_SECONDS = 0.8
+EVAL_BAR_EASING = 0.35 # fraction of the way to a new evaluation the bar moves per frame
+AI_BUTTON_TEXT = {None: "No engine", 'loading': "Loading...", 'ready': "Toggle AI", 'failed': "No engine"}
+
 # button font and colors
-gui_font = pg.font.SysFont('arial', 20, True)
+gui_font = None # created by initGUI
 menuButtonColor = '#555555'
 loadButtonColor = '#b3af5d'
 pauseButtonColor = '#475F77'
 
+#Initialize pygame and the UI manager. Kept out of module import so board_render workers and tools that only
+#need the drawing functions do not pay for pygame_gui and its theme
+def initGUI():
+    global manager, gui_font
+    import pygame_gui as pgui
+    pg.init()
+    manager = pgui.UIManager((WIDTH, HEIGHT))
+    manager.get_theme().load_theme("theme.json")
+    gui_font = pg.font.SysFont('arial', 20, True)
+
 #Initialize global dictionary of images. This will be called exactly once in the main
 def loadImages():
     global UNDOIMAGE
     UNDOIMAGE = pg.transform.scale(pg.image.load("assets/images/symbols/undo64.png").convert_alpha(), (30,30))
-    for imagePiece, namePiece in pieces.items():
-        if namePiece in ['P', 'p']:
-            IMAGES[namePiece] = pg.transform.scale(pg.image.load("assets/images/option2/1024px/" + imagePiece + ".png").convert_alpha(), (SQ_SIZE * 0.8, SQ_SIZE * 0.8)) # pawns are sligtly smaller
-        else:
-            IMAGES[namePiece] = pg.transform.scale(pg.image.load("assets/images/option2/1024px/" + imagePiece + ".png").convert_alpha(), (SQ_SIZE * 0.9, SQ_SIZE * 0.9)) # Chess Pieces are sligtly bigger
+    IMAGES.update(PIECE_SETS['option2']) # pre-scaled sprites from the cached atlas (built on first launch)
     #Note: we can access an image by saying 'IMAGES['P']'
 #Initialize sound effects
 def loadSounds():
@@ -67,6 +92,21 @@ Code Main Driver. This will handle user input and updating the graphics
 
 
 def main():
+    startup_start = time.perf_counter() # origin of the time to first frame and to engine ready
+    # frontend-only modules, imported here so that importing this module stays light
+    import pygame_gui as pgui
+    import chess.engine
+    import analysis_cache
+    import autosave_journal
+    import eval_history
+    import game_database
+    import live_analysis
+    import move_preview
+    import position_index
+
+    initGUI()
+    os.makedirs(os.path.dirname(TELEMETRY_PATH), exist_ok=True)
+    telemetry.configure(enabled=True, export_path=TELEMETRY_PATH) # spans cost well under a microsecond
     #Main Variables
     pg.display.set_caption(gameTitle + '- GameBoard')
     screen = pg.display.set_mode((WIDTH, HEIGHT))
@@ -75,7 +115,16 @@ def main():
 
     #start instances (eg. gs = chess.GameState())
     stockfish_path = "stockfish/stockfish-macos-m1-apple-silicon"  # Update with your Stockfish path
-    gs = chess_engine.GameState(stockfish_path)
+    gs = chess_engine.GameState()
+    gs.start_stockfish(stockfish_path) # launched and handshaken in the background while the rest loads
+    gs.recover_from_journal(JOURNAL_PATH) # continue a game that was interrupted by a crash
+    journal = autosave_journal.Journal(JOURNAL_PATH)
+    gs.attach_journal(journal)
+    os.makedirs(os.path.dirname(ANALYSIS_CACHE_PATH), exist_ok=True)
+    gs.analysis_cache = analysis_cache.AnalysisCache(ANALYSIS_CACHE_PATH)
+    evalHistory = eval_history.EvalHistory(stockfish_path, cache=gs.analysis_cache) # evaluates every ply in the background
+    global movePreview
+    movePreview = move_preview.MovePreview(stockfish_path, cache=gs.analysis_cache) # evaluates the targets of the selected piece
     
 
     #Load Media (taxing processes that should be done once)
@@ -85,7 +134,7 @@ def main():
     #load buttons
     # button objects and Logic
     undoButton = button_logic.Button(None, 45, 40, ((SQ_SIZE * 0.25), (SQ_SIZE *(DIMENSION)) + (SQ_SIZE * 0.3)+1), screen, UNDOIMAGE, 6, menuButtonColor, 'white') # send variable data to button script
-    aiToggleButton = button_logic.Button("Toggle AI", 100, 40, (SQ_SIZE +(SQ_SIZE * 0.25), HEIGHT - SQ_SIZE * .7), screen,
+    aiToggleButton = button_logic.Button(AI_BUTTON_TEXT[gs.engine_status], 100, 40, (SQ_SIZE +(SQ_SIZE * 0.25), HEIGHT - SQ_SIZE * .7), screen,
                                          gui_font, 6, '#555555', 'white')
     difficultySlider = pgui.elements.UIHorizontalSlider(
     relative_rect=pg.Rect((SQ_SIZE * 3, SQ_SIZE * DIMENSION + (SQ_SIZE * .4)), (300, 30)),  # Position and size
@@ -103,8 +152,11 @@ def main():
 
     # Textbox area
     textbox_rect = pg.Rect((WIDTH - (SQ_SIZE * 4)+ 10, 10), (SQ_SIZE * 4 - 20, SQ_SIZE * 4 - 20))  # x, y, width, height
-    textbox = None  # Start with no text box
-    last_move_string = ""  # Initialize with an empty string
+    explorer_rect = pg.Rect((WIDTH - (SQ_SIZE * 4)+ 10, SQ_SIZE * 4 + 45), (SQ_SIZE * 4 - 20, 120))
+    graph_rect = pg.Rect((WIDTH - (SQ_SIZE * 4)+ 10, SQ_SIZE * 4 + 175), (SQ_SIZE * 4 - 20, 100))
+    analysis_rect = pg.Rect((WIDTH - (SQ_SIZE * 4)+ 10, SQ_SIZE * 4 + 285), (SQ_SIZE * 4 - 20, 100))
+    explorer = position_index.PositionIndex(POSITION_INDEX_PATH) if position_index.index_exists(POSITION_INDEX_PATH) else None
+    movePanel = move_list_panel.MoveListPanel(textbox_rect, pg.font.SysFont('arial', 18), pg.font.SysFont('arial', 18, True)) # Only re-renders rows that changed
     
 
 
@@ -118,19 +170,54 @@ def main():
     ai_enabled = False   # AI is enabled by default
     game_over = False
     sliderInteracting = False
+    showHUD = False # performance telemetry overlay, toggled with F3
+    analysisMode = False # live multi-PV panel, toggled with 'a'
+    liveAnalysis = None # started on first use, it runs its own Stockfish process
+    gameProfiler = profiler.Profiler(PROFILE_DIR) # idle (no thread, no hooks) until F9 is pressed
+    aiExecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ai") # the AI thinks off the game loop
+    aiFuture = None
+    aiFen = None # position the running search is for
+    premoveDiscarded = None # (move, time) of the last premove that became illegal, for the visual cue
+    engineStatus = None # last engine status shown on the AI button and the eval bar
+    firstFrame = True
 
     #MAIN GAME LOOP
     while running:
         time_delta = clock.tick(MAX_FPS) / 1000.0  # Calculate time delta for smooth animations
+        frame_start = time.perf_counter()
         for event in pg.event.get():
             manager.process_events(event)
+            movePanel.handle_event(event) # mouse wheel scrolls the move list
             if event.type == pg.QUIT:
                 running = False
             #Mouse and keyboard events
-            elif event.type == pg.MOUSEBUTTONDOWN:
-                moveMade, animate, moved_piece, captured_piece = mouseHandler(gs)
+            elif event.type == pg.MOUSEBUTTONDOWN: #during the AI's turn clicks queue premoves
+                moveMade, animate, moved_piece, captured_piece = mouseHandler(gs, premove=ai_enabled and not gs.chessBoard.turn)
             elif event.type == pg.KEYDOWN:
-                if event.key == pg.K_z: #undo move when 'z' is pressed
+                if event.key == pg.K_F3: #toggle the performance HUD
+                    showHUD = not showHUD
+                elif event.key == pg.K_F9: #profile the next PROFILE_SECONDS (press again to stop early)
+                    gameProfiler.toggle(PROFILE_SECONDS, {'ply': len(gs.chessBoard.move_stack), 'ai': ai_enabled,
+                                                          'difficulty': gs.stockfishDifficulty})
+                elif event.key == pg.K_a: #toggle the live analysis panel
+                    analysisMode = not analysisMode
+                    if liveAnalysis is None:
+                        liveAnalysis = live_analysis.LiveAnalysis(stockfish_path)
+                    if not analysisMode:
+                        liveAnalysis.pause()
+                        screen.fill(colors['mainBackground'], analysis_rect)
+                elif event.key in (pg.K_LEFT, pg.K_RIGHT, pg.K_DOWN, pg.K_p) and not ai_enabled: #walk the variation tree
+                    if event.key == pg.K_LEFT:
+                        gs.undoMove() # the move stays in the tree
+                    elif event.key == pg.K_RIGHT:
+                        gs.redoMove()
+                    elif event.key == pg.K_DOWN:
+                        gs.nextVariation() # cycle through the alternatives to the last move
+                    else:
+                        gs.promoteVariation()
+                    moveMade = True
+                    animate = False
+                elif event.key == pg.K_z: #undo move when 'z' is pressed
                     if ai_enabled:
                         if len(gs.move_log) >= 2:
                             gs.undoMove()
@@ -142,11 +229,6 @@ def main():
                         moveMade = True
                         animate = False
 
-                    if len(gs.move_log) == 0:
-                        gs.move_log = []  # Reset the move log
-                        last_move_string = ""  # Clear the displayed move log
-                        textbox = create_or_update_textbox("", textbox_rect, manager, textbox)  # Clear the textbox
-
             #button handler
             if undoButton.check_click():
                 if ai_enabled:
@@ -160,15 +242,11 @@ def main():
                     moveMade = True
                     animate = False
 
-                if len(gs.move_log) == 0:
-                    gs.move_log = []  # Reset the move log
-                    last_move_string = ""  # Clear the displayed move log
-                    textbox = create_or_update_textbox("", textbox_rect, manager, textbox)  # Clear the textbox
-
                 
 
-            if aiToggleButton.check_click():  # Toggle AI button
+            if aiToggleButton.check_click() and gs.engine_status == 'ready':  # Toggle AI button, usable once the engine is
                 ai_enabled = not ai_enabled  # Enable/disable AI
+                gs.premoves.clear()
                 player_turn = True  # Ensure player starts if AI is disabled
 
             if event.type == pgui.UI_HORIZONTAL_SLIDER_MOVED:
@@ -203,21 +281,53 @@ def main():
 
         
 
-        if ai_enabled and not gs.chessBoard.turn and not animate:
-            ai_move = gs.get_ai_move()
-            if ai_move:
-                ai_san_move = gs.chessBoard.san(ai_move)
-                gs.move_log.append(ai_san_move)  # Register move in log
-                gs.chessBoard.push(ai_move)
+        telemetry.observe("frame.events", (time.perf_counter() - frame_start) * 1000)
+
+        if gs.engine_status != engineStatus: # the engine finished (or failed) starting in the background
+            engineStatus = gs.engine_status
+            aiToggleButton.set_text(AI_BUTTON_TEXT[engineStatus], gui_font, 'white')
+            if engineStatus == 'ready':
+                telemetry.observe("startup.engine_ready", (gs.engine_ready_time - startup_start) * 1000)
+                print(f"Engine ready after {(gs.engine_ready_time - startup_start) * 1000:.0f} ms.")
+
+        if ai_enabled and not gs.chessBoard.turn and not animate and aiFuture is None:
+            aiFen = gs.chessBoard.fen()
+            aiFuture = aiExecutor.submit(gs.get_ai_move, 1.0, gs.chessBoard.copy()) # timed as engine.play
+        if aiFuture is not None and aiFuture.done():
+            try:
+                ai_move = aiFuture.result()
+            except chess.engine.EngineError as e: # the search failed, the game goes on without the AI
+                print(f"Error: Stockfish failed to find a move ({e}). AI disabled.")
+                ai_move = None
+                ai_enabled = False
+                gs.premoves.clear()
+                if isinstance(e, chess.engine.EngineTerminatedError): # the process is gone
+                    gs.close_stockfish()
+                    gs.engine_status = 'failed' # the button shows it on the next check
+            aiFuture = None
+            if ai_move and ai_enabled and gs.chessBoard.fen() == aiFen: # replies to an undone position are dropped
+                moved_piece = gs.chessBoard.piece_at(ai_move.from_square)
+                captured_piece = gs.chessBoard.piece_at(ai_move.to_square)
+                gs.makeAIMove(ai_move) # Register move in log and push it
                 player_turn = True  # Switch back to player
                 moveMade = True  # Set moveMade to True for the animation
                 animate = True
+                if gs.premoves:
+                    premove_from, premove_to = gs.premoves[0]
+                    premove_piece, premove_captured = gs.chessBoard.piece_at(premove_from), gs.chessBoard.piece_at(premove_to)
+                premove = gs.applyPremove() # in the same frame, so premoves add no latency
+                if premove is not None:
+                    animate = False # the reply and the premove appear at once, without animation but with sound
+                    moveSound(moved_piece, captured_piece)
+                    if premove[0]:
+                        moveSound(premove_piece, premove_captured)
+                    else:
+                        premoveDiscarded = (premove[1], time.monotonic())
 
                 
 
         # executables whenever a move is made
         if moveMade:
-            draw_eval_bar(screen, gs)
             if isinstance(moveMade, tuple):
                 print(moveMade)
                 if moveMade[0] == 'pawnPromotion':
@@ -230,10 +340,9 @@ def main():
                     else:
                         gs.doPawnPromotion(chess.QUEEN, moveMade[1])  # AI chooses Queen for pawn promotion
 
-            if gs.move_log and len(gs.move_log) > 0:
-                drawText(textbox_rect, gs, last_move_string, textbox, checkGameStatus) # Update the textbox with the move log
             if animate:
-                animateMove(gs.chessBoard.move_stack[-1], screen, gs, clock, moved_piece, captured_piece, ai_enabled)  # Animate the last move made
+                with telemetry.span("draw.animate_move"):
+                    animateMove(gs.chessBoard.move_stack[-1], screen, gs, clock, moved_piece, captured_piece, ai_enabled)  # Animate the last move made
                 moveSound(moved_piece, captured_piece)  # Play sound for the move
             moveMade = False
             animate = False
@@ -241,29 +350,83 @@ def main():
 
 
         #Update the UI manager
-        manager.update(time_delta)
+        with telemetry.span("ui.update"):
+            manager.update(time_delta)
         
         #Check for game status
         checkGameStatus = gs.check_game_status()
         if checkGameStatus in ("Checkmate", "Stalemate", "insufficient material", "75-move", "Fivefold"):
+            if not game_over:
+                gs.end_game() # finished games are not recovered from the autosave journal
+                if explorer is None:
+                    explorer = position_index.PositionIndex(POSITION_INDEX_PATH) # the first finished game starts the index
+                tags = {'Date': game_database.today(), 'White': "Player", 'Black': "Stockfish" if ai_enabled else "Player"}
+                try:
+                    with game_database.GameDatabase(GAME_DATABASE_PATH) as database:
+                        gs.store_game(database, tags, explorer) # indexed for the explorer as it is saved
+                except OSError as e:
+                    print(f"Error: could not store the finished game ({e}).")
             game_over = True
         else:
+            if game_over:
+                gs.attach_journal(journal) # undo out of a finished game resumes journaling
             game_over = False
 
         
         #Draw the board and other graphics
-        drawGameState(screen, gs, checkGameStatus, ai_enabled)
+        with telemetry.span("draw.move_list"):
+            drawText(screen, movePanel, gs, checkGameStatus) # Update the move list panel with the move log
+        with telemetry.span("draw.game_state"):
+            drawGameState(screen, gs, checkGameStatus, ai_enabled)
+            drawPremoves(screen, gs, ai_enabled, premoveDiscarded)
         
 
         #draw UI after Game State
-        drawButtons(screen, gs, undoButton, aiToggleButton) # Replace with pygameGui button
+        if explorer is not None and not game_over:
+            with telemetry.span("draw.explorer"):
+                drawExplorer(screen, explorer, gs, explorer_rect) # opening explorer stats for the current position
         if not game_over:
-            manager.draw_ui(screen) #UI should be drawn after game state
+            with telemetry.span("draw.eval_graph"):
+                evalHistory.set_game(gs.chessBoard)
+                drawEvalGraph(screen, evalHistory, graph_rect) # eval over the whole game, refined in the background
+        if analysisMode and not game_over:
+            with telemetry.span("draw.analysis"):
+                liveAnalysis.set_position(gs.chessBoard) # restarts the search only when the position changed
+                drawAnalysisPanel(screen, liveAnalysis, analysis_rect)
+        with telemetry.span("draw.eval_bar"):
+            evaluation = evalHistory.evaluation(gs.chessBoard)
+            draw_eval_bar(screen, gs, None if evaluation is None else evaluation[0]) # no engine call, so every frame
+        with telemetry.span("draw.buttons"):
+            drawButtons(screen, gs, undoButton, aiToggleButton) # Replace with pygameGui button
+        if not game_over:
+            with telemetry.span("ui.draw"):
+                manager.draw_ui(screen) #UI should be drawn after game state
+        if showHUD:
+            drawTelemetryHUD(screen)
+        telemetry.observe("frame.work", (time.perf_counter() - frame_start) * 1000) # everything but waiting for the next tick
+        telemetry.count("frames")
+        telemetry.TELEMETRY.maybe_export()
 
         clock.tick(MAX_FPS)
-        pg.display.update()
-
+        with telemetry.span("display.update"):
+            pg.display.update()
+        if firstFrame:
+            firstFrame = False
+            telemetry.observe("startup.first_frame", (time.perf_counter() - startup_start) * 1000)
+            print(f"First frame after {(time.perf_counter() - startup_start) * 1000:.0f} ms.")
+
+    if telemetry.TELEMETRY.export_path:
+        telemetry.TELEMETRY.export() # final snapshot
+    aiExecutor.shutdown() # lets a running search finish before the engine is closed
     gs.close_stockfish()
+    evalHistory.close()
+    if liveAnalysis is not None:
+        liveAnalysis.close()
+    movePreview.close()
+    journal.close()
+    stats = gs.analysis_cache.stats()
+    print(f"Analysis cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%}).")
+    gs.analysis_cache.close()
 
 
 
@@ -273,8 +436,14 @@ input handlers and user input events
 #global variables
 sqSelected = () # deselect
 playerClicks = [] # clear player clicks
+movePreview = None # move_preview.MovePreview, created by main
 
-def mouseHandler(gs):
+def mouseHandler(gs, premove=False):
+    """
+    Selects a piece on the first click and moves it on the second.
+
+    :param premove: The AI is thinking: the two clicks queue a premove instead, validated once the reply lands.
+    """
     global sqSelected, playerClicks
     location = pg.mouse.get_pos()  # (x, y) location of mouse
     col = int(location[0] // SQ_SIZE)
@@ -291,6 +460,13 @@ def mouseHandler(gs):
         sqSelected = ()  # Deselect
         playerClicks = []  # Clear player clicks
 
+    if premove:
+        if len(playerClicks) == 2:
+            gs.queuePremove(playerClicks[0], playerClicks[1])
+            sqSelected = ()
+            playerClicks = []
+        return False, False, None, None
+
     if len(playerClicks) == 2:  # After second click
         start_coord = playerClicks[0]
         end_coord = playerClicks[1]
@@ -451,6 +627,11 @@ def highlightSquaresValid(screen, gs, sqSelected):
         pieceSelected = gs.chessBoard.piece_at(chess.square(col, 7 - row))  # Get the piece at the selected square
         pieceColor = gs.chessBoard.color_at(chess.square(col, 7 - row))  # Get the piece at the selected square
         if pieceSelected is not None and pieceColor == gs.chessBoard.turn:
+            # Evaluations of the targets, filled in by the background searches as they finish
+            evals = {}
+            if movePreview is not None:
+                movePreview.select(gs.chessBoard, chess.square(col, 7 - row))
+                evals = movePreview.results(gs.chessBoard, chess.square(col, 7 - row))
             # Highlight possible moves
             validMoves = gs.getValidMoves(sqSelected)
             for move in validMoves:
@@ -461,8 +642,42 @@ def highlightSquaresValid(screen, gs, sqSelected):
 
                 circle_surface = pg.Surface((SQ_SIZE, SQ_SIZE), pg.SRCALPHA)  # Create a surface for the circle
 
-                pg.draw.circle(circle_surface, (100, 100, 100, 100), (SQ_SIZE // 2, SQ_SIZE // 2), radius)  # Yellow with transparency
+                cp, verdict = evals.get(chess.square(target_col, 7 - target_row), (None, None))
+                pg.draw.circle(circle_surface, PREVIEW_COLORS.get(verdict, (100, 100, 100, 100)), (SQ_SIZE // 2, SQ_SIZE // 2), radius)
+                if cp is not None:
+                    label = previewLabel(cp)
+                    circle_surface.blit(label, label.get_rect(midbottom=(SQ_SIZE // 2, SQ_SIZE - 2)))
                 screen.blit(circle_surface, (target_col * SQ_SIZE, target_row * SQ_SIZE))  # Draw the circle on the board
+            return
+    if movePreview is not None:
+        movePreview.clear() # nothing selected, drop the queued searches
+
+def previewLabel(cp):
+    """Score of a previewed move in pawns for the mover, rendered once per distinct text."""
+    text = ("+#" if cp > 0 else "-#") if abs(cp) > MATE_THRESHOLD else f"{cp / 100:+.1f}" # forced mate for / against
+    labels = previewLabel.__dict__.setdefault("labels", {})
+    if text not in labels:
+        labels[text] = pg.font.SysFont('arial', 14, True).render(text, True, pg.Color("white"))
+    return labels[text]
+
+def drawPremoves(screen, gs, ai_enabled, discarded=None):
+    """
+    Marks the squares of the queued premoves and of a premove being selected, and briefly flashes a premove
+    that was discarded because it had become illegal.
+
+    :param discarded: (move, time.monotonic() when it was discarded) or None.
+    """
+    squares = [square for premove in gs.premoves for square in premove]
+    if sqSelected != () and ai_enabled and not gs.chessBoard.turn:
+        squares.append(chess.square(sqSelected[1], 7 - sqSelected[0])) # selecting a premove during the AI's turn
+    s = pg.Surface((SQ_SIZE, SQ_SIZE), pg.SRCALPHA)
+    s.fill(PREMOVE_COLOR)
+    for square in squares:
+        screen.blit(s, (chess.square_file(square) * SQ_SIZE, (7 - chess.square_rank(square)) * SQ_SIZE))
+    if discarded is not None and time.monotonic() - discarded[1] < PREMOVE_DISCARD_SECONDS:
+        s.fill(PREMOVE_DISCARD_COLOR)
+        for square in (discarded[0].from_square, discarded[0].to_square):
+            screen.blit(s, (chess.square_file(square) * SQ_SIZE, (7 - chess.square_rank(square)) * SQ_SIZE))
 
 def highlightLastMove(screen, gs): # highlights the start and end squares of the last move
     if gs.chessBoard.move_stack:
@@ -535,69 +750,132 @@ def isGameOver(screen, gs, checkGameStatus):
 
         screen.blit(text, text_rect)  # Draw the game over message
         if not hasattr(isGameOver, "confetti_list"):
-            isGameOver.confetti_list = generate_confetti(300, WIDTH, HEIGHT)  # Generate 100 confetti particles
+            isGameOver.confetti_list = generate_confetti(300, WIDTH, HEIGHT)  # Generate 300 confetti particles
 
         # Animate the confetti
         animate_confetti(isGameOver.confetti_list, screen)
 
-def create_or_update_textbox(new_text, textbox_rect, manager, textbox=None):
+def drawText(screen, movePanel, gs, checkGameStatus):
     """
-    Creates or updates a dynamically updating text box using pygame_gui.
-    
-    :param new_text: The text to display.
-    :param textbox_rect: The rectangle area of the text box.
-    :param manager: The pygame_gui UIManager instance.
-    :param textbox: The existing text box (if any), used for updates.
-    :return: The updated or new text box object.
+    Draws the move log into the side panel. The panel only renders the plies that changed since the
+    last frame and only the rows that are visible, so long games stay smooth.
+    """
+    if checkGameStatus == "Checkmate":
+        return # the move list is hidden behind the game over screen
+    movePanel.sync(gs.move_log)
+    movePanel.draw(screen)
+
+def drawExplorer(screen, explorer, gs, rect, max_rows=5):
+    """
+    Draws opening explorer statistics (games and White/draw/Black percentages per move) for the current
+    position. The panel is only re-rendered when the position changes.
+    """
+    key = chess.polyglot.zobrist_hash(gs.chessBoard)
+    cached = getattr(drawExplorer, "cache", None)
+    if cached is None or cached[0] != key:
+        font = pg.font.SysFont('arial', 16)
+        panel = pg.Surface(rect.size)
+        panel.fill(colors['mainBackground'])
+        columns = (0, 60, 140) # move, games, White / draw / Black percentages
+        for x, title in zip(columns, ("Move", "Games", "W / D / B %")):
+            panel.blit(font.render(title, True, colors['aiBackground']), (x, 0))
+        stats = explorer.lookup(gs.chessBoard)
+        if not stats:
+            panel.blit(font.render("No games reached this position", True, pg.Color("grey")), (0, 20))
+        for i, entry in enumerate(stats[:max_rows]):
+            games = entry['games']
+            percentages = f"{100 * entry['white'] // games} / {100 * entry['draws'] // games} / {100 * entry['black'] // games}"
+            for x, text in zip(columns, (entry['san'], str(games), percentages)):
+                panel.blit(font.render(text, True, pg.Color("white")), (x, 20 * (i + 1)))
+        drawExplorer.cache = cached = (key, panel)
+    screen.blit(cached[1], rect)
+
+def drawEvalGraph(screen, history, rect):
+    """
+    Draws the evaluation of every ply of the game as a line graph, White's advantage up. Only finished
+    results are read from the background worker, and the graph is only re-rendered when they change.
+    """
+    cached = getattr(drawEvalGraph, "cache", None)
+    if cached is None or cached[0] != history.version:
+        graph = pg.Surface(rect.size)
+        graph.fill(colors['mainBackground'])
+        middle = rect.height / 2
+        pg.draw.line(graph, pg.Color("grey"), (0, middle), (rect.width, middle)) # equal position
+        points = history.points()
+        step = rect.width / max(len(points) - 1, 1)
+        line = [(ply * step, middle - chess_engine.normalize_score(point[0]) * (middle - 2))
+                for ply, point in enumerate(points) if point is not None]
+        if len(line) > 1:
+            pg.draw.lines(graph, pg.Color("white"), False, line, 2)
+        if history.current < len(points) and points[history.current] is not None:
+            x = history.current * step
+            pg.draw.line(graph, colors['aiBackground'], (x, 0), (x, rect.height)) # current ply
+        pg.draw.rect(graph, pg.Color("grey"), graph.get_rect(), 1)
+        drawEvalGraph.cache = cached = (history.version, graph)
+    screen.blit(cached[1], rect)
+
+def drawAnalysisPanel(screen, analysis, rect):
+    """
+    Draws the top candidate lines of the live analysis: score (White's point of view), depth and the
+    principal variation. The engine reports far more often than the frame rate, so the panel is only
+    re-rendered once per frame at most, and only when a line changed.
+    """
+    cached = getattr(drawAnalysisPanel, "cache", None)
+    if cached is None or cached[0] != analysis.version:
+        font = pg.font.SysFont('arial', 16)
+        panel = pg.Surface(rect.size)
+        panel.fill(colors['mainBackground'])
+        lines = analysis.lines()
+        title = f"Analysis  depth {lines[0]['depth']}" if lines else "Analysis  (searching...)"
+        panel.blit(font.render(title, True, colors['aiBackground']), (0, 0))
+        for i, line in enumerate(lines):
+            if line['mate'] is not None:
+                score = f"#{line['mate']}"
+            else:
+                score = f"{line['cp'] / 100:+.2f}"
+            panel.blit(font.render(score, True, pg.Color("white")), (0, 20 * (i + 1)))
+            panel.blit(font.render(line['san'], True, pg.Color("grey")), (60, 20 * (i + 1)))
+        drawAnalysisPanel.cache = cached = (analysis.version, panel)
+    screen.blit(cached[1], rect)
+
+def drawTelemetryHUD(screen, refresh_frames=MAX_FPS):
+    """
+    Draws the telemetry overlay: p50 / p99 / max in ms of every frame phase and engine call, plus the last
+    search depth, nps and hashfull. The text is only re-rendered about once a second.
+    """
+    frame = telemetry.TELEMETRY.counters.get("frames", 0)
+    cached = getattr(drawTelemetryHUD, "cache", None)
+    if cached is None or frame - cached[0] >= refresh_frames:
+        font = pg.font.SysFont('arial', 14)
+        snapshot = telemetry.TELEMETRY.snapshot()
+        lines = []
+        for name, summary in sorted(snapshot['series'].items()):
+            if 'p50' not in summary:
+                continue
+            if name in ("engine.depth", "engine.nps", "engine.hashfull"):
+                lines.append(f"{name:<18} {summary['last']:>10.0f}")
+            else:
+                lines.append(f"{name:<18} {summary['p50']:7.2f} {summary['p99']:7.2f} {summary['max']:7.2f} ms")
+        hud = pg.Surface((SQ_SIZE * 4, 16 * len(lines) + 8), pg.SRCALPHA)
+        hud.fill((0, 0, 0, 180))
+        for i, line in enumerate(lines):
+            hud.blit(font.render(line, True, pg.Color("white")), (4, 4 + 16 * i))
+        drawTelemetryHUD.cache = cached = (frame, hud)
+    screen.blit(cached[1], (0, 0))
+
+def draw_eval_bar(screen, gs, engine_cp=None):
+    """
+    Draw an evaluation bar. The static estimate of the game state's incremental evaluator is shown at once,
+    and Stockfish's score replaces it when it arrives, the bar easing between the two instead of jumping.
+    The outline is dimmed while only the estimate is shown.
+
+    :param engine_cp: Stockfish evaluation of the current position in centipawns for White, None while pending.
     """
-    if textbox is None:
-        # Create the text box if it doesn't exist
-        textbox = pgui.elements.UITextBox(
-            new_text,
-            relative_rect=textbox_rect,
-            manager=manager,
-            object_id="#textbox",
-        )
-    elif textbox.html_text != new_text:  # Only update if the text has changed
-        textbox.set_text(new_text)
-
-    return textbox
-
-def drawText(textbox_rect, gs, last_move_string, textbox, checkGameStatus):
-        if checkGameStatus == "Checkmate":
-            if textbox is not None:
-                textbox.kill()
-            return None, last_move_string
-    # Concatenate moves into groups of three pairs (six moves) per line
-        move_list = []
-        line = ""
-        for i, move in enumerate(gs.move_log):
-            if i % 2 == 0:  # White's move
-                line += f"<b>{i // 2 + 1}.</b> {move} "  # Add move number and White's move
-            else:  # Black's move
-                line += f"{move}  "  # Add Black's move
-
-            # Add a line break after every three pairs of moves (six moves)
-            if (i + 1) % 6 == 0:
-                move_list.append(line.strip())  # Add the line to the move list
-                line = ""  # Reset the line
-
-        # Add any remaining moves to the move list
-        if line:
-                    move_list.append(line.strip())
-
-        # Join the move list into a single string with line breaks
-        move_string = "\n".join(move_list)
-
-        # Only update the textbox if the move string has changed
-        if move_string != last_move_string:
-            textbox = create_or_update_textbox(move_string, textbox_rect, manager, textbox)
-            last_move_string = move_string  # Update the last move string
-
-def draw_eval_bar(screen, gs):
-    """Draw an evaluation bar based on Stockfish evaluation."""
-    eval_score = gs.get_eval()
     BAR_WIDTH = 10
+    target = gs.quick_eval() if engine_cp is None else chess_engine.normalize_score(engine_cp)
+    eval_score = getattr(draw_eval_bar, "shown", target)
+    eval_score += (target - eval_score) * EVAL_BAR_EASING
+    draw_eval_bar.shown = eval_score
 
     bar_height = (SQ_SIZE * DIMENSION) * (0.5 - eval_score / 2)  # Map eval to height 
     pg.draw.rect(screen, (255, 255, 255), (SQ_SIZE * DIMENSION, bar_height, BAR_WIDTH, HEIGHT - bar_height)) #whites evaluation
@@ -605,7 +883,7 @@ def draw_eval_bar(screen, gs):
 
     # Draw an outline around the evaluation bar
     outline_rect = pg.Rect(SQ_SIZE * DIMENSION, 0, BAR_WIDTH, HEIGHT)  # Full height of the bar
-    pg.draw.rect(screen, pg.Color('grey'), outline_rect, 2)  # Red outline with a width of 2 pixels
+    pg.draw.rect(screen, pg.Color('grey' if engine_cp is not None else 'dim grey'), outline_rect, 2)
 
 """
 Event Handlers
@@ -626,7 +904,7 @@ def animateMove(move, screen, gs, clock, moved_piece, captured_piece, ai_enabled
     distance = abs(dR) + abs(dC)
     scalingFactor = 3
     baseFrameCount = 8
-    frameCount = int(scalingFactor * np.sqrt(distance) + baseFrameCount)
+    frameCount = int(scalingFactor * math.sqrt(distance) + baseFrameCount)
     for frame in range(frameCount + 1):
         r, c = (move_coordinates[0][0] + dR*frame/frameCount, move_coordinates[0][1] + dC*frame/frameCount)
         drawBoard(screen, gs, ai_enabled)
@@ -659,39 +937,13 @@ def moveSound(moved_piece, captured_piece):
         else:
             pieceMoveSound.play()     
 
-class Confetti:
-    def __init__(self, x, y, color, speed):
-        self.x = x
-        self.y = y
-        self.color = color
-        self.speed = speed
-        self.size = random.randint(3, 7)  # Random size for each confetti particle
-
-    def update(self):
-        # Move the confetti particle downward
-        self.y += self.speed
-        # Add some horizontal drift
-        self.x += random.uniform(-1, 1)
-
-    def draw(self, screen):
-        # Draw the confetti particle as a small rectangle
-        pg.draw.rect(screen, self.color, (self.x, self.y, self.size, self.size))
-    
 def generate_confetti(num_particles, screen_width, screen_height):
-    confetti_list = []
-    for _ in range(num_particles):
-        x = random.randint(0, screen_width)
-        y = random.randint(-screen_height, 0)  # Start above the screen
-        color = random.choice([(255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 0), (255, 0, 255), (0, 255, 255)])
-        speed = random.uniform(1, 5)  # Random falling speed
-        confetti_list.append(Confetti(x, y, color, speed))
-    return confetti_list
-
-def animate_confetti(confetti_list, screen):
-    for confetti in confetti_list:
-        confetti.update()
-        confetti.draw(screen)
+    import particles # NumPy is only loaded once there is something to celebrate
+    return particles.confetti(num_particles, screen_width, screen_height) # NumPy backed, one batched blit per frame
 
+def animate_confetti(confetti_system, screen):
+    confetti_system.update()
+    confetti_system.draw(screen)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,327 @@
+"""
+Empirical Elo calibration of the Stockfish difficulty table.
+
+Plays engine-vs-engine matches between neighbouring Skill Levels and between Skill Levels and anchor
+configurations whose strength is known (UCI_LimitStrength with a fixed UCI_Elo). Game pairs (same opening,
+colours swapped) are spread over a process pool, two engines per worker, interleaving all pairings so every
+core stays busy. A pairing stops early once a sequential probability ratio test (SPRT) shows one side is
+clearly stronger or the two are clearly close. Ratings are then fitted by maximum likelihood with the
+anchors fixed, with 95% confidence intervals from the Fisher information, and written as the difficulty
+table GameState loads on start.
+
+Results are saved after every game pair, so an interrupted calibration continues where it stopped.
+
+Usage:
+    python elo_calibration.py --stockfish stockfish/stockfish-macos-m1-apple-silicon --movetime 0.2
+"""
+import argparse
+import collections
+import datetime
+import json
+import math
+import multiprocessing.util
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import chess
+import chess.engine
+import numpy as np
+
+import chess_engine_v2
+
+
+STOCKFISH_PATH = "stockfish/stockfish-macos-m1-apple-silicon"
+RESULTS_PATH = "calibration_results.json"
+SKILL_LEVELS = range(0, 21)
+ANCHOR_ELOS = (1400, 1700, 2000, 2300, 2600, 2900)  # within Stockfish's UCI_Elo range
+MOVE_TIME = 0.2
+MAX_GAMES = 400  # per pairing, if SPRT has not stopped it before
+MAX_PLIES = 300  # longer games are scored as draws
+SPRT_ELO = 50  # SPRT tells "stronger by at least this much" apart from "equal"
+SPRT_ALPHA = SPRT_BETA = 0.05
+
+# balanced openings, every game pair starts from one of them
+OPENINGS = (
+    "e4 e5 Nf3 Nc6 Bb5 a6", "e4 c5 Nf3 d6 d4 cxd4", "e4 e6 d4 d5 Nc3 Nf6", "e4 c6 d4 d5 e5 Bf5",
+    "d4 d5 c4 e6 Nc3 Nf6", "d4 Nf6 c4 g6 Nc3 Bg7", "d4 Nf6 c4 e6 Nc3 Bb4", "c4 e5 Nc3 Nf6 Nf3 Nc6",
+    "Nf3 d5 g3 Nf6 Bg2 e6", "e4 e5 Nf3 Nc6 Bc4 Bc5", "d4 d5 c4 c6 Nf3 Nf6", "e4 d5 exd5 Qxd5 Nc3 Qa5",
+)
+
+_engines = None  # per worker: two chess.engine.SimpleEngine
+
+
+"""
+Players and pairings
+"""
+def skill_player(skill):
+    return f"skill{skill}"
+
+
+def anchor_player(elo):
+    return f"anchor{elo}"
+
+
+def player_options(player):
+    """UCI options of a player name as produced by skill_player / anchor_player."""
+    if player.startswith("anchor"):
+        return {"UCI_LimitStrength": True, "UCI_Elo": int(player[len("anchor"):])}
+    return {"UCI_LimitStrength": False, "Skill Level": int(player[len("skill"):])}
+
+
+def make_pairings(skills=SKILL_LEVELS, anchors=ANCHOR_ELOS, table=None):
+    """
+    Neighbouring Skill Levels play each other, and every Skill Level plays the two anchors closest to its
+    rating in the current difficulty table (the levels are not Elo-labelled below 1).
+    """
+    table = table or {skill: int(elo) for elo, skill in chess_engine_v2.DEFAULT_DIFFICULTY.items()}
+    skills = list(skills)
+    pairings = [(skill_player(a), skill_player(b)) for a, b in zip(skills, skills[1:])]
+    if anchors:
+        for skill in skills:
+            guess = table.get(skill, min(table.values()) - 100)
+            for elo in sorted(anchors, key=lambda anchor: abs(anchor - guess))[:2]:
+                pairings.append((skill_player(skill), anchor_player(elo)))
+    return pairings
+
+
+"""
+SPRT and rating fit
+"""
+def expected_score(elo_difference):
+    return 1 / (1 + 10 ** (-elo_difference / 400))
+
+
+def llr(wins, draws, losses, elo0, elo1):
+    """Log likelihood ratio of H1 (difference elo1) over H0 (elo0), trinomial normal approximation."""
+    # half a win, a draw and a loss of prior: a sweep or all draws would otherwise have zero variance
+    wins, draws, losses = wins + 0.5, draws + 0.5, losses + 0.5
+    n = wins + draws + losses
+    score = (wins + draws / 2) / n
+    variance = (wins + draws / 4) / n - score ** 2
+    s0, s1 = expected_score(elo0), expected_score(elo1)
+    return (s1 - s0) * (2 * score - s0 - s1) / (2 * variance / n)
+
+
+def sprt_finished(wins, draws, losses, elo=SPRT_ELO, alpha=SPRT_ALPHA, beta=SPRT_BETA):
+    """
+    Two-sided SPRT: stops once either player is shown to be stronger by `elo`, or both tests accept that
+    the difference is smaller.
+    """
+    lower, upper = math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+    first, second = llr(wins, draws, losses, 0, elo), llr(wins, draws, losses, 0, -elo)
+    return first >= upper or second >= upper or (first <= lower and second <= lower)
+
+
+def fit_ratings(results, anchors, iterations=50):
+    """
+    Maximum likelihood ratings (Bradley-Terry, a draw counts half a win) with the anchors fixed.
+
+    :param results: dict (player a, player b) -> [wins, draws, losses] of a.
+    :param anchors: dict player -> fixed Elo.
+    :return: dict player -> (Elo, standard error)
+    """
+    players = sorted({player for pairing in results for player in pairing})
+    index = {player: i for i, player in enumerate(players)}
+    free = [i for i, player in enumerate(players) if player not in anchors]
+    ratings = np.array([anchors.get(player, 1500.0) for player in players], dtype=float)
+    if not anchors and free:
+        free = free[1:]  # without anchors the scale is pinned at the first player
+    k = math.log(10) / 400
+    hessian = np.zeros((len(players), len(players)))
+    for _ in range(iterations):
+        gradient = np.zeros(len(players))
+        hessian[:] = 0
+        for (a, b), (wins, draws, losses) in results.items():
+            n = wins + draws + losses
+            if not n:
+                continue
+            i, j = index[a], index[b]
+            expected = expected_score(ratings[i] - ratings[j])
+            observed = (wins + draws / 2) / n
+            gradient[i] += k * n * (observed - expected)
+            gradient[j] -= k * n * (observed - expected)
+            curvature = k * k * n * expected * (1 - expected)
+            hessian[i, i] -= curvature
+            hessian[j, j] -= curvature
+            hessian[i, j] += curvature
+            hessian[j, i] += curvature
+        block = hessian[np.ix_(free, free)] - 1e-9 * np.eye(len(free))  # tiny prior keeps it invertible
+        step = np.linalg.solve(block, gradient[free])
+        ratings[free] = np.clip(ratings[free] - step, 0, 4000)  # a perfect score has no finite estimate
+        if np.abs(step).max(initial=0) < 0.01:
+            break
+    errors = np.zeros(len(players))
+    if free:
+        covariance = np.linalg.inv(-(hessian[np.ix_(free, free)] - 1e-9 * np.eye(len(free))))
+        errors[free] = np.sqrt(np.clip(np.diag(covariance), 0, None))
+    return {player: (float(ratings[i]), float(errors[i])) for player, i in index.items()}
+
+
+"""
+Workers
+"""
+def init_worker(stockfish_path):
+    global _engines
+    _engines = [chess.engine.SimpleEngine.popen_uci(stockfish_path) for _ in range(2)]
+    multiprocessing.util.Finalize(None, close_worker, exitpriority=10)
+
+
+def close_worker():
+    for engine in _engines:
+        engine.quit()
+
+
+def play_game(white, black, opening, move_time):
+    """:return: score of White (1, 0.5 or 0)"""
+    board = chess.Board()
+    for san in opening.split():
+        board.push_san(san)
+    players = {chess.WHITE: (_engines[0], player_options(white)), chess.BLACK: (_engines[1], player_options(black))}
+    game = object()  # a new game object makes python-chess send ucinewgame, clearing the hash
+    limit = chess.engine.Limit(time=move_time)
+    while not board.is_game_over(claim_draw=True) and board.ply() < MAX_PLIES:
+        engine, options = players[board.turn]
+        result = engine.play(board, limit, game=game, options=options)
+        if result.resigned or result.move is None:
+            return 0.0 if board.turn == chess.WHITE else 1.0
+        board.push(result.move)
+    outcome = board.outcome(claim_draw=True)
+    if outcome is None or outcome.winner is None:
+        return 0.5
+    return 1.0 if outcome.winner == chess.WHITE else 0.0
+
+
+def play_pair(job):
+    """
+    Worker entry point: a game pair with colours swapped.
+
+    :return: (pairing, list of scores of the pairing's first player)
+    """
+    (a, b), opening, move_time = job
+    return (a, b), [play_game(a, b, opening, move_time), 1.0 - play_game(b, a, opening, move_time)]
+
+
+"""
+Calibration
+"""
+def load_results(path):
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return {tuple(key.split(" vs ")): counts for key, counts in data['results'].items()}
+
+
+def save_results(path, results, move_time):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({'move_time': move_time, 'results': {" vs ".join(key): counts for key, counts in results.items()}},
+                  f, indent=1)
+    os.replace(tmp_path, path)
+
+
+def calibrate(pairings, stockfish_path=STOCKFISH_PATH, move_time=MOVE_TIME, max_games=MAX_GAMES, workers=None,
+              results_path=RESULTS_PATH, progress=None):
+    """
+    Plays the pairings until SPRT stops them or they reach max_games, continuing saved results.
+
+    :return: dict (player a, player b) -> [wins, draws, losses] of a
+    """
+    workers = workers or os.cpu_count() or 1
+    results = load_results(results_path)
+    for pairing in pairings:
+        results.setdefault(pairing, [0, 0, 0])
+
+    def open_pairings():
+        return [pairing for pairing in pairings
+                if sum(results[pairing]) < max_games and not sprt_finished(*results[pairing])]
+
+    in_flight = collections.Counter()
+    pending = {}
+    round_robin = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(stockfish_path,)) as pool:
+        while True:
+            # interleave the unfinished pairings; games already in flight count towards max_games
+            candidates = [pairing for pairing in open_pairings()
+                          if sum(results[pairing]) + 2 * in_flight[pairing] < max_games]
+            while candidates and len(pending) < 2 * workers:
+                pairing = candidates[round_robin % len(candidates)]
+                opening = OPENINGS[(sum(results[pairing]) // 2 + in_flight[pairing]) % len(OPENINGS)]
+                round_robin += 1
+                in_flight[pairing] += 1
+                pending[pool.submit(play_pair, (pairing, opening, move_time))] = pairing
+                candidates = [pairing for pairing in candidates
+                              if sum(results[pairing]) + 2 * in_flight[pairing] < max_games]
+            if not pending:
+                break
+            future = next(iter(wait(pending, return_when=FIRST_COMPLETED).done))
+            pairing = pending.pop(future)
+            in_flight[pairing] -= 1
+            _, scores = future.result()
+            for score in scores:
+                results[pairing][{1.0: 0, 0.5: 1, 0.0: 2}[score]] += 1
+            save_results(results_path, results, move_time)
+            if progress:
+                progress(pairing, results[pairing], len(open_pairings()))
+    return results
+
+
+def difficulty_table(ratings, results, move_time, skills=range(1, 21)):
+    """The regenerated difficulty table: one entry per Skill Level offered by the game."""
+    games = collections.Counter()
+    for (a, b), counts in results.items():
+        games[a] += sum(counts)
+        games[b] += sum(counts)
+    levels = []
+    for skill in skills:
+        elo, error = ratings.get(skill_player(skill), (None, None))
+        if elo is None:
+            continue
+        levels.append({'skill': skill, 'elo': round(elo), 'ci95': [round(elo - 1.96 * error), round(elo + 1.96 * error)],
+                       'games': games[skill_player(skill)]})
+    return {'generated': datetime.date.today().isoformat(), 'move_time': move_time,
+            'games': sum(sum(counts) for counts in results.values()), 'levels': levels}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calibrate the Elo of Stockfish Skill Levels.")
+    parser.add_argument("--stockfish", default=STOCKFISH_PATH, help="Stockfish executable")
+    parser.add_argument("--movetime", type=float, default=MOVE_TIME, help="seconds per move")
+    parser.add_argument("--max-games", type=int, default=MAX_GAMES, help="games per pairing at most")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--results", default=RESULTS_PATH, help="match results, continued if present")
+    parser.add_argument("--out", default=chess_engine_v2.DIFFICULTY_TABLE_PATH, help="difficulty table to write")
+    parser.add_argument("--no-anchors", action="store_true",
+                        help="only play Skill Levels against each other (Skill Level 1 is pinned at its old rating)")
+    args = parser.parse_args(argv)
+
+    anchors = () if args.no_anchors else ANCHOR_ELOS
+    pairings = make_pairings(SKILL_LEVELS, anchors)
+    start = time.perf_counter()
+
+    def progress(pairing, counts, remaining):
+        wins, draws, losses = counts
+        print(f"{time.perf_counter() - start:8.0f}s  {pairing[0]:>10} vs {pairing[1]:<10} "
+              f"+{wins} ={draws} -{losses}   ({remaining} pairings running)")
+
+    results = calibrate(pairings, args.stockfish, args.movetime, args.max_games, args.workers, args.results, progress)
+    fixed = {anchor_player(elo): float(elo) for elo in anchors}
+    if not fixed:
+        fixed = {skill_player(1): float(next(elo for elo, skill in chess_engine_v2.DEFAULT_DIFFICULTY.items()
+                                             if skill == 1))}
+    ratings = fit_ratings(results, fixed)
+    table = difficulty_table(ratings, results, args.movetime)
+    with open(args.out, 'w') as f:
+        json.dump(table, f, indent=1)
+    for level in table['levels']:
+        print(f"Skill Level {level['skill']:>2}: {level['elo']:>5} Elo  (95% CI {level['ci95'][0]}..{level['ci95'][1]}, "
+              f"{level['games']} games)")
+    print(f"Wrote {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
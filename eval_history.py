@@ -0,0 +1,133 @@
+"""
+Evaluation history of the game in progress, computed in the background.
+
+A worker thread with its own Stockfish process evaluates every position of the game. It works in passes:
+a shallow pass over all plies first, so the whole graph appears almost at once, then deeper passes that
+refine the points. Within a pass the current ply goes first, then the plies closest to it. Results are kept
+per position (normalized FEN), so undoing, replaying or returning to a position never analyses it again,
+and the UI thread only ever reads finished results.
+"""
+import threading
+
+import chess
+import chess.engine
+
+import analysis_cache
+
+
+PASSES = (chess.engine.Limit(depth=8), chess.engine.Limit(depth=16))
+
+
+class EvalHistory:
+    def __init__(self, stockfish_path, passes=PASSES, cache=None):
+        """
+        :param stockfish_path: Stockfish executable; the worker starts its own process so the game's engine
+                               is never kept busy.
+        :param passes: Search limits, shallow to deep.
+        :param cache: Optional analysis_cache.AnalysisCache shared with the rest of the game.
+        """
+        self.stockfish_path = stockfish_path
+        self.passes = passes
+        self.cache = cache
+        self.version = 0  # incremented whenever a result arrives or the game changes, for redraw checks
+
+        self._positions = []  # (normalized FEN, FEN) of every ply, starting position first
+        self._current = 0
+        self._signature = None  # (root FEN, moves) of the game in _positions
+        self._results = {}  # normalized FEN -> (centipawns relative to White, pass index)
+        self._changed = threading.Condition()
+        self._stop = False
+        self._thread = threading.Thread(target=self._run, name="eval-history", daemon=True)
+        self._thread.start()
+
+    def set_game(self, board, current=None):
+        """
+        Points the worker at the positions of a game. Cheap to call every frame: nothing happens unless the
+        moves changed.
+
+        :param current: Ply to refine first (default: the last one).
+        """
+        # the whole move list, not just its length and last move: a loaded game or another variation may
+        # differ only in the middle (list comparison runs in C and checks identity first)
+        signature = (board.root().fen(), list(board.move_stack))
+        if signature == self._signature and current in (None, self._current):
+            return
+        replay = board.root()
+        positions = [(analysis_cache.normalize_fen(replay), replay.fen())]
+        for move in board.move_stack:
+            replay.push(move)
+            positions.append((analysis_cache.normalize_fen(replay), replay.fen()))
+        with self._changed:
+            self._signature = signature
+            self._positions = positions
+            self._current = len(positions) - 1 if current is None else current
+            self.version += 1
+            self._changed.notify()
+
+    def points(self):
+        """
+        :return: list with, for every ply, (centipawns relative to White, pass index) or None if not
+                 evaluated yet.
+        """
+        with self._changed:
+            return [self._results.get(key) for key, _ in self._positions]
+
+    def evaluation(self, board):
+        """
+        :return: (centipawns relative to White, pass index) of the position on board, or None if not
+                 evaluated yet.
+        """
+        key = analysis_cache.normalize_fen(board)
+        with self._changed:
+            return self._results.get(key)
+
+    @property
+    def current(self):
+        return self._current
+
+    # Worker thread
+    def _next_job(self):
+        """The first position, nearest the current ply first, that has not been searched in the lowest pass."""
+        order = sorted(range(len(self._positions)), key=lambda ply: abs(ply - self._current))
+        for level in range(len(self.passes)):
+            for ply in order:
+                key, fen = self._positions[ply]
+                if self._results.get(key, (None, -1))[1] < level:
+                    return key, fen, level
+        return None
+
+    def _run(self):
+        try:
+            engine = chess.engine.SimpleEngine.popen_uci(self.stockfish_path)
+        except (OSError, chess.engine.EngineError) as e:
+            print(f"Eval history disabled: could not start Stockfish ({e}).")
+            return
+        engine_id = analysis_cache.full_strength_id(engine)
+        try:
+            while True:
+                with self._changed:
+                    job = self._next_job()
+                    while not self._stop and job is None:
+                        self._changed.wait()
+                        job = self._next_job()
+                    if self._stop:
+                        return
+                key, fen, level = job
+                board = chess.Board(fen)
+                if board.is_checkmate():
+                    level, cp = len(self.passes) - 1, -analysis_cache.MATE_SCORE
+                elif board.is_game_over(claim_draw=True):
+                    level, cp = len(self.passes) - 1, 0
+                else:
+                    cp = analysis_cache.analyse(engine, board, self.passes[level], 1, self.cache, engine_id)[0]['cp']
+                with self._changed:
+                    self._results[key] = (cp if board.turn == chess.WHITE else -cp, level)
+                    self.version += 1
+        finally:
+            engine.quit()
+
+    def close(self):
+        with self._changed:
+            self._stop = True
+            self._changed.notify()
+        self._thread.join()
@@ -0,0 +1,199 @@
+"""
+Lightweight static evaluation, kept up to date move by move.
+
+The material and piece-square sum of both sides is updated incrementally: before a move is pushed, only the
+squares it touches (moved piece, captured piece, castling rook, promotion) are looked up, and the change is
+kept on a stack so popping the move subtracts it again. The terms that depend on the whole position, king
+safety (pawn shield), mobility of the minor pieces and rooks and the king's piece-square value, are a few
+bitboard operations computed when the score is asked for, once per position. It is an instant estimate for
+the eval bar while Stockfish's score is on its way, not a replacement for it.
+
+Piece-square tables are those of Michniewski's "simplified evaluation function", from White's point of view
+with a8 first.
+
+Usage:
+    evaluator = Evaluator(board)
+    evaluator.push(board, move); board.push(move)
+    evaluator.pop(board); board.pop()
+    evaluator.score(board)  # centipawns, White's point of view
+"""
+import chess
+
+
+PIECE_VALUES = {chess.PAWN: 100, chess.KNIGHT: 320, chess.BISHOP: 330, chess.ROOK: 500, chess.QUEEN: 900,
+                chess.KING: 0}
+# game phase: 24 with all pieces on the board, 0 with only kings and pawns
+PHASE_WEIGHTS = {chess.PAWN: 0, chess.KNIGHT: 1, chess.BISHOP: 1, chess.ROOK: 2, chess.QUEEN: 4, chess.KING: 0}
+MAX_PHASE = 24
+MOBILITY_WEIGHTS = {chess.KNIGHT: 4, chess.BISHOP: 4, chess.ROOK: 2}  # centipawns per reachable square
+SHIELD_BONUS = 12  # per pawn in front of the king, scaled down towards the endgame
+TEMPO = 10
+
+PST = {
+    chess.PAWN: (
+        0, 0, 0, 0, 0, 0, 0, 0,
+        50, 50, 50, 50, 50, 50, 50, 50,
+        10, 10, 20, 30, 30, 20, 10, 10,
+        5, 5, 10, 25, 25, 10, 5, 5,
+        0, 0, 0, 20, 20, 0, 0, 0,
+        5, -5, -10, 0, 0, -10, -5, 5,
+        5, 10, 10, -20, -20, 10, 10, 5,
+        0, 0, 0, 0, 0, 0, 0, 0),
+    chess.KNIGHT: (
+        -50, -40, -30, -30, -30, -30, -40, -50,
+        -40, -20, 0, 0, 0, 0, -20, -40,
+        -30, 0, 10, 15, 15, 10, 0, -30,
+        -30, 5, 15, 20, 20, 15, 5, -30,
+        -30, 0, 15, 20, 20, 15, 0, -30,
+        -30, 5, 10, 15, 15, 10, 5, -30,
+        -40, -20, 0, 5, 5, 0, -20, -40,
+        -50, -40, -30, -30, -30, -30, -40, -50),
+    chess.BISHOP: (
+        -20, -10, -10, -10, -10, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 10, 10, 5, 0, -10,
+        -10, 5, 5, 10, 10, 5, 5, -10,
+        -10, 0, 10, 10, 10, 10, 0, -10,
+        -10, 10, 10, 10, 10, 10, 10, -10,
+        -10, 5, 0, 0, 0, 0, 5, -10,
+        -20, -10, -10, -10, -10, -10, -10, -20),
+    chess.ROOK: (
+        0, 0, 0, 0, 0, 0, 0, 0,
+        5, 10, 10, 10, 10, 10, 10, 5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        0, 0, 0, 5, 5, 0, 0, 0),
+    chess.QUEEN: (
+        -20, -10, -10, -5, -5, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 5, 5, 5, 0, -10,
+        -5, 0, 5, 5, 5, 5, 0, -5,
+        0, 0, 5, 5, 5, 5, 0, -5,
+        -10, 5, 5, 5, 5, 5, 0, -10,
+        -10, 0, 5, 0, 0, 0, 0, -10,
+        -20, -10, -10, -5, -5, -10, -10, -20),
+    chess.KING: (0,) * 64,  # the king is scored by the tapered tables below
+}
+KING_MIDDLEGAME = (
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -20, -30, -30, -40, -40, -30, -30, -20,
+    -10, -20, -20, -20, -20, -20, -20, -10,
+    20, 20, 0, 0, 0, 0, 20, 20,
+    20, 30, 10, 0, 0, 10, 30, 20)
+KING_ENDGAME = (
+    -50, -40, -30, -20, -20, -30, -40, -50,
+    -30, -20, -10, 0, 0, -10, -20, -30,
+    -30, -10, 20, 30, 30, 20, -10, -30,
+    -30, -10, 30, 40, 40, 30, -10, -30,
+    -30, -10, 30, 40, 40, 30, -10, -30,
+    -30, -10, 20, 30, 30, 20, -10, -30,
+    -30, -30, 0, 0, 0, 0, -30, -30,
+    -50, -30, -30, -30, -30, -30, -30, -50)
+
+
+def table_index(square, color):
+    """Index into a table written from White's point of view with a8 first."""
+    return square ^ 56 if color == chess.WHITE else square
+
+
+def shield_mask(king, color):
+    """The three squares in front of a king."""
+    rank = chess.square_rank(king) + (1 if color == chess.WHITE else -1)
+    if not 0 <= rank <= 7:
+        return chess.BB_EMPTY
+    return chess.BB_KING_ATTACKS[king] & chess.BB_RANKS[rank]
+
+
+def piece_value(piece_type, color, square):
+    """Material plus piece-square value of a piece, from White's point of view."""
+    value = PIECE_VALUES[piece_type] + PST[piece_type][table_index(square, color)]
+    return value if color == chess.WHITE else -value
+
+
+class Evaluator:
+    def __init__(self, board):
+        self.reset(board)
+
+    def reset(self, board):
+        """Computes the incremental terms from scratch, e.g. after the board was replaced."""
+        self.board = board
+        self.material = 0  # material + piece-square sum, White's point of view
+        self.phase = 0
+        for square, piece in board.piece_map().items():
+            self.material += piece_value(piece.piece_type, piece.color, square)
+            self.phase += PHASE_WEIGHTS[piece.piece_type]
+        self._deltas = []  # (material, phase) change of every move pushed since the reset
+        self._base_ply = len(board.move_stack)
+        self._cached = None  # score of the current position, once asked for
+
+    def _in_step(self, board):
+        return board is self.board and len(board.move_stack) == self._base_ply + len(self._deltas)
+
+    def push(self, board, move):
+        """Records a move; call it right before board.push(move)."""
+        if not self._in_step(board):
+            self.reset(board)
+        color = board.turn
+        piece = board.piece_type_at(move.from_square)
+        material, phase = 0, 0
+        if piece == chess.KING and board.is_castling(move):
+            rank = chess.square_rank(move.from_square)
+            kingside = chess.square_file(move.to_square) > chess.square_file(move.from_square)
+            rook_from = chess.square(7 if kingside else 0, rank)
+            rook_to = chess.square(5 if kingside else 3, rank)
+            material = piece_value(chess.ROOK, color, rook_to) - piece_value(chess.ROOK, color, rook_from)
+        else:
+            captured_square = move.to_square
+            if piece == chess.PAWN and board.is_en_passant(move):
+                captured_square += -8 if color == chess.WHITE else 8
+            captured = board.piece_type_at(captured_square)
+            if captured:
+                material -= piece_value(captured, not color, captured_square)
+                phase -= PHASE_WEIGHTS[captured]
+            new_piece = move.promotion or piece
+            material += piece_value(new_piece, color, move.to_square) - piece_value(piece, color, move.from_square)
+            phase += PHASE_WEIGHTS[new_piece] - PHASE_WEIGHTS[piece]
+        self.material += material
+        self.phase += phase
+        self._deltas.append((material, phase))
+        self._cached = None
+
+    def pop(self, board):
+        """Takes back the last move; call it right before board.pop()."""
+        self._cached = None
+        if not self._in_step(board) or not self._deltas:
+            self.board = None  # out of step: rebuilt from the board on the next push or score
+            return
+        material, phase = self._deltas.pop()
+        self.material -= material
+        self.phase -= phase
+
+    def score(self, board):
+        """Estimated evaluation in centipawns from White's point of view."""
+        if not self._in_step(board):
+            self.reset(board)
+        if self._cached is not None:
+            return self._cached
+        phase = min(self.phase, MAX_PHASE)
+        score = self.material + (TEMPO if board.turn == chess.WHITE else -TEMPO)
+        for color, sign in ((chess.WHITE, 1), (chess.BLACK, -1)):
+            king = board.king(color)
+            if king is None:
+                continue
+            index = table_index(king, color)
+            king_value = (KING_MIDDLEGAME[index] * phase + KING_ENDGAME[index] * (MAX_PHASE - phase)) // MAX_PHASE
+            shield = chess.popcount(shield_mask(king, color) & board.pieces_mask(chess.PAWN, color))
+            mobility = 0
+            own = board.occupied_co[color]
+            for piece_type, weight in MOBILITY_WEIGHTS.items():
+                for square in chess.scan_forward(board.pieces_mask(piece_type, color)):
+                    mobility += weight * chess.popcount(board.attacks_mask(square) & ~own)
+            score += sign * (king_value + SHIELD_BONUS * shield * phase // MAX_PHASE + mobility)
+        self._cached = score
+        return score
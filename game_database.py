@@ -0,0 +1,268 @@
+"""
+Single-file, append-only game store.
+
+Games are kept in two files:
+    <path>      data: length-prefixed records, each record is a v2 save (see save_format.py)
+    <path>.idx  index: fixed-size entries with the record offset and the game metadata
+
+A game id is the position of its entry in the index, so any game is found with one index lookup and one
+read from the memory-mapped data file, and opening the database never scans the records.
+Deleted games keep their slot until compact() rewrites both files.
+"""
+import datetime
+import mmap
+import os
+import struct
+
+import chess
+
+import save_format
+
+
+INDEX_MAGIC = b"CGDBIDX1"
+INDEX_HEADER = struct.Struct('<8sQ')                      # magic, reserved
+INDEX_ENTRY = struct.Struct('<QIIBBHI32s32s')           # offset, length, plies, result, flags, pad, date, white, black
+RECORD_HEADER = struct.Struct('<I')                      # record length
+PLAYER_BYTES = 32
+
+RESULTS = ['*', '1-0', '0-1', '1/2-1/2']
+FLAG_DELETED = 1
+
+
+def encode_date(date):
+    """'2025.05.11' (PGN Date tag) -> 20250511, unknown parts become 0."""
+    parts = [int(p) if p.isdigit() else 0 for p in (date or "").split('.')[:3]]
+    parts += [0] * (3 - len(parts))
+    return parts[0] * 10000 + parts[1] * 100 + parts[2]
+
+
+def decode_date(value):
+    if not value:
+        return "????.??.??"
+    year, month, day = value // 10000, value // 100 % 100, value % 100
+    return f"{year:04d}.{month:02d}.{day:02d}".replace(".00", ".??")
+
+
+def encode_player(name):
+    return (name or "").encode()[:PLAYER_BYTES]
+
+
+def today():
+    """Today as a PGN Date tag."""
+    return datetime.date.today().strftime("%Y.%m.%d")
+
+
+class GameDatabase:
+    def __init__(self, path, readonly=False):
+        """
+        Opens (or creates) a game database.
+
+        :param path: Data file path, the index lives next to it as <path>.idx.
+        :param readonly: Open without write access (appends, deletes and compaction raise).
+        """
+        self.path = path
+        self.index_path = path + ".idx"
+        self.readonly = readonly
+        if not readonly:
+            for p in (self.path, self.index_path):
+                if not os.path.exists(p):
+                    with open(p, 'wb') as f:
+                        if p == self.index_path:
+                            f.write(INDEX_HEADER.pack(INDEX_MAGIC, 0))
+        mode = 'rb' if readonly else 'r+b'
+        self._data = open(self.path, mode)
+        self._index = open(self.index_path, mode)
+        if self._index.read(INDEX_HEADER.size)[:8] != INDEX_MAGIC:
+            raise ValueError(f"{self.index_path} is not a game database index")
+        self._data_map = None
+        self._index_map = None
+        self._count = (os.path.getsize(self.index_path) - INDEX_HEADER.size) // INDEX_ENTRY.size
+        if not readonly:
+            self._recover()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self._count
+
+    def close(self):
+        self._unmap()
+        self._data.close()
+        self._index.close()
+
+    # Crash recovery and memory maps
+    def _recover(self):
+        """
+        Records are written before their index entries, so after a crash the index may end in entries whose
+        record is incomplete and the data file may end in a record without an entry. Both are cut off.
+        """
+        data_size = os.path.getsize(self.path)
+        while self._count and self._record_end(self._count - 1) > data_size:
+            self._count -= 1
+        self._unmap()
+        index_size = INDEX_HEADER.size + self._count * INDEX_ENTRY.size
+        if os.path.getsize(self.index_path) != index_size:
+            self._index.truncate(index_size)
+        data_end = self._record_end(self._count - 1) if self._count else 0
+        if data_size != data_end:
+            self._data.truncate(data_end)
+
+    def _record_end(self, game_id):
+        offset, length = self._entry(game_id)[:2]
+        return offset + RECORD_HEADER.size + length
+
+    def _unmap(self):
+        for m in (self._data_map, self._index_map):
+            if m is not None:
+                m.close()
+        self._data_map = self._index_map = None
+
+    def _map(self, f, current, needed):
+        """Returns a read-only map of f covering at least `needed` bytes, remapping after appends."""
+        if current is not None and len(current) >= needed:
+            return current
+        if current is not None:
+            current.close()
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _entry(self, game_id):
+        if not 0 <= game_id < self._count:
+            raise IndexError(f"No game with id {game_id}")
+        position = INDEX_HEADER.size + game_id * INDEX_ENTRY.size
+        self._index_map = self._map(self._index, self._index_map, position + INDEX_ENTRY.size)
+        return INDEX_ENTRY.unpack_from(self._index_map, position)
+
+    # Reading
+    def info(self, game_id):
+        """Metadata of a game, read from the index only."""
+        offset, length, plies, result, flags, _, date, white, black = self._entry(game_id)
+        return {'id': game_id, 'white': white.rstrip(b'\0').decode(errors='replace'),
+                'black': black.rstrip(b'\0').decode(errors='replace'), 'result': RESULTS[result],
+                'plies': plies, 'date': decode_date(date), 'deleted': bool(flags & FLAG_DELETED),
+                'bytes': length}
+
+    def list_games(self, start=0, stop=None, include_deleted=False):
+        """Iterates over game metadata without touching the data file."""
+        for game_id in range(start, self._count if stop is None else min(stop, self._count)):
+            info = self.info(game_id)
+            if include_deleted or not info['deleted']:
+                yield info
+
+    def get_bytes(self, game_id):
+        """The stored v2 save of a game."""
+        offset, length = self._entry(game_id)[:2]
+        start = offset + RECORD_HEADER.size
+        self._data_map = self._map(self._data, self._data_map, start + length)
+        return self._data_map[start:start + length]
+
+    def get(self, game_id):
+        """
+        :return: (starting FEN, tags, list of chess.Move)
+        """
+        return save_format.decode_game(self.get_bytes(game_id))
+
+    # Writing
+    def append(self, moves, start_fen=chess.STARTING_FEN, tags=None, sync=False):
+        """Appends one game. :return: its game id."""
+        return self.append_many([(moves, start_fen, tags)], sync)[0]
+
+    def append_many(self, games, sync=False):
+        """
+        Appends games in one batch: all records first, then all index entries.
+
+        :param games: Iterable of (moves, starting FEN, tags).
+        :param sync: fsync both files before returning.
+        :return: List of the new game ids.
+        """
+        def encoded():
+            for moves, start_fen, tags in games:
+                moves = list(moves)
+                yield save_format.encode_game(moves, start_fen, tags), len(moves), tags or {}
+        return self.append_encoded(encoded(), sync)
+
+    def append_encoded(self, records, sync=False):
+        """
+        Appends already encoded games, e.g. from importer worker processes.
+
+        :param records: Iterable of (v2 save bytes, plies, tags).
+        :return: List of the new game ids.
+        """
+        if self.readonly:
+            raise PermissionError("Game database opened read-only")
+        self._data.seek(0, os.SEEK_END)
+        offset = self._data.tell()
+        entries = []
+        for blob, plies, tags in records:
+            self._data.write(RECORD_HEADER.pack(len(blob)) + blob)
+            result = RESULTS.index(tags['Result']) if tags.get('Result') in RESULTS else 0
+            entries.append(INDEX_ENTRY.pack(offset, len(blob), plies, result, 0, 0, encode_date(tags.get('Date')),
+                                            encode_player(tags.get('White')), encode_player(tags.get('Black'))))
+            offset += RECORD_HEADER.size + len(blob)
+        self._data.flush()
+        if sync:
+            os.fsync(self._data.fileno())
+        self._index.seek(0, os.SEEK_END)
+        self._index.write(b"".join(entries))
+        self._index.flush()
+        if sync:
+            os.fsync(self._index.fileno())
+        first = self._count
+        self._count += len(entries)
+        return list(range(first, self._count))
+
+    def delete(self, game_id):
+        """Marks a game as deleted. Its space is reclaimed by compact()."""
+        if self.readonly:
+            raise PermissionError("Game database opened read-only")
+        entry = list(self._entry(game_id))
+        entry[4] |= FLAG_DELETED
+        self._index.seek(INDEX_HEADER.size + game_id * INDEX_ENTRY.size)
+        self._index.write(INDEX_ENTRY.pack(*entry))
+        self._index.flush()
+
+    def truncate(self, count):
+        """Drops every game with an id >= count (used to roll back an interrupted import)."""
+        if self.readonly:
+            raise PermissionError("Game database opened read-only")
+        if count >= self._count:
+            return
+        self._unmap()
+        data_end = self._record_end(count - 1) if count else 0
+        self._count = count
+        self._index.truncate(INDEX_HEADER.size + count * INDEX_ENTRY.size)
+        self._data.truncate(data_end)
+
+    def compact(self):
+        """
+        Rewrites the database without deleted games. Game ids of the remaining games shift down.
+
+        :return: Dict of old game id -> new game id.
+        """
+        if self.readonly:
+            raise PermissionError("Game database opened read-only")
+        remap = {}
+        tmp_data, tmp_index = self.path + ".compact", self.index_path + ".compact"
+        with open(tmp_data, 'wb') as data, open(tmp_index, 'wb') as index:
+            index.write(INDEX_HEADER.pack(INDEX_MAGIC, 0))
+            offset = 0
+            for game_id in range(self._count):
+                entry = list(self._entry(game_id))
+                if entry[4] & FLAG_DELETED:
+                    continue
+                remap[game_id] = len(remap)
+                data.write(RECORD_HEADER.pack(entry[1]) + self.get_bytes(game_id))
+                entry[0] = offset
+                index.write(INDEX_ENTRY.pack(*entry))
+                offset += RECORD_HEADER.size + entry[1]
+            for f in (data, index):
+                f.flush()
+                os.fsync(f.fileno())
+        self.close()
+        os.replace(tmp_data, self.path)
+        os.replace(tmp_index, self.index_path)
+        self.__init__(self.path, self.readonly)
+        return remap
@@ -0,0 +1,312 @@
+"""
+Offline batch review of saved games.
+
+Streams the games of the save folder (v2 .chs saves and legacy .json saves) and, optionally, a game
+database, and analyses every position with a pool of Stockfish processes, one engine per worker. Each move
+gets its evaluation, centipawn loss and an inaccuracy/mistake/blunder tag, and each side an accuracy score.
+The results are written as an annotated PGN plus a JSON summary per game. A game whose summary already
+matches its moves and the search depth is skipped, so re-runs only review new games.
+
+Usage:
+    python game_review.py --saves chess_save_games --database chess_save_games/games.cgdb --depth 12
+"""
+import argparse
+import collections
+import glob
+import hashlib
+import json
+import math
+import multiprocessing.util
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import chess
+import chess.engine
+import chess.pgn
+
+import analysis_cache
+import game_database
+import save_format
+from chess_engine_v2 import normalize_score
+
+
+STOCKFISH_PATH = "stockfish/stockfish-macos-m1-apple-silicon"
+ANALYSIS_CACHE_PATH = ".cache/analysis.sqlite"
+REVIEW_DIR = "reviews"
+DEPTH = 12
+
+# tag, summary counter, centipawn loss threshold and the NAG written to the PGN
+TAGS = (('blunder', 'blunders', 300, chess.pgn.NAG_BLUNDER), ('mistake', 'mistakes', 100, chess.pgn.NAG_MISTAKE),
+        ('inaccuracy', 'inaccuracies', 50, chess.pgn.NAG_DUBIOUS_MOVE))
+
+_engine = None  # per worker: (chess.engine.SimpleEngine, engine id, analysis_cache.AnalysisCache or None)
+
+
+"""
+Game sources
+"""
+def iter_games(save_dir=None, database_path=None, include_unfinished=False):
+    """
+    Streams games from the save folder and a game database.
+
+    :return: iterator of (key, starting FEN, list of chess.Move, tags); the key names the review files.
+    """
+    if save_dir:
+        for path in sorted(glob.glob(os.path.join(save_dir, "*" + save_format.EXTENSION))
+                           + glob.glob(os.path.join(save_dir, "*.json"))):
+            try:
+                if path.endswith(".json"):
+                    fen, tags, moves = chess.STARTING_FEN, {}, save_format.read_legacy_moves(path)
+                else:
+                    with open(path, 'rb') as f:
+                        fen, tags = save_format.read_header(f)
+                        moves = list(save_format.iter_moves(f))
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Skipping {path}: {e}")
+                continue
+            key = os.path.basename(path).replace(".", "_")
+            if include_unfinished or is_finished(fen, moves, tags):
+                yield key, fen, moves, tags
+    if database_path and os.path.exists(database_path):
+        with game_database.GameDatabase(database_path, readonly=True) as db:
+            for info in db.list_games():
+                fen, tags, moves = db.get(info['id'])
+                if include_unfinished or is_finished(fen, moves, tags):
+                    yield f"db_{info['id']}", fen, moves, tags
+
+
+def is_finished(start_fen, moves, tags):
+    if tags.get('Result', '*') != '*':
+        return True
+    board = chess.Board(start_fen)
+    for move in moves:
+        board.push(move)
+    return board.is_game_over(claim_draw=True)
+
+
+def fingerprint(start_fen, moves, depth):
+    """Identifies the reviewed moves and search depth; a summary with the same fingerprint is up to date."""
+    digest = hashlib.sha1(save_format.encode_game(moves, start_fen)).hexdigest()
+    return f"{digest}-d{depth}"
+
+
+def is_reviewed(out_dir, key, start_fen, moves, depth):
+    try:
+        with open(os.path.join(out_dir, key + ".json")) as f:
+            return json.load(f).get('fingerprint') == fingerprint(start_fen, moves, depth)
+    except (OSError, ValueError):
+        return False
+
+
+"""
+Scoring
+"""
+def win_percent(cp):
+    """Expected score (0-100) for a centipawn evaluation, from the side it is relative to."""
+    return 50 + 50 * (2 / (1 + math.exp(-0.00368208 * cp)) - 1)
+
+
+def move_accuracy(before, after):
+    """Accuracy (0-100) of a move from the mover's win percentages before and after it."""
+    return max(0.0, min(100.0, 103.1668 * math.exp(-0.04354 * max(0.0, before - after)) - 3.1669))
+
+
+def classify(loss):
+    for tag, _, threshold, nag in TAGS:
+        if loss >= threshold:
+            return tag, nag
+    return None, None
+
+
+def review_moves(start_fen, moves, evals):
+    """
+    Scores the moves of a game.
+
+    :param evals: Centipawn evaluation of every position (len(moves) + 1), relative to White.
+    :return: (list of per-move dicts, per-side summary dict)
+    """
+    board = chess.Board(start_fen)
+    reviewed = []
+    sides = {'white': [], 'black': []}
+    for ply, move in enumerate(moves):
+        sign = 1 if board.turn == chess.WHITE else -1
+        # same clamp as GameState.get_eval, so a missed mate counts as a 1000 cp loss at most
+        before = normalize_score(sign * evals[ply]) * 1000
+        after = normalize_score(sign * evals[ply + 1]) * 1000
+        loss = max(0.0, before - after)
+        tag, _ = classify(loss)
+        accuracy = move_accuracy(win_percent(before), win_percent(after))
+        side = 'white' if board.turn == chess.WHITE else 'black'
+        sides[side].append((loss, accuracy, tag))
+        reviewed.append({'ply': ply + 1, 'san': board.san(move), 'uci': move.uci(), 'eval': evals[ply + 1],
+                         'loss': round(loss), 'tag': tag, 'accuracy': round(accuracy, 1)})
+        board.push(move)
+    summary = {}
+    for side, scores in sides.items():
+        summary[side] = {
+            'accuracy': round(sum(a for _, a, _ in scores) / len(scores), 1) if scores else None,
+            'acpl': round(sum(loss for loss, _, _ in scores) / len(scores)) if scores else None,
+        }
+        for tag, counter, _, _ in TAGS:
+            summary[side][counter] = sum(1 for _, _, t in scores if t == tag)
+    return reviewed, summary
+
+
+def format_eval(cp):
+    """PGN [%eval] value: pawns, or #N / #-N for a forced mate."""
+    if abs(cp) > analysis_cache.MATE_SCORE - 1000:
+        moves = analysis_cache.MATE_SCORE - abs(cp)  # the cache stores Mate(n) as MATE_SCORE - n, n in moves
+        return f"#{'' if cp > 0 else '-'}{moves}"
+    return f"{cp / 100:.2f}"
+
+
+def annotated_pgn(start_fen, moves, tags, reviewed):
+    """PGN with an [%eval] comment on every move and ?! / ? / ?? on inaccuracies, mistakes and blunders."""
+    game = chess.pgn.Game()
+    if start_fen != chess.STARTING_FEN:
+        game.setup(start_fen)
+    for name, value in tags.items():
+        game.headers[name] = str(value)
+    node = game
+    for move, entry in zip(moves, reviewed):
+        node = node.add_variation(move)
+        node.comment = f"[%eval {format_eval(entry['eval'])}]"
+        _, nag = classify(entry['loss'])
+        if nag:
+            node.nags.add(nag)
+    if node.board().is_game_over():
+        game.headers["Result"] = node.board().result()
+    return str(game) + "\n"
+
+
+"""
+Workers
+"""
+def init_worker(stockfish_path, cache_path):
+    """Starts one engine (and opens the shared analysis cache) per worker process."""
+    global _engine
+    engine = chess.engine.SimpleEngine.popen_uci(stockfish_path)
+    cache = analysis_cache.AnalysisCache(cache_path) if cache_path else None
+    _engine = engine, analysis_cache.full_strength_id(engine), cache
+    # the engine and cache threads would keep the worker alive at pool shutdown, so close them on exit
+    multiprocessing.util.Finalize(None, close_worker, exitpriority=10)
+
+
+def close_worker():
+    engine, _, cache = _engine
+    engine.quit()
+    if cache is not None:
+        cache.close()
+
+
+def analyse_game(job):
+    """
+    Worker entry point: evaluates every position of one game.
+
+    :return: (key, list of centipawn evals relative to White, seconds)
+    """
+    key, start_fen, moves, depth = job
+    engine, engine_id, cache = _engine
+    start = time.perf_counter()
+    board = chess.Board(start_fen)
+    limit = chess.engine.Limit(depth=depth)
+    evals = []
+    for ply in range(len(moves) + 1):
+        if board.is_checkmate():
+            cp = -analysis_cache.MATE_SCORE
+        elif board.is_game_over(claim_draw=True):
+            cp = 0
+        else:
+            cp = analysis_cache.analyse(engine, board, limit, 1, cache, engine_id)[0]['cp']
+        evals.append(cp if board.turn == chess.WHITE else -cp)
+        if ply < len(moves):
+            board.push(moves[ply])
+    return key, evals, time.perf_counter() - start
+
+
+def write_review(out_dir, key, start_fen, moves, tags, evals, depth):
+    reviewed, summary = review_moves(start_fen, moves, evals)
+    with open(os.path.join(out_dir, key + ".pgn"), 'w') as f:
+        f.write(annotated_pgn(start_fen, moves, tags, reviewed))
+    result = {'key': key, 'tags': tags, 'start_fen': start_fen, 'depth': depth,
+              'fingerprint': fingerprint(start_fen, moves, depth), 'summary': summary, 'moves': reviewed}
+    tmp_path = os.path.join(out_dir, key + ".json.tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(result, f, indent=1)
+    os.replace(tmp_path, os.path.join(out_dir, key + ".json"))  # written last: marks the game as reviewed
+    return summary
+
+
+def review_games(games, out_dir=REVIEW_DIR, stockfish_path=STOCKFISH_PATH, depth=DEPTH, workers=None,
+                 cache_path=ANALYSIS_CACHE_PATH, progress=None):
+    """
+    Reviews games with a pool of engine processes, skipping games already reviewed at this depth.
+
+    :param games: Iterable of (key, starting FEN, moves, tags), e.g. from iter_games.
+    :param progress: Optional callback(key, summary) called after every reviewed game.
+    :return: dict with games, skipped, plies and seconds
+    """
+    workers = workers or os.cpu_count() or 1
+    os.makedirs(out_dir, exist_ok=True)
+    if cache_path:
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+    stats = {'games': 0, 'skipped': 0, 'plies': 0, 'seconds': 0.0, 'workers': workers}
+    start = time.perf_counter()
+    games = iter(games)
+    pending = collections.deque()
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(stockfish_path, cache_path)) as pool:
+        while True:
+            # a bounded window of games in flight, so the source is streamed rather than read up front
+            while len(pending) < 2 * workers:
+                game = next(games, None)
+                if game is None:
+                    break
+                key, start_fen, moves, tags = game
+                if is_reviewed(out_dir, key, start_fen, moves, depth):
+                    stats['skipped'] += 1
+                    continue
+                pending.append((game, pool.submit(analyse_game, (key, start_fen, moves, depth))))
+            if not pending:
+                break
+            (key, start_fen, moves, tags), future = pending.popleft()
+            _, evals, _ = future.result()
+            summary = write_review(out_dir, key, start_fen, moves, tags, evals, depth)
+            stats['games'] += 1
+            stats['plies'] += len(moves)
+            if progress:
+                progress(key, summary)
+    stats['seconds'] = time.perf_counter() - start
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Annotate saved games with engine analysis.")
+    parser.add_argument("--saves", default="chess_save_games", help="folder of saved games (.chs, .json)")
+    parser.add_argument("--database", default=None, help="game database (.cgdb) to review as well")
+    parser.add_argument("--out", default=REVIEW_DIR, help="output folder for annotated PGN and JSON")
+    parser.add_argument("--stockfish", default=STOCKFISH_PATH, help="Stockfish executable")
+    parser.add_argument("--depth", type=int, default=DEPTH, help="search depth per position")
+    parser.add_argument("--workers", type=int, default=None, help="engine processes (default: all cores)")
+    parser.add_argument("--cache", default=ANALYSIS_CACHE_PATH, help="analysis cache ('' to disable)")
+    parser.add_argument("--all", action="store_true", help="also review unfinished games")
+    args = parser.parse_args(argv)
+
+    def progress(key, summary):
+        white, black = summary['white'], summary['black']
+        print(f"{key}: accuracy {white['accuracy']} / {black['accuracy']}, "
+              f"blunders {white['blunders']} / {black['blunders']}")
+
+    games = iter_games(args.saves, args.database, args.all)
+    stats = review_games(games, args.out, args.stockfish, args.depth, args.workers, args.cache, progress)
+    seconds = max(stats['seconds'], 1e-9)
+    rate = stats['plies'] / seconds
+    print(f"Reviewed {stats['games']} games ({stats['skipped']} already reviewed, {stats['plies']} plies) "
+          f"in {seconds:.1f}s: {rate:.1f} plies/s, {rate / stats['workers']:.1f} plies/s per core")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,392 @@
+"""
+Asyncio game server hosting many concurrent GameState sessions over TCP.
+
+Every session is a headless chess_engine_v2.GameState. Moves are accepted in UCI or SAN and validated by
+GameState.makeTextMove. AI replies are computed by a fixed pool of async Stockfish processes; requests wait
+in a fair queue that serves connections round-robin, so one client with many sessions cannot starve the
+others. Requests of one connection are handled concurrently and answered as they complete.
+
+Protocol: one JSON object per line in both directions. The "id" of a request is echoed in its response.
+    {"id": 1, "cmd": "new", "ai": true, "skill": 5}        -> {"id": 1, "session": 7, "fen": "..."}
+    {"id": 2, "cmd": "move", "session": 7, "move": "e4"}   -> {"id": 2, "san": "e4", "reply": "c5", "fen": "...",
+                                                               "status": null}
+    {"id": 3, "cmd": "undo", "session": 7}                 -> {"id": 3, "fen": "..."}
+    {"id": 4, "cmd": "close", "session": 7}                -> {"id": 4}
+    {"id": 5, "cmd": "stats"}                              -> {"id": 5, "sessions": 1, "p50_ms": ..., ...}
+Failed requests are answered with {"id": ..., "error": "..."}.
+
+Usage:
+    python game_server.py serve --engine stockfish/stockfish-macos-m1-apple-silicon --engines 4
+    python game_server.py load --sessions 2000 --connections 50 --moves 20
+"""
+import argparse
+import asyncio
+import collections
+import itertools
+import json
+import os
+import random
+import sys
+import time
+
+import chess
+import chess.engine
+
+import chess_engine_v2
+
+
+STOCKFISH_PATH = "stockfish/stockfish-macos-m1-apple-silicon"
+HOST, PORT = "127.0.0.1", 8765
+MOVE_TIME = 0.05  # seconds per AI reply
+LATENCY_SAMPLES = 100_000  # most recent move latencies kept for the percentiles
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class FairQueue:
+    """Round-robin over clients: jobs of a client are only served once every other waiting client had a turn."""
+
+    def __init__(self):
+        self._queues = collections.OrderedDict()  # client -> deque of jobs, in serving order
+        self._available = asyncio.Semaphore(0)
+
+    def put(self, client, job):
+        self._queues.setdefault(client, collections.deque()).append(job)
+        self._available.release()
+
+    async def get(self):
+        await self._available.acquire()
+        client, jobs = next(iter(self._queues.items()))
+        job = jobs.popleft()
+        if jobs:
+            self._queues.move_to_end(client)
+        else:
+            del self._queues[client]
+        return job
+
+    def __len__(self):
+        return sum(len(jobs) for jobs in self._queues.values())
+
+
+class EnginePool:
+    def __init__(self, stockfish_path, size, move_time=MOVE_TIME):
+        """
+        :param size: Number of Stockfish processes, i.e. AI replies computed at the same time.
+        """
+        self.stockfish_path = stockfish_path
+        self.size = size
+        self.limit = chess.engine.Limit(time=move_time)
+        self.queue = FairQueue()
+        self._engines = []
+        self._workers = []
+
+    async def start(self):
+        for _ in range(self.size):
+            _, engine = await chess.engine.popen_uci(self.stockfish_path)
+            self._engines.append(engine)
+            self._workers.append(asyncio.create_task(self._work(engine)))
+
+    async def _work(self, engine):
+        while True:
+            board, skill, future = await self.queue.get()
+            if future.cancelled():
+                continue
+            try:
+                result = await engine.play(board, self.limit, options={"Skill Level": skill})
+            except chess.engine.EngineError as e:
+                if not future.cancelled():  # the client may have disconnected during the search
+                    future.set_exception(e)
+                if isinstance(e, chess.engine.EngineTerminatedError):
+                    engine = await self._restart(engine)
+                    if engine is None:
+                        return
+            else:
+                if not future.cancelled():
+                    future.set_result(result.move)
+
+    async def _restart(self, engine):
+        """Replaces a crashed engine with a new process. :return: the new engine, None if it cannot start"""
+        self._engines.remove(engine)
+        try:
+            _, engine = await chess.engine.popen_uci(self.stockfish_path)
+        except (OSError, chess.engine.EngineError) as e:
+            print(f"Engine crashed and could not be restarted ({e}); {len(self._engines)} engines left.")
+            return None
+        print("Engine crashed and was restarted.")
+        self._engines.append(engine)
+        return engine
+
+    def play(self, client, board, skill):
+        """Queues a search for the AI reply. :return: future resolving to a chess.Move"""
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put(client, (board, skill, future))
+        return future
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        for engine in self._engines:
+            await engine.quit()
+
+
+class Session:
+    def __init__(self, client, ai, skill):
+        self.gs = chess_engine_v2.GameState()  # no engine per session, AI replies come from the pool
+        self.client = client
+        self.ai = ai
+        self.skill = skill
+        self.lock = asyncio.Lock()  # requests of one session run one at a time
+
+
+class GameServer:
+    def __init__(self, engines=None, max_sessions=100_000):
+        """
+        :param engines: Started EnginePool for AI replies (None: sessions without AI only).
+        """
+        self.engines = engines
+        self.max_sessions = max_sessions
+        self.sessions = {}
+        self.latencies = collections.deque(maxlen=LATENCY_SAMPLES)
+        self.moves = 0
+        self._ids = itertools.count(1)
+
+    # Commands
+    async def new(self, client, request):
+        if len(self.sessions) >= self.max_sessions:
+            raise ValueError("server full")
+        ai = bool(request.get('ai', False))
+        if ai and self.engines is None:
+            raise ValueError("AI is not available on this server")
+        session_id = next(self._ids)
+        session = self.sessions[session_id] = Session(client, ai, int(request.get('skill', 20)))
+        return {'session': session_id, 'fen': session.gs.chessBoard.fen()}
+
+    async def move(self, client, request):
+        start = time.perf_counter()
+        session = self._session(client, request)
+        async with session.lock:
+            gs = session.gs
+            response = {'san': gs.makeTextMove(str(request.get('move', '')))}
+            if session.ai and not gs.chessBoard.is_game_over():
+                move = await self.engines.play(client, gs.chessBoard, session.skill)
+                response['reply'] = gs.chessBoard.san(move)
+                gs.makeAIMove(move)
+            response.update(fen=gs.chessBoard.fen(), status=gs.check_game_status())
+        self.latencies.append(time.perf_counter() - start)
+        self.moves += 1
+        return response
+
+    async def undo(self, client, request):
+        session = self._session(client, request)
+        async with session.lock:
+            for _ in range(2 if session.ai else 1):  # take back the AI reply together with the player's move
+                session.gs.undoMove()
+            return {'fen': session.gs.chessBoard.fen()}
+
+    async def close(self, client, request):
+        self._session(client, request)
+        del self.sessions[request['session']]
+        return {}
+
+    async def stats(self, client, request):
+        return self.stats_dict()
+
+    COMMANDS = {'new': new, 'move': move, 'undo': undo, 'close': close, 'stats': stats}
+
+    def _session(self, client, request):
+        session = self.sessions.get(request.get('session'))
+        if session is None or session.client is not client:
+            raise ValueError("unknown session")
+        return session
+
+    def stats_dict(self):
+        latencies = list(self.latencies)
+        p50, p99 = percentile(latencies, 0.5), percentile(latencies, 0.99)
+        return {'sessions': len(self.sessions), 'moves': self.moves,
+                'queued': len(self.engines.queue) if self.engines else 0,
+                'p50_ms': p50 and round(p50 * 1000, 2), 'p99_ms': p99 and round(p99 * 1000, 2)}
+
+    # Connections
+    async def handle_request(self, client, line, writer):
+        request = {}
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("a request must be a JSON object")
+            command = self.COMMANDS.get(request.get('cmd'))
+            if command is None:
+                raise ValueError(f"unknown command: {request.get('cmd')}")
+            response = await command(self, client, request)
+        except (ValueError, KeyError, TypeError, chess.engine.EngineError) as e:
+            response = {'error': str(e) or type(e).__name__}
+        response['id'] = request.get('id') if isinstance(request, dict) else None  # e.g. a JSON list
+        writer.write(json.dumps(response).encode() + b"\n")
+
+    async def handle_client(self, reader, writer):
+        client = object()  # identity of the connection, owns its sessions and its share of the engine queue
+        tasks = set()
+        try:
+            while line := await reader.readline():
+                task = asyncio.create_task(self.handle_request(client, line, writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                if writer.transport.get_write_buffer_size() > 2 ** 20:
+                    await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            for session_id in [i for i, session in self.sessions.items() if session.client is client]:
+                del self.sessions[session_id]
+            writer.close()
+
+
+async def serve(host=HOST, port=PORT, stockfish_path=STOCKFISH_PATH, engines=None, ready=None):
+    """
+    Runs the server until cancelled.
+
+    :param engines: Stockfish processes in the pool (default: one per core, 0 disables AI replies).
+    :param ready: Optional asyncio.Event set once the server accepts connections.
+    """
+    engines = (os.cpu_count() or 1) if engines is None else engines
+    pool = EnginePool(stockfish_path, engines) if engines else None
+    if pool:
+        await pool.start()
+    server = GameServer(pool)
+    tcp = await asyncio.start_server(server.handle_client, host, port, limit=2 ** 16)
+    print(f"Serving on {host}:{port} with {engines} engines")
+    if ready:
+        ready.set()
+    try:
+        async with tcp:
+            await tcp.serve_forever()
+    finally:
+        if pool:
+            await pool.stop()
+
+
+"""
+Load generator
+"""
+class Client:
+    """One connection carrying requests of many sessions, matched to their responses by id."""
+
+    def __init__(self, reader, writer):
+        self.reader, self.writer = reader, writer
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._receiver = asyncio.create_task(self._receive())
+
+    async def _receive(self):
+        while line := await self.reader.readline():
+            response = json.loads(line)
+            self._pending.pop(response['id']).set_result(response)
+
+    async def request(self, **request):
+        request['id'] = next(self._ids)
+        future = self._pending[request['id']] = asyncio.get_running_loop().create_future()
+        self.writer.write(json.dumps(request).encode() + b"\n")
+        return await future
+
+    async def close(self):
+        self._receiver.cancel()
+        self.writer.close()
+
+
+async def play_session(client, moves, ai, skill, rng, latencies):
+    """Plays random legal moves in one session, recording the round trip time of every move."""
+    response = await client.request(cmd='new', ai=ai, skill=skill)
+    session = response['session']
+    board = chess.Board(response['fen'])
+    for _ in range(moves):
+        if board.is_game_over():
+            break
+        move = rng.choice(list(board.legal_moves))
+        start = time.perf_counter()
+        response = await client.request(cmd='move', session=session, move=move.uci())
+        latencies.append(time.perf_counter() - start)
+        if 'error' in response:
+            raise RuntimeError(response['error'])
+        board = chess.Board(response['fen'])
+    await client.request(cmd='close', session=session)
+
+
+async def run_load(host=HOST, port=PORT, sessions=1000, connections=50, moves=20, ai=True, skill=1, seed=0):
+    """
+    Opens `sessions` sessions spread over `connections` connections, all playing at the same time.
+
+    :return: dict with moves, seconds, client p50/p99 latency and the server's own stats
+    """
+    rng = random.Random(seed)
+    clients = [Client(*await asyncio.open_connection(host, port, limit=2 ** 16)) for _ in range(connections)]
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(play_session(clients[i % connections], moves, ai, skill, random.Random(rng.random()),
+                                        latencies) for i in range(sessions)))
+    seconds = time.perf_counter() - start
+    server_stats = await clients[0].request(cmd='stats')
+    for client in clients:
+        await client.close()
+    return {'sessions': sessions, 'moves': len(latencies), 'seconds': seconds,
+            'p50_ms': percentile(latencies, 0.5) * 1000, 'p99_ms': percentile(latencies, 0.99) * 1000,
+            'server': server_stats}
+
+
+async def load_main(args):
+    server = None
+    if args.local:
+        ready = asyncio.Event()
+        server = asyncio.create_task(serve(args.host, args.port, args.engine, args.engines, ready))
+        await ready.wait()
+    try:
+        result = await run_load(args.host, args.port, args.sessions, args.connections, args.moves,
+                                not args.no_ai, args.skill)
+    finally:
+        if server:
+            server.cancel()
+            await asyncio.gather(server, return_exceptions=True)
+    cores = os.cpu_count() or 1
+    server_stats = result['server']
+    print(f"{result['sessions']} concurrent sessions, {result['moves']} moves in {result['seconds']:.2f}s "
+          f"({result['moves'] / result['seconds']:.0f} moves/s)")
+    print(f"client latency p50 {result['p50_ms']:.2f} ms, p99 {result['p99_ms']:.2f} ms; "
+          f"server p50 {server_stats['p50_ms']} ms, p99 {server_stats['p99_ms']} ms")
+    print(f"{result['sessions'] / cores:.0f} sessions per core ({cores} cores)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Asyncio chess game server and load generator.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (("serve", "run the server"), ("load", "run the load generator")):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("--host", default=HOST)
+        command.add_argument("--port", type=int, default=PORT)
+        command.add_argument("--engine", default=STOCKFISH_PATH, help="Stockfish executable")
+        command.add_argument("--engines", type=int, default=None, help="engine processes (default: one per core)")
+    load = commands.choices["load"]
+    load.add_argument("--sessions", type=int, default=1000, help="concurrent sessions")
+    load.add_argument("--connections", type=int, default=50, help="connections the sessions are spread over")
+    load.add_argument("--moves", type=int, default=20, help="moves played per session")
+    load.add_argument("--skill", type=int, default=1, help="Stockfish skill level of the AI replies")
+    load.add_argument("--no-ai", action="store_true", help="play without AI replies")
+    load.add_argument("--local", action="store_true", help="start a server in this process first")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "serve":
+            asyncio.run(serve(args.host, args.port, args.engine, args.engines))
+        else:
+            asyncio.run(load_main(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
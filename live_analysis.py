@@ -0,0 +1,136 @@
+"""
+Live multi-PV analysis of the position on the board.
+
+A worker thread with its own Stockfish process runs an infinite `engine.analysis(board, multipv=K)` on the
+current position and keeps only the newest info of every line. Moving to another position stops the running
+search and starts the next one on the same process, so a restart costs a `stop` and a `go`, not an engine
+launch. The UI thread reads the latest lines once per frame and only re-renders them when `version` changed,
+which throttles redraws to the frame rate however fast the engine reports.
+
+Usage:
+    analysis = LiveAnalysis(stockfish_path, multipv=3)
+    analysis.set_position(board)  # every frame while the panel is shown
+    analysis.lines()               # [{'multipv', 'depth', 'cp', 'mate', 'san'}, ...]
+    analysis.pause()
+    analysis.close()
+"""
+import threading
+
+import chess
+import chess.engine
+
+import telemetry
+
+
+MULTIPV = 3
+PV_PLIES = 8  # moves of every line converted to SAN for display
+
+
+class LiveAnalysis:
+    def __init__(self, stockfish_path, multipv=MULTIPV, pv_plies=PV_PLIES):
+        """
+        :param stockfish_path: Stockfish executable; the worker starts its own process so the game's engine
+                               stays free for AI moves and the eval bar.
+        :param multipv: Number of candidate lines (K).
+        """
+        self.stockfish_path = stockfish_path
+        self.multipv = multipv
+        self.pv_plies = pv_plies
+        self.version = 0  # incremented whenever the lines change, for redraw checks
+
+        self._fen = None  # position to analyse, None while paused
+        self._lines = {}  # multipv rank -> line dict of the position being analysed
+        self._analysis = None  # the running chess.engine.SimpleAnalysisResult
+        self._changed = threading.Condition()
+        self._stop = False
+        self._thread = threading.Thread(target=self._run, name="live-analysis", daemon=True)
+        self._thread.start()
+
+    def set_position(self, board):
+        """Analyses board from now on. Cheap to call every frame: nothing happens unless the position changed."""
+        fen = board.fen()
+        if fen == self._fen:
+            return
+        self._switch(fen)
+
+    def pause(self):
+        """Stops searching until the next set_position; the engine process is kept."""
+        if self._fen is not None:
+            self._switch(None)
+
+    def _switch(self, fen):
+        with self._changed:
+            self._fen = fen
+            self._lines = {}
+            self.version += 1
+            if self._analysis is not None:
+                self._analysis.stop()  # the worker's loop over the infos ends and it picks up the new position
+            self._changed.notify()
+
+    def lines(self):
+        """
+        :return: the newest info of every line, best first: dicts with multipv, depth, cp and mate (from
+                 White's point of view, one of them None) and san (the principal variation).
+        """
+        with self._changed:
+            return [self._lines[rank] for rank in sorted(self._lines)]
+
+    # Worker thread
+    def _run(self):
+        try:
+            engine = chess.engine.SimpleEngine.popen_uci(self.stockfish_path)
+        except (OSError, chess.engine.EngineError) as e:
+            print(f"Live analysis disabled: could not start Stockfish ({e}).")
+            return
+        try:
+            while True:
+                with self._changed:
+                    while not self._stop and self._fen is None:
+                        self._changed.wait()
+                    if self._stop:
+                        return
+                    fen = self._fen
+                    board = chess.Board(fen)
+                    if board.is_game_over():
+                        self._analysis = None
+                        self._changed.wait()  # nothing to analyse until the position changes
+                        continue
+                    self._analysis = engine.analysis(board, multipv=self.multipv)
+                for info in self._analysis:
+                    line = self._line(board, info)
+                    if line is None:
+                        continue
+                    with self._changed:
+                        if self._fen != fen:
+                            break
+                        self._lines[line['multipv']] = line
+                        self.version += 1
+                    telemetry.count("analysis.updates")
+                    if line['multipv'] == 1:
+                        telemetry.observe("analysis.depth", line['depth'])
+                with self._changed:
+                    if self._analysis is not None:
+                        self._analysis.stop()
+                        self._analysis = None
+                    if self._fen == fen and not self._stop:
+                        self._changed.wait()  # the search ended by itself (e.g. a forced mate), keep its lines
+        except chess.engine.EngineTerminatedError as e:
+            print(f"Live analysis stopped: {e}")
+        finally:
+            engine.quit()
+
+    def _line(self, board, info):
+        """Converts an info of the engine into a display line, or None for infos without a scored PV."""
+        if 'pv' not in info or 'score' not in info:
+            return None
+        score = info['score'].white()
+        return {'multipv': info.get('multipv', 1), 'depth': info.get('depth', 0), 'cp': score.score(),
+                'mate': score.mate(), 'san': board.variation_san(info['pv'][:self.pv_plies])}
+
+    def close(self):
+        with self._changed:
+            self._stop = True
+            if self._analysis is not None:
+                self._analysis.stop()
+            self._changed.notify()
+        self._thread.join()
@@ -0,0 +1,120 @@
+"""
+Incremental, virtualized move list for the side panel.
+
+The panel mirrors gs.move_log. When the log changes only the rows from the first changed ply onwards
+are invalidated, and rows are only rendered when they scroll into view, so the cost of a move does not
+grow with the length of the game.
+"""
+import pygame as pg
+
+
+class MoveListPanel:
+    PLIES_PER_ROW = 6  # three pairs of moves per line
+
+    def __init__(self, rect, font, bold_font, text_color=(255, 255, 255), bg_color=(0, 0, 0), padding=4):
+        """
+        :param rect: Area of the screen the panel draws into.
+        :param font: Font for the moves.
+        :param bold_font: Font for the move numbers.
+        """
+        self.rect = pg.Rect(rect)
+        self.font = font
+        self.bold_font = bold_font
+        self.text_color = text_color
+        self.bg_color = bg_color
+        self.padding = padding
+        self.row_height = max(font.get_linesize(), bold_font.get_linesize())
+        self.plies = []       # SAN moves currently shown
+        self.row_cache = {}   # row index -> rendered surface, only for rows that were visible
+        self.first_row = 0    # first visible row while scrolled back
+        self.follow = True    # keep the newest row in view
+
+    @property
+    def row_count(self):
+        return (len(self.plies) + self.PLIES_PER_ROW - 1) // self.PLIES_PER_ROW
+
+    @property
+    def visible_rows(self):
+        return max(1, (self.rect.height - 2 * self.padding) // self.row_height)
+
+    def sync(self, move_log):
+        """
+        Brings the panel in line with the move log. Appending a ply only touches the last row, an undo or a
+        switch to another variation only drops the rows from the first ply that differs.
+
+        :return: True if anything changed.
+        """
+        plies = self.plies
+        if move_log == plies:
+            return False  # nothing new (the common case, sync is called every frame; a C-level comparison)
+        if len(move_log) > len(plies) and move_log[:len(plies)] == plies:
+            common = len(plies)  # plies were appended, the usual case: the prefix is compared in C
+        else:
+            # the longest common prefix: the log can also be rewritten in the middle, e.g. by switchVariation
+            common = 0
+            end = min(len(plies), len(move_log))
+            while common < end and move_log[common] == plies[common]:
+                common += 1
+        del plies[common:]
+        plies.extend(move_log[common:])
+
+        first_dirty_row = common // self.PLIES_PER_ROW
+        for row in [row for row in self.row_cache if row >= first_dirty_row]:
+            del self.row_cache[row]
+        if not self.follow:
+            self.first_row = min(self.first_row, max(0, self.row_count - self.visible_rows))
+        return True
+
+    def reset(self, move_log=()):
+        """Drops everything that was rendered, for when the whole log is replaced (e.g. a loaded game)."""
+        self.plies = list(move_log)
+        self.row_cache.clear()
+        self.first_row = 0
+        self.follow = True
+
+    def scroll(self, rows):
+        """Scrolls by a number of rows (negative is up). Scrolling back to the bottom resumes following."""
+        last_first_row = max(0, self.row_count - self.visible_rows)
+        start = last_first_row if self.follow else self.first_row
+        self.first_row = max(0, min(last_first_row, start + rows))
+        self.follow = self.first_row == last_first_row
+
+    def handle_event(self, event):
+        if event.type == pg.MOUSEWHEEL and self.rect.collidepoint(pg.mouse.get_pos()):
+            self.scroll(-event.y)
+            return True
+        return False
+
+    def render_row(self, row):
+        """Renders one row: '<b>n.</b> white black' for each of its move pairs."""
+        start = row * self.PLIES_PER_ROW
+        surface = pg.Surface((self.rect.width - 2 * self.padding, self.row_height))
+        surface.fill(self.bg_color)
+        x = 0
+        for i in range(start, min(start + self.PLIES_PER_ROW, len(self.plies))):
+            if i % 2 == 0:  # White's move starts with the move number
+                number = self.bold_font.render(f"{i // 2 + 1}.", True, self.text_color)
+                surface.blit(number, (x, 0))
+                x += number.get_width() + self.font.size(" ")[0]
+            text = self.font.render(self.plies[i], True, self.text_color)
+            surface.blit(text, (x, 0))
+            x += text.get_width() + self.font.size("  " if i % 2 else " ")[0]
+        return surface
+
+    def draw(self, screen):
+        """Draws only the visible rows, rendering rows that are not cached yet."""
+        screen.fill(self.bg_color, self.rect)
+        if self.follow:
+            self.first_row = max(0, self.row_count - self.visible_rows)
+        last_row = min(self.row_count, self.first_row + self.visible_rows)
+        y = self.rect.y + self.padding
+        for row in range(self.first_row, last_row):
+            surface = self.row_cache.get(row)
+            if surface is None:
+                surface = self.row_cache[row] = self.render_row(row)
+            screen.blit(surface, (self.rect.x + self.padding, y))
+            y += self.row_height
+        # rows that scrolled out of view are not kept around
+        if len(self.row_cache) > 4 * self.visible_rows:
+            for row in [row for row in self.row_cache if not self.first_row <= row < last_row]:
+                del self.row_cache[row]
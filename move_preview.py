@@ -0,0 +1,142 @@
+"""
+Speculative evaluation of the moves of the selected piece.
+
+As soon as a piece is selected, every legal target of it is queued for evaluation, and a few worker threads,
+each with its own Stockfish process, search the positions after those moves in parallel. The position itself
+is searched too, so every move can be judged by what it loses against the best play: good, neutral or
+blunder. Results are kept per (position, move) and the searches go through the shared analysis cache, so
+reselecting a piece, or returning to a position later, is answered at once. The UI thread only reads
+finished results and never waits: the dots fill in as the searches finish.
+
+Usage:
+    preview = MovePreview(stockfish_path, cache=cache)
+    preview.select(board, chess.E2)  # every frame while a piece is selected
+    preview.results(board, chess.E2)  # {to_square: (centipawns for the mover, verdict or None)}
+    preview.clear()
+    preview.close()
+"""
+import collections
+import threading
+
+import chess
+import chess.engine
+
+import analysis_cache
+
+
+ENGINES = 2
+LIMIT = chess.engine.Limit(depth=12)
+GOOD_LOSS = 30  # centipawns lost against the best move that still count as a good move
+BLUNDER_LOSS = 300  # same threshold as the game review's blunder tag
+
+
+def verdict(loss):
+    if loss <= GOOD_LOSS:
+        return 'good'
+    if loss >= BLUNDER_LOSS:
+        return 'blunder'
+    return 'neutral'
+
+
+class MovePreview:
+    def __init__(self, stockfish_path, engines=ENGINES, limit=LIMIT, cache=None):
+        """
+        :param stockfish_path: Stockfish executable; every worker starts its own process.
+        :param engines: Number of worker threads and engine processes.
+        :param limit: Search limit per position.
+        :param cache: Optional analysis_cache.AnalysisCache shared with the rest of the game.
+        """
+        self.stockfish_path = stockfish_path
+        self.limit = limit
+        self.cache = cache
+        self.version = 0  # incremented whenever a result arrives, for redraw checks
+
+        self._selection = None  # (FEN, from square) currently previewed
+        self._jobs = collections.deque()  # (FEN, move or None for the position itself)
+        self._results = {}  # (normalized FEN, move or None) -> centipawns for the side to move in FEN
+        self._changed = threading.Condition()
+        self._stop = False
+        self._threads = [threading.Thread(target=self._run, name=f"move-preview-{i}", daemon=True)
+                         for i in range(engines)]
+        for thread in self._threads:
+            thread.start()
+
+    def select(self, board, square):
+        """
+        Queues the moves of the piece on square. Cheap to call every frame: nothing happens unless the
+        selection changed.
+        """
+        fen = board.fen()
+        if (fen, square) == self._selection:
+            return
+        key = analysis_cache.normalize_fen(board)
+        moves = [move for move in board.legal_moves if move.from_square == square
+                 and move.promotion in (None, chess.QUEEN)]  # one dot per target square
+        with self._changed:
+            self._selection = (fen, square)
+            self._jobs.clear()  # searches for an earlier selection are dropped, unless already running
+            if moves:
+                self._jobs.extend((fen, move) for move in [None] + moves if (key, move) not in self._results)
+            self._changed.notify_all()
+
+    def clear(self):
+        if self._selection is not None:
+            with self._changed:
+                self._selection = None
+                self._jobs.clear()
+
+    def results(self, board, square):
+        """
+        :return: {target square: (centipawns for the side to move, verdict)} of the finished searches of the
+                 piece on square; the verdict is None until the position itself has been searched.
+        """
+        key = analysis_cache.normalize_fen(board)
+        with self._changed:
+            best = self._results.get((key, None))
+            results = {}
+            for move in board.legal_moves:
+                if move.from_square == square and (key, move) in self._results:
+                    cp = self._results[(key, move)]
+                    results[move.to_square] = (cp, None if best is None else verdict(best - cp))
+            return results
+
+    # Worker threads
+    def _run(self):
+        try:
+            engine = chess.engine.SimpleEngine.popen_uci(self.stockfish_path)
+        except (OSError, chess.engine.EngineError) as e:
+            print(f"Move preview disabled: could not start Stockfish ({e}).")
+            return
+        engine_id = analysis_cache.full_strength_id(engine)
+        try:
+            while True:
+                with self._changed:
+                    while not self._stop and not self._jobs:
+                        self._changed.wait()
+                    if self._stop:
+                        return
+                    fen, move = self._jobs.popleft()
+                board = chess.Board(fen)
+                key = (analysis_cache.normalize_fen(board), move)
+                if move is None:
+                    cp = analysis_cache.analyse(engine, board, self.limit, 1, self.cache, engine_id)[0]['cp']
+                else:
+                    board.push(move)
+                    if board.is_checkmate():
+                        cp = analysis_cache.MATE_SCORE
+                    elif board.is_game_over(claim_draw=True):
+                        cp = 0
+                    else:  # the position after the move is scored for the opponent
+                        cp = -analysis_cache.analyse(engine, board, self.limit, 1, self.cache, engine_id)[0]['cp']
+                with self._changed:
+                    self._results[key] = cp
+                    self.version += 1
+        finally:
+            engine.quit()
+
+    def close(self):
+        with self._changed:
+            self._stop = True
+            self._changed.notify_all()
+        for thread in self._threads:
+            thread.join()
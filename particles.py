@@ -0,0 +1,164 @@
+"""
+Structure-of-arrays particle system used for the confetti on the game over screen.
+
+All particle state lives in NumPy arrays and is updated with vectorized operations. Dead particles
+free their slot, and new particles are written into free slots, so nothing is reallocated per frame.
+"""
+import numpy as np
+import pygame as pg
+
+
+CONFETTI_COLORS = [(255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 0), (255, 0, 255), (0, 255, 255)]
+
+
+class ParticleSystem:
+    def __init__(self, capacity, bounds, palette, gravity=0.0, drift=0.0, margin=20, seed=None):
+        """
+        :param capacity: Maximum number of live particles.
+        :param bounds: (width, height) of the area the particles live in. Particles leaving it die.
+        :param palette: List of RGB colours, particles store an index into it.
+        :param gravity: Vertical speed added to every particle each frame.
+        :param drift: Maximum random horizontal jitter applied each frame.
+        :param margin: Distance outside the bounds (sides and bottom) before a particle dies.
+        """
+        self.capacity = capacity
+        self.width, self.height = bounds
+        self.palette = [tuple(c) for c in palette]
+        self.gravity = gravity
+        self.drift = drift
+        self.margin = margin
+        self.rng = np.random.default_rng(seed)
+
+        self.pos = np.zeros((capacity, 2), dtype=np.float32)
+        self.vel = np.zeros((capacity, 2), dtype=np.float32)
+        self.size = np.zeros(capacity, dtype=np.int16)
+        self.color = np.zeros(capacity, dtype=np.int16)
+        self.life = np.zeros(capacity, dtype=np.float32)  # frames left, inf for particles that only die off screen
+        self.alive = np.zeros(capacity, dtype=bool)
+        self._sprites = {}  # (color index, size) -> filled square surface
+
+    def __len__(self):
+        return int(np.count_nonzero(self.alive))
+
+    def _sample(self, value, count, integer=False):
+        """Scalars are broadcast, (low, high) tuples are sampled uniformly (inclusive high for integers)."""
+        if isinstance(value, tuple):
+            low, high = value
+            if integer:
+                return self.rng.integers(low, high + 1, count)
+            return self.rng.uniform(low, high, count)
+        return np.full(count, value)
+
+    def emit(self, count, x, y, vx=0.0, vy=0.0, size=4, color=None, life=np.inf):
+        """
+        Spawns particles into free slots. Every attribute may be a scalar or a (low, high) range.
+
+        :param color: Palette index or range of indices, defaults to the whole palette.
+        :return: Number of particles actually spawned (limited by free capacity).
+        """
+        return len(self._spawn(count, x, y, vx, vy, size, color, life))
+
+    def burst(self, count, center, speed=(2.0, 6.0), size=(3, 6), color=None, life=30):
+        """Spawns particles flying outwards from a point, e.g. for capture or promotion effects."""
+        slots = self._spawn(count, center[0], center[1], 0.0, 0.0, size, color, life)
+        angle = self.rng.uniform(0, 2 * np.pi, len(slots))
+        magnitude = self._sample(speed, len(slots))
+        self.vel[slots, 0] = np.cos(angle) * magnitude
+        self.vel[slots, 1] = np.sin(angle) * magnitude
+        return len(slots)
+
+    def _spawn(self, count, x, y, vx, vy, size, color, life):
+        slots = np.flatnonzero(~self.alive)[:count]
+        count = len(slots)
+        if count == 0:
+            return slots
+        if color is None:
+            color = (0, len(self.palette) - 1)
+        self.pos[slots, 0] = self._sample(x, count)
+        self.pos[slots, 1] = self._sample(y, count)
+        self.vel[slots, 0] = self._sample(vx, count)
+        self.vel[slots, 1] = self._sample(vy, count)
+        self.size[slots] = self._sample(size, count, integer=True)
+        self.color[slots] = self._sample(color, count, integer=True)
+        self.life[slots] = life
+        self.alive[slots] = True
+        return slots
+
+    def update(self):
+        """Advances all live particles by one frame and frees the slots of particles that died."""
+        alive = self.alive
+        if not alive.any():
+            return
+        self.vel[alive, 1] += self.gravity
+        self.pos[alive] += self.vel[alive]
+        if self.drift:
+            self.pos[alive, 0] += self.rng.uniform(-self.drift, self.drift, np.count_nonzero(alive))
+        self.life[alive] -= 1
+
+        x, y = self.pos[:, 0], self.pos[:, 1]
+        dead = ((self.life <= 0) | (y > self.height + self.margin) |
+                (x < -self.margin) | (x > self.width + self.margin))
+        self.alive &= ~dead
+
+    def draw(self, screen):
+        """
+        Draws all live particles straight into the pixel buffer of the screen, one vectorized write per
+        particle size. Surfaces that are not 32 bit fall back to a batched blit.
+        """
+        idx = np.flatnonzero(self.alive)
+        if len(idx) == 0:
+            return
+        if screen.get_bytesize() != 4:
+            self._draw_blits(screen, idx)
+            return
+        width, height = screen.get_size()
+        stride = screen.get_pitch() // 4
+        mapped = np.array([screen.map_rgb(color) for color in self.palette], dtype=np.uint32)
+        pos = self.pos[idx].astype(np.int32)
+        sizes = self.size[idx]
+        colors = mapped[self.color[idx]]
+        buffer = screen.get_buffer()
+        pixels = np.frombuffer(buffer, dtype=np.uint32)
+        for size in np.unique(sizes).tolist():
+            group = np.flatnonzero(sizes == size)
+            x, y = pos[group, 0], pos[group, 1]
+            dy, dx = np.divmod(np.arange(size * size, dtype=np.int32), size)
+            inside = (x >= 0) & (y >= 0) & (x + size <= width) & (y + size <= height)
+            # particles fully on screen need no per pixel clipping
+            full = group[inside]
+            offsets = dy * stride + dx
+            pixels[((y[inside] * stride + x[inside])[:, None] + offsets).ravel()] = np.repeat(colors[full], size * size)
+            # particles crossing an edge are clipped pixel by pixel
+            edge = ~inside & (x + size > 0) & (y + size > 0) & (x < width) & (y < height)
+            if edge.any():
+                xs = (x[edge][:, None] + dx).ravel()
+                ys = (y[edge][:, None] + dy).ravel()
+                edge_colors = np.repeat(colors[group[edge]], size * size)
+                visible = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+                pixels[ys[visible] * stride + xs[visible]] = edge_colors[visible]
+        del pixels, buffer  # release the surface lock
+
+    def _draw_blits(self, screen, idx):
+        keys = zip(self.color[idx].tolist(), self.size[idx].tolist())
+        positions = self.pos[idx].astype(np.int32).tolist()
+        sprite = self._sprite
+        screen.blits([(sprite(key), pos) for key, pos in zip(keys, positions)], doreturn=False)
+
+    def _sprite(self, key):
+        sprite = self._sprites.get(key)
+        if sprite is None:
+            color, size = key
+            sprite = pg.Surface((size, size))
+            sprite.fill(self.palette[color])
+            self._sprites[key] = sprite
+        return sprite
+
+    def clear(self):
+        self.alive[:] = False
+
+
+def confetti(num_particles, screen_width, screen_height, seed=None):
+    """Confetti falling from above the screen at 1-5 px per frame with a little horizontal drift."""
+    system = ParticleSystem(num_particles, (screen_width, screen_height), CONFETTI_COLORS, drift=1.0, seed=seed)
+    system.emit(num_particles, x=(0, screen_width), y=(-screen_height, 0), vy=(1.0, 5.0), size=(3, 7))
+    return system
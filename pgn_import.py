@@ -0,0 +1,219 @@
+"""
+Parallel importer for large PGN collections.
+
+The PGN file is memory-mapped and cut into chunks that start on a game boundary ('[Event ' at the start of
+a line). Worker processes parse their chunk with chess.pgn, every move is replayed on a chess.Board by the
+reader (an illegal or unparsable move rejects the game), and valid games come back as v2 save records.
+The main process appends them to a GameDatabase in chunk order, with only a few chunks in flight, so memory
+stays bounded however large the file is. A checkpoint after every chunk lets an interrupted import resume.
+
+Usage:
+    python pgn_import.py lichess_2024-01.pgn games.cgdb --workers 8
+"""
+import argparse
+import collections
+import io
+import json
+import mmap
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import chess
+import chess.pgn
+import numpy as np
+
+import game_database
+import position_index
+import save_format
+
+
+GAME_BOUNDARY = b"\n[Event "
+CHUNK_BYTES = 4 * 1024 * 1024
+KEPT_TAGS = ('Event', 'Site', 'Date', 'White', 'Black', 'Result', 'WhiteElo', 'BlackElo', 'ECO', 'TimeControl')
+
+
+def chunk_bounds(path, start=0, chunk_bytes=CHUNK_BYTES):
+    """Yields (start, end) byte ranges of the file that each contain whole games."""
+    size = os.path.getsize(path)
+    if size == 0:
+        return
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        while start < size:
+            boundary = mm.find(GAME_BOUNDARY, min(start + chunk_bytes, size))
+            end = size if boundary == -1 else boundary + 1
+            yield start, end
+            start = end
+
+
+class MoveCollector(chess.pgn.BaseVisitor):
+    """Collects headers and mainline moves of one game without building a GameNode tree."""
+
+    def begin_game(self):
+        self.headers = {}
+        self.moves = []
+        self.error = None
+
+    def visit_header(self, tagname, tagvalue):
+        self.headers[tagname] = tagvalue
+
+    def begin_variation(self):
+        return chess.pgn.SKIP
+
+    def visit_move(self, board, move):
+        self.moves.append(move)  # the reader pushes it on its board right after
+
+    def handle_error(self, error):
+        self.error = error
+
+    def result(self):
+        return self.headers, self.moves, self.error
+
+
+def parse_chunk(path, start, end, index_positions=False):
+    """
+    Worker entry point: parses the games in one byte range of the PGN file.
+
+    :param index_positions: Also build position index records, with game ids relative to the chunk.
+    :return: (list of (v2 save bytes, plies, tags), number of rejected games, plies parsed, index records)
+    """
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        text = mm[start:end].decode('utf-8', errors='replace')
+    handle = io.StringIO(text)
+    records = []
+    positions = []
+    rejected = plies = 0
+    while True:
+        game = chess.pgn.read_game(handle, Visitor=MoveCollector)
+        if game is None:
+            break
+        headers, moves, error = game
+        if error is not None or headers.get('Variant', 'Standard').lower() not in ('standard', 'chess'):
+            rejected += 1
+            continue
+        start_fen = headers.get('FEN', chess.STARTING_FEN)
+        tags = {name: headers[name] for name in KEPT_TAGS if name in headers}
+        if index_positions:
+            positions.append(position_index.game_entries(len(records), moves, start_fen, tags.get('Result', '*')))
+        records.append((save_format.encode_game(moves, start_fen, tags), len(moves), tags))
+        plies += len(moves)
+    positions = np.concatenate(positions) if positions else np.zeros(0, dtype=position_index.ENTRY)
+    return records, rejected, plies, positions
+
+
+def checkpoint_path(db_path):
+    return db_path + ".import.json"
+
+
+def source_id(path):
+    stat = os.stat(path)
+    return {'source': os.path.abspath(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def load_checkpoint(path, db_path):
+    """:return: the checkpoint of an earlier import of the same file into the same database, or None."""
+    try:
+        with open(checkpoint_path(db_path)) as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return None
+    source = source_id(path)
+    if any(checkpoint.get(key) != value for key, value in source.items()):
+        return None
+    return checkpoint
+
+
+def save_checkpoint(db_path, checkpoint):
+    tmp_path = checkpoint_path(db_path) + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, checkpoint_path(db_path))
+
+
+def import_pgn(path, db_path, workers=None, chunk_bytes=CHUNK_BYTES, resume=True, progress=None, index_path=None):
+    """
+    Imports a PGN file into a game database.
+
+    :param workers: Worker processes (default: all cores).
+    :param index_path: Optional position index (see position_index.py) to add the imported games to.
+    :param resume: Continue from the checkpoint of an interrupted import of the same file.
+    :param progress: Optional callback(checkpoint dict) called after every committed chunk.
+    :return: The final checkpoint dict (games, rejected, plies, seconds, ...).
+    """
+    workers = workers or os.cpu_count() or 1
+    checkpoint = load_checkpoint(path, db_path) if resume else None
+    positions = position_index.PositionIndex(index_path) if index_path else None
+    with game_database.GameDatabase(db_path) as db:
+        if checkpoint is None:
+            checkpoint = dict(source_id(path), offset=0, first_game=len(db), games=0, rejected=0, plies=0,
+                              seconds=0.0, done=False)
+        elif checkpoint['done']:
+            return checkpoint
+        else:
+            db.truncate(checkpoint['first_game'] + checkpoint['games'])  # drop games of the unfinished chunk
+            if positions is not None:
+                positions.drop_games(len(db))
+
+        start_time = time.perf_counter() - checkpoint['seconds']
+        bounds = chunk_bounds(path, checkpoint['offset'], chunk_bytes)
+        pending = collections.deque()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            while True:
+                # keep a bounded number of chunks in flight so memory does not grow with the file
+                while len(pending) < 2 * workers:
+                    chunk = next(bounds, None)
+                    if chunk is None:
+                        break
+                    pending.append((chunk[1], pool.submit(parse_chunk, path, *chunk, positions is not None)))
+                if not pending:
+                    break
+                end, future = pending.popleft()
+                records, rejected, plies, entries = future.result()
+                first_id = len(db)
+                db.append_encoded(records, sync=True)
+                if positions is not None:
+                    entries['game'] += first_id
+                    positions.add_entries(entries)
+                checkpoint.update(offset=end, games=checkpoint['games'] + len(records),
+                                  rejected=checkpoint['rejected'] + rejected, plies=checkpoint['plies'] + plies,
+                                  seconds=time.perf_counter() - start_time)
+                save_checkpoint(db_path, checkpoint)
+                if progress:
+                    progress(checkpoint)
+        if positions is not None:
+            positions.merge()
+        checkpoint['done'] = True
+        checkpoint['workers'] = workers
+        save_checkpoint(db_path, checkpoint)
+    return checkpoint
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import a PGN collection into a game database.")
+    parser.add_argument("pgn", help="PGN file to import")
+    parser.add_argument("database", help="game database file (created if missing)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--chunk-mb", type=float, default=CHUNK_BYTES / 2 ** 20, help="chunk size in MiB")
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    parser.add_argument("--positions", default=None, help="position index to add the games to")
+    args = parser.parse_args(argv)
+
+    def progress(checkpoint):
+        print(f"\r{checkpoint['offset'] / 2 ** 20:10.1f} MiB  {checkpoint['games']:>10} games", end="", flush=True)
+
+    result = import_pgn(args.pgn, args.database, args.workers, int(args.chunk_mb * 2 ** 20),
+                        not args.restart, progress, args.positions)
+    print()
+    seconds = max(result['seconds'], 1e-9)
+    workers = result.get('workers', args.workers or os.cpu_count() or 1)
+    rate = result['games'] / seconds
+    print(f"Imported {result['games']} games ({result['rejected']} rejected, {result['plies']} plies) "
+          f"in {seconds:.1f}s: {rate:.0f} games/s, {rate / workers:.0f} games/s per core")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,210 @@
+"""
+Position search index for the opening explorer.
+
+Maps Zobrist hashes of positions to the games that reached them and the move played next, with win/draw/loss
+counts per move. The bulk of the index is a table aggregated per (position, move), sorted by hash and
+memory-mapped from disk, so a lookup is a binary search plus a handful of rows however many games reached
+the position. New games go to an append-only delta file that is kept in memory and merged into the sorted
+table once it grows past a threshold.
+
+Files:
+    <path>.hash.npy   sorted u64 hash of every (position, move) row (contiguous, for np.searchsorted)
+    <path>.rows.npy   per row: packed move, white/draw/black/unknown counts, start of its games
+    <path>.games.npy  game id and result of every occurrence, grouped by row
+    <path>.delta      unsorted records appended since the last merge
+"""
+import os
+
+import chess
+import chess.polyglot
+import numpy as np
+
+import save_format
+
+
+ENTRY = np.dtype([('hash', '<u8'), ('game', '<u4'), ('move', '<u2'), ('result', 'u1'), ('pad', 'u1')])
+ROW = np.dtype([('move', '<u2'), ('white', '<u4'), ('draws', '<u4'), ('black', '<u4'), ('unknown', '<u4'),
+                ('start', '<u8')])
+GAME = np.dtype([('game', '<u4'), ('result', 'u1')])
+
+# result codes, from White's point of view
+UNKNOWN, WHITE_WINS, BLACK_WINS, DRAW = 0, 1, 2, 3
+RESULT_CODES = {'1-0': WHITE_WINS, '0-1': BLACK_WINS, '1/2-1/2': DRAW}
+RESULT_FIELDS = {UNKNOWN: 'unknown', WHITE_WINS: 'white', BLACK_WINS: 'black', DRAW: 'draws'}
+
+MERGE_THRESHOLD = 1_000_000  # delta records kept in memory before they are merged into the sorted table
+TABLE_FILES = (".hash.npy", ".rows.npy", ".games.npy")
+
+
+def index_exists(path):
+    return any(os.path.exists(path + suffix) for suffix in (".hash.npy", ".delta"))
+
+
+def game_entries(game_id, moves, start_fen=chess.STARTING_FEN, result='*'):
+    """
+    Builds the index records of one game: one per position, with the move played from it.
+
+    :return: numpy array of ENTRY
+    """
+    moves = list(moves)
+    entries = np.zeros(len(moves), dtype=ENTRY)
+    board = chess.Board(start_fen)
+    for i, move in enumerate(moves):
+        entries[i] = (chess.polyglot.zobrist_hash(board), game_id, save_format.pack_move(move),
+                      RESULT_CODES.get(result, UNKNOWN), 0)
+        board.push(move)
+    return entries
+
+
+def aggregate(entries):
+    """
+    Sorts raw records by (hash, move, game) and groups them into rows.
+
+    :return: (row hashes, rows, games) as written to the table files
+    """
+    order = np.lexsort((entries['game'], entries['move'], entries['hash']))
+    entries = entries[order]
+    games = np.zeros(len(entries), dtype=GAME)
+    games['game'] = entries['game']
+    games['result'] = entries['result']
+    if len(entries) == 0:
+        return np.zeros(0, dtype='<u8'), np.zeros(0, dtype=ROW), games
+    new_row = np.ones(len(entries), dtype=bool)
+    new_row[1:] = (entries['hash'][1:] != entries['hash'][:-1]) | (entries['move'][1:] != entries['move'][:-1])
+    starts = np.flatnonzero(new_row)
+    rows = np.zeros(len(starts), dtype=ROW)
+    rows['move'] = entries['move'][starts]
+    rows['start'] = starts
+    row_of_entry = np.cumsum(new_row) - 1
+    for code, field in RESULT_FIELDS.items():
+        rows[field] = np.bincount(row_of_entry, weights=entries['result'] == code, minlength=len(starts))
+    return entries['hash'][starts], rows, games
+
+
+class PositionIndex:
+    def __init__(self, path, merge_threshold=MERGE_THRESHOLD):
+        """
+        :param path: Path prefix of the index files (the sorted table is created on the first merge).
+        """
+        self.path = path
+        self.merge_threshold = merge_threshold
+        self._load_table()
+        self._delta = {}  # hash -> list of (game, move, result)
+        self._delta_count = 0
+        if os.path.exists(self.delta_path):
+            self._add_to_memory(np.fromfile(self.delta_path, dtype=ENTRY))
+
+    @property
+    def delta_path(self):
+        return self.path + ".delta"
+
+    def __len__(self):
+        """Number of indexed (position, next move) occurrences."""
+        return len(self._games) + self._delta_count
+
+    def _load_table(self):
+        if os.path.exists(self.path + ".hash.npy"):
+            self._hashes, self._rows, self._games = (np.load(self.path + suffix, mmap_mode='r')
+                                                     for suffix in TABLE_FILES)
+        else:
+            self._hashes = np.zeros(0, dtype='<u8')
+            self._rows = np.zeros(0, dtype=ROW)
+            self._games = np.zeros(0, dtype=GAME)
+
+    def _table_entries(self):
+        """Expands the sorted table back into raw records (for merging)."""
+        starts = np.asarray(self._rows['start'], dtype=np.int64)
+        counts = np.diff(np.append(starts, np.int64(len(self._games))))
+        entries = np.zeros(len(self._games), dtype=ENTRY)
+        entries['hash'] = np.repeat(np.asarray(self._hashes), counts)
+        entries['move'] = np.repeat(np.asarray(self._rows['move']), counts)
+        entries['game'] = self._games['game']
+        entries['result'] = self._games['result']
+        return entries
+
+    def _write_table(self, entries):
+        arrays = aggregate(entries)
+        for suffix, array in zip(TABLE_FILES, arrays):
+            with open(self.path + suffix + ".tmp", 'wb') as f:
+                np.save(f, array)
+        self._hashes = self._rows = self._games = None  # drop the old maps before replacing the files
+        for suffix in TABLE_FILES:
+            os.replace(self.path + suffix + ".tmp", self.path + suffix)
+        self._load_table()
+
+    def _add_to_memory(self, entries):
+        delta = self._delta
+        for h, game, move, result, _ in entries.tolist():
+            delta.setdefault(h, []).append((game, move, result))
+        self._delta_count += len(entries)
+
+    # Building
+    def add_entries(self, entries):
+        """Appends index records (numpy array of ENTRY), merging into the sorted table when the delta is full."""
+        if len(entries) == 0:
+            return
+        with open(self.delta_path, 'ab') as f:
+            entries.tofile(f)
+        self._add_to_memory(entries)
+        if self._delta_count >= self.merge_threshold:
+            self.merge()
+
+    def add_game(self, game_id, moves, start_fen=chess.STARTING_FEN, result='*'):
+        """Indexes every position of a game (called when a game is saved or imported)."""
+        self.add_entries(game_entries(game_id, moves, start_fen, result))
+
+    def merge(self):
+        """Sorts the delta into the memory-mapped table and empties it."""
+        if not self._delta_count:
+            return
+        delta = np.fromfile(self.delta_path, dtype=ENTRY)
+        self._write_table(np.concatenate([self._table_entries(), delta]))
+        os.remove(self.delta_path)
+        self._delta = {}
+        self._delta_count = 0
+
+    def drop_games(self, first_game):
+        """Removes the records of every game with an id >= first_game (rolls back an interrupted import)."""
+        if os.path.exists(self.delta_path):
+            delta = np.fromfile(self.delta_path, dtype=ENTRY)
+            kept = delta[delta['game'] < first_game]
+            if len(kept) != len(delta):
+                with open(self.delta_path, 'wb') as f:
+                    kept.tofile(f)
+                self._delta = {}
+                self._delta_count = 0
+                self._add_to_memory(kept)
+        if len(self._games) and np.asarray(self._games['game']).max() >= first_game:
+            entries = self._table_entries()
+            self._write_table(entries[entries['game'] < first_game])
+
+    # Lookup
+    def lookup(self, board, max_games=10):
+        """
+        Opening explorer statistics for a position.
+
+        :return: list of dicts (move, san, games, white, draws, black, game_ids), most played move first.
+        """
+        zobrist = chess.polyglot.zobrist_hash(board)
+        stats = {}
+        lo = int(np.searchsorted(self._hashes, zobrist, 'left'))
+        hi = int(np.searchsorted(self._hashes, zobrist, 'right'))
+        for row in range(lo, hi):
+            move, white, draws, black, unknown, start = self._rows[row].tolist()
+            total = white + draws + black + unknown
+            game_ids = self._games['game'][start:start + min(total, max_games)].tolist()
+            stats[move] = {'games': total, 'white': white, 'draws': draws, 'black': black, 'game_ids': game_ids}
+        for game, move, result in self._delta.get(zobrist, ()):
+            entry = stats.setdefault(move, {'games': 0, 'white': 0, 'draws': 0, 'black': 0, 'game_ids': []})
+            entry['games'] += 1
+            if result != UNKNOWN:
+                entry[RESULT_FIELDS[result]] += 1
+            if len(entry['game_ids']) < max_games:
+                entry['game_ids'].append(game)
+        moves = []
+        for packed, entry in stats.items():
+            move = save_format.unpack_move(packed)
+            if board.is_legal(move):  # guards against the (unlikely) hash collision
+                moves.append(dict(entry, move=move, san=board.san(move)))
+        moves.sort(key=lambda m: m['games'], reverse=True)
+        return moves
@@ -0,0 +1,173 @@
+"""
+Compact position transport for worker processes.
+
+Sending a chess.Board to another process pickles the whole object, move stack included, so the cost of a
+task grows with the length of the game. Here a position is a fixed-size record instead: the six piece
+bitboards, White's occupancy, castling rights, en passant square, side to move and both clocks, followed
+by room for the result (score, best move, depth). Records live in slots of a multiprocessing.shared_memory
+block. The parent writes a position into a free slot and sends only the slot number; the worker reads the
+record straight from the shared buffer, writes its result back into the same slot and returns the number.
+
+The move history is not transported, so workers cannot see repetitions; positions are what engines and
+renderers need anyway.
+
+Usage:
+    for i, (score, move, depth) in map_positions(evaluate, boards, workers=4):
+        ...
+    # evaluate(board) -> (score, move or None, depth) is a module level function run in the workers
+"""
+import collections
+import multiprocessing.util
+import os
+import struct
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+
+import chess
+
+import save_format
+
+
+# pawns, knights, bishops, rooks, queens, kings, White's pieces, castling rights, ep square (-1 for none),
+# side to move, halfmove clock, fullmove number
+POSITION = struct.Struct("<8QbBHH")
+RESULT = struct.Struct("<iHH")  # score, packed best move (0 for none), depth
+SLOT_SIZE = POSITION.size + RESULT.size
+SLOTS = 256
+
+
+def pack_position(board, buffer, offset=0):
+    POSITION.pack_into(buffer, offset, board.pawns, board.knights, board.bishops, board.rooks, board.queens,
+                       board.kings, board.occupied_co[chess.WHITE], board.castling_rights,
+                       -1 if board.ep_square is None else board.ep_square, board.turn, board.halfmove_clock,
+                       board.fullmove_number)
+
+
+def unpack_position(buffer, offset=0):
+    """:return: chess.Board of the record at offset, without move history."""
+    (pawns, knights, bishops, rooks, queens, kings, white, castling, ep_square, turn, halfmove,
+     fullmove) = POSITION.unpack_from(buffer, offset)
+    board = chess.Board(None)
+    board.pawns, board.knights, board.bishops = pawns, knights, bishops
+    board.rooks, board.queens, board.kings = rooks, queens, kings
+    board.occupied = pawns | knights | bishops | rooks | queens | kings
+    board.occupied_co[chess.WHITE] = white
+    board.occupied_co[chess.BLACK] = board.occupied & ~white
+    board.castling_rights = castling
+    board.ep_square = None if ep_square < 0 else ep_square
+    board.turn = bool(turn)
+    board.halfmove_clock = halfmove
+    board.fullmove_number = fullmove
+    return board
+
+
+class PositionRing:
+    def __init__(self, slots=SLOTS, name=None):
+        """
+        :param slots: Number of records; only used when creating the block.
+        :param name: Name of an existing block to attach to (in a worker), None to create one.
+        """
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=slots * SLOT_SIZE)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.slots = self.shm.size // SLOT_SIZE
+        self.buffer = self.shm.buf
+        self._free = collections.deque(range(self.slots))  # only used by the owner
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def free_slots(self):
+        return len(self._free)
+
+    def put(self, board):
+        """
+        Writes a position into a free slot.
+
+        :return: The slot number, or None if every slot is in use.
+        """
+        if not self._free:
+            return None
+        index = self._free.popleft()
+        pack_position(board, self.buffer, index * SLOT_SIZE)
+        RESULT.pack_into(self.buffer, index * SLOT_SIZE + POSITION.size, 0, 0, 0)
+        return index
+
+    def release(self, index):
+        self._free.append(index)
+
+    def position(self, index):
+        return unpack_position(self.buffer, index * SLOT_SIZE)
+
+    def write_result(self, index, score, move=None, depth=0):
+        RESULT.pack_into(self.buffer, index * SLOT_SIZE + POSITION.size, score,
+                         save_format.pack_move(move) if move else 0, depth)
+
+    def result(self, index):
+        """:return: (score, move or None, depth) written by the worker."""
+        score, move, depth = RESULT.unpack_from(self.buffer, index * SLOT_SIZE + POSITION.size)
+        return score, save_format.unpack_move(move) if move else None, depth
+
+    def close(self):
+        self.buffer = None  # the memoryview must be released before the block can be closed
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+"""
+Worker pool
+"""
+_ring = None  # the worker's attachment to the parent's ring
+
+
+def init_worker(name):
+    global _ring
+    _ring = PositionRing(name=name)
+    multiprocessing.util.Finalize(None, _ring.close, exitpriority=10)  # detach before the worker exits
+
+
+def run_slot(function, index):
+    """Worker entry point: evaluates the position in a slot and writes the result back into it."""
+    score, move, depth = function(_ring.position(index))
+    _ring.write_result(index, score, move, depth)
+    return index
+
+
+def map_positions(function, boards, workers=None, slots=SLOTS):
+    """
+    Runs function(board) -> (score, move or None, depth) for every board in a process pool, transporting
+    positions through shared memory. At most `slots` positions are in flight.
+
+    :param function: Module level function, run in the workers.
+    :return: Iterator of (index in boards, (score, move, depth)) in completion order.
+    """
+    ring = PositionRing(slots)
+    try:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1, initializer=init_worker,
+                                 initargs=(ring.name,)) as pool:
+            boards = enumerate(boards)
+            pending = {}  # future -> index in boards
+            exhausted = False
+            while pending or not exhausted:
+                while not exhausted and ring.free_slots:
+                    item = next(boards, None)
+                    if item is None:
+                        exhausted = True
+                        break
+                    index = ring.put(item[1])
+                    pending[pool.submit(run_slot, function, index)] = item[0]
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    slot = future.result()
+                    result = ring.result(slot)
+                    ring.release(slot)
+                    yield pending.pop(future), result
+    finally:
+        ring.close()
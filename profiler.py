@@ -0,0 +1,106 @@
+"""
+On-demand sampling profiler for stutter reports.
+
+While a capture runs, a background thread samples the stack of the profiled thread (the game loop) every
+few milliseconds with sys._current_frames. When the capture ends it writes:
+    <name>.collapsed   one "frame;frame;frame count" line per distinct stack, the input format of
+                       flamegraph.pl, speedscope and similar viewers
+    <name>.txt         the tags (ply, AI on/off, difficulty, ...) and the top-N functions by own and by
+                       total samples
+Nothing runs between captures: no thread, no trace hook, so the hotkey can stay enabled in release builds.
+"""
+import collections
+import os
+import sys
+import threading
+import time
+
+
+INTERVAL = 0.005  # seconds between samples
+TOP_N = 25
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class Profiler:
+    def __init__(self, out_dir, interval=INTERVAL, top_n=TOP_N):
+        self.out_dir = out_dir
+        self.interval = interval
+        self.top_n = top_n
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, seconds, tags=None, thread_id=None):
+        """
+        Samples a thread (default: the calling one) for `seconds`, then writes the results.
+
+        :param tags: dict describing the game state, written to the summary.
+        """
+        if self.running:
+            return
+        self._stop.clear()
+        target = thread_id or threading.get_ident()
+        self._thread = threading.Thread(target=self._run, args=(target, seconds, dict(tags or {})),
+                                        name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Ends a capture early; the results are still written."""
+        self._stop.set()
+
+    def toggle(self, seconds, tags=None):
+        if self.running:
+            self.stop()
+        else:
+            self.start(seconds, tags)
+
+    def _run(self, target, seconds, tags):
+        stacks = collections.Counter()
+        start = time.perf_counter()
+        deadline = start + seconds
+        while not self._stop.wait(self.interval) and time.perf_counter() < deadline:
+            frame = sys._current_frames().get(target)
+            if frame is None:
+                break
+            labels = []
+            while frame is not None:
+                labels.append(frame_label(frame))
+                frame = frame.f_back
+            stacks[";".join(reversed(labels))] += 1
+        tags['seconds'] = round(time.perf_counter() - start, 2)
+        tags['samples'] = sum(stacks.values())
+        self.write(stacks, tags)
+
+    def write(self, stacks, tags):
+        os.makedirs(self.out_dir, exist_ok=True)
+        base = os.path.join(self.out_dir, time.strftime("profile-%Y%m%d-%H%M%S"))
+        with open(base + ".collapsed", 'w') as f:
+            for stack, samples in stacks.most_common():
+                f.write(f"{stack} {samples}\n")
+        with open(base + ".txt", 'w') as f:
+            f.write(summary(stacks, tags, self.top_n))
+        print(f"Profile written to {base}.collapsed ({tags['samples']} samples)")
+
+
+def summary(stacks, tags, top_n=TOP_N):
+    """Top-N functions by own samples (on top of the stack) and by total samples (anywhere on it)."""
+    own, total = collections.Counter(), collections.Counter()
+    for stack, samples in stacks.items():
+        frames = stack.split(";")
+        own[frames[-1]] += samples
+        for label in set(frames):
+            total[label] += samples
+    count = max(sum(stacks.values()), 1)
+    lines = [f"{name}: {value}" for name, value in tags.items()]
+    for title, counter in (("own", own), ("total", total)):
+        lines += ["", f"Top {top_n} by {title} samples:"]
+        for label, samples in counter.most_common(top_n):
+            lines.append(f"{100 * samples / count:6.1f}%  {samples:>6}  {label}")
+    return "\n".join(lines) + "\n"
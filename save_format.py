@@ -0,0 +1,268 @@
+"""
+Compact binary save format for v2 games, plus migration of the legacy JSON saves.
+
+Layout (little endian):
+    magic b'CHSV' | version u8 | flags u8 | fen length u16 | tags length u16 | FEN | tags JSON | moves
+Every move is one u16: from square (bits 0-5), to square (bits 6-11), promotion piece type (bits 12-15).
+Moves run to the end of the file, so a save is read by streaming and can be appended to.
+
+The legacy saves in chess_save_games/ were written by the archived engine (00_ARCHIVE/chess_engine.py)
+with Move.to_dict, and are read back through its Move.from_dict.
+
+Usage:
+    python save_format.py migrate chess_save_games/*.json
+    python save_format.py pgn chess_save_games/1.chs
+"""
+import argparse
+import importlib.util
+import io
+import json
+import os
+import struct
+import sys
+import time
+
+import chess
+
+
+MAGIC = b"CHSV"
+VERSION = 1
+HEADER = struct.Struct('<4sBBHH')
+MOVE = struct.Struct('<H')
+EXTENSION = ".chs"
+READ_CHUNK = 4096  # bytes of moves read at a time (2048 plies)
+
+ARCHIVED_ENGINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "00_ARCHIVE", "chess_engine.py")
+
+
+def pack_move(move):
+    """Packs a chess.Move into 16 bits: from | to << 6 | promotion << 12."""
+    return move.from_square | (move.to_square << 6) | ((move.promotion or 0) << 12)
+
+
+def unpack_move(value):
+    return chess.Move(value & 0x3F, (value >> 6) & 0x3F, promotion=(value >> 12) or None)
+
+
+def encode_header(start_fen=chess.STARTING_FEN, tags=None):
+    fen = start_fen.encode()
+    tag_bytes = json.dumps(tags, separators=(',', ':')).encode() if tags else b""
+    return HEADER.pack(MAGIC, VERSION, 0, len(fen), len(tag_bytes)) + fen + tag_bytes
+
+
+def encode_game(moves, start_fen=chess.STARTING_FEN, tags=None):
+    """
+    Encodes a game.
+
+    :param moves: Iterable of chess.Move from the starting position.
+    :param tags: Optional dict of PGN style tags (White, Black, Result, Date, ...).
+    :return: bytes
+    """
+    packed = [pack_move(move) for move in moves]
+    return encode_header(start_fen, tags) + struct.pack(f'<{len(packed)}H', *packed)
+
+
+def read_header(f):
+    """
+    Reads the header of a save from a binary file object, leaving it positioned at the first move.
+
+    :return: (starting FEN, tags dict)
+    """
+    raw = f.read(HEADER.size)
+    if len(raw) < HEADER.size:
+        raise ValueError("Not a v2 save: file too short")
+    magic, version, _flags, fen_len, tags_len = HEADER.unpack(raw)
+    if magic != MAGIC:
+        raise ValueError("Not a v2 save: bad magic")
+    if version > VERSION:
+        raise ValueError(f"Save format version {version} is newer than supported ({VERSION})")
+    fen = f.read(fen_len).decode()
+    tags = json.loads(f.read(tags_len)) if tags_len else {}
+    return fen, tags
+
+
+def iter_moves(f):
+    """Streams the moves of a save from a file object positioned after the header."""
+    leftover = b""
+    while True:
+        chunk = f.read(READ_CHUNK)
+        if not chunk:
+            break
+        chunk = leftover + chunk
+        usable = len(chunk) & ~1
+        for (value,) in MOVE.iter_unpack(chunk[:usable]):
+            yield unpack_move(value)
+        leftover = chunk[usable:]  # a torn final write leaves half a move, which is ignored
+
+
+def decode_game(data):
+    """
+    Decodes an in-memory save (e.g. a record of the game database).
+
+    :return: (starting FEN, tags, list of chess.Move)
+    """
+    f = io.BytesIO(data)
+    fen, tags = read_header(f)
+    return fen, tags, list(iter_moves(f))
+
+
+def write_game(path, moves, start_fen=chess.STARTING_FEN, tags=None):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(encode_game(moves, start_fen, tags))
+    os.replace(tmp_path, path)
+
+
+def replay(start_fen, moves):
+    """
+    Replays moves from a starting position, checking every move is legal.
+
+    :return: (chess.Board, list of SAN moves)
+    """
+    board = chess.Board(start_fen)
+    san_log = []
+    for move in moves:
+        if not board.is_legal(move):
+            raise ValueError(f"Illegal move {move.uci()} at ply {len(san_log) + 1}")
+        san_log.append(board.san(move))
+        board.push(move)
+    return board, san_log
+
+
+def load_game(path):
+    """
+    Loads a v2 save by streaming its moves.
+
+    :return: (chess.Board, list of SAN moves, tags)
+    """
+    with open(path, 'rb') as f:
+        fen, tags = read_header(f)
+        board, san_log = replay(fen, iter_moves(f))
+    return board, san_log, tags
+
+
+def game_to_pgn(board, tags=None):
+    """Exports the moves on a board (from its root position) as PGN text."""
+    import chess.pgn  # only needed for export, keeps importing the save format light
+    game = chess.pgn.Game.from_board(board)
+    for name, value in (tags or {}).items():
+        game.headers[name] = str(value)
+    if board.is_game_over():
+        game.headers["Result"] = board.result()
+    return str(game) + "\n"
+
+
+"""
+Legacy JSON saves
+"""
+_archived_engine = None
+
+
+def archived_engine():
+    """Imports 00_ARCHIVE/chess_engine.py (not importable by name, the folder starts with a digit)."""
+    global _archived_engine
+    if _archived_engine is None:
+        spec = importlib.util.spec_from_file_location("archived_chess_engine", ARCHIVED_ENGINE_PATH)
+        _archived_engine = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(_archived_engine)
+    return _archived_engine
+
+
+def legacy_grid(board):
+    """The archived engine's 8x8 board of 'wP', 'bK', '--' strings for a chess.Board."""
+    grid = []
+    for row in range(8):
+        line = []
+        for col in range(8):
+            piece = board.piece_at(chess.square(col, 7 - row))
+            if piece is None:
+                line.append('--')
+            else:
+                line.append(('w' if piece.color else 'b') + piece.symbol().upper())
+        grid.append(line)
+    return grid
+
+
+def read_legacy_moves(path):
+    """
+    Reads a legacy JSON save and converts its moves with the archived Move.from_dict.
+
+    The archived engine asked for the promotion piece at the console and did not save it, so promotions
+    become queens.
+
+    :return: list of chess.Move from the starting position
+    """
+    with open(path) as f:
+        data = json.load(f)
+    Move = archived_engine().Move
+    board = chess.Board()
+    moves = []
+    for entry in data['moveData']:
+        legacy = Move.from_dict(entry, legacy_grid(board))
+        if legacy.pieceMoved != entry['pieceMoved']:
+            raise ValueError(f"{path}: ply {len(moves) + 1} moves {entry['pieceMoved']} but the board has {legacy.pieceMoved}")
+        move = chess.Move(chess.square(legacy.startCol, 7 - legacy.startRow),
+                          chess.square(legacy.endCol, 7 - legacy.endRow),
+                          promotion=chess.QUEEN if legacy.isPawnPromotion else None)
+        if not board.is_legal(move):
+            raise ValueError(f"{path}: illegal move {move.uci()} at ply {len(moves) + 1}")
+        board.push(move)
+        moves.append(move)
+    return moves
+
+
+def migrate_legacy_saves(paths, out_dir=None):
+    """
+    Converts legacy JSON saves to v2 saves next to them (or into out_dir) and reports size and load time.
+
+    :return: list of (legacy path, v2 path, legacy bytes, v2 bytes, legacy load s, v2 load s)
+    """
+    archived_engine()  # import once up front so it is not counted as load time
+    results = []
+    for path in paths:
+        start = time.perf_counter()
+        moves = read_legacy_moves(path)
+        legacy_load = time.perf_counter() - start
+
+        name = os.path.splitext(os.path.basename(path))[0] + EXTENSION
+        new_path = os.path.join(out_dir or os.path.dirname(path), name)
+        write_game(new_path, moves, tags={'Event': 'Migrated', 'Source': os.path.basename(path)})
+
+        start = time.perf_counter()
+        load_game(new_path)
+        new_load = time.perf_counter() - start
+        results.append((path, new_path, os.path.getsize(path), os.path.getsize(new_path), legacy_load, new_load))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="v2 save files: migrate legacy JSON saves, export PGN.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    migrate = commands.add_parser("migrate", help="convert legacy JSON saves to the v2 format")
+    migrate.add_argument("paths", nargs="+")
+    migrate.add_argument("--out", default=None, help="output directory (default: next to each save)")
+    pgn = commands.add_parser("pgn", help="print a v2 save as PGN")
+    pgn.add_argument("path")
+    args = parser.parse_args(argv)
+
+    if args.command == "pgn":
+        board, _, tags = load_game(args.path)
+        sys.stdout.write(game_to_pgn(board, tags))
+        return 0
+
+    if args.out:
+        os.makedirs(args.out, exist_ok=True)
+    results = migrate_legacy_saves(args.paths, args.out)
+    total_old = total_new = 0
+    for path, new_path, old_size, new_size, old_load, new_load in results:
+        total_old += old_size
+        total_new += new_size
+        print(f"{path} -> {new_path}: {old_size} -> {new_size} bytes, "
+              f"load {old_load * 1000:.2f} -> {new_load * 1000:.2f} ms")
+    if results:
+        print(f"Total: {total_old} -> {total_new} bytes ({total_old / max(total_new, 1):.1f}x smaller)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
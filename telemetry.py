@@ -0,0 +1,200 @@
+"""
+Low-overhead performance telemetry: named spans, counters and value series.
+
+Every span or observed value goes into a fixed-size ring buffer per name, so memory stays constant however
+long the game runs, and summaries (count, mean, p50/p90/p99, max) are only computed when exported or shown.
+Spans of the game loop give the frame-time breakdown; the engine wrappers record round-trip latency and the
+depth, nps and hashfull Stockfish reports. Snapshots are exported periodically as JSON lines or as a
+Prometheus text file; a JSON lines file is rotated to <path>.1 once it reaches EXPORT_MAX_BYTES, so the
+disk use is bounded too. While disabled, span() returns a shared no-op object and nothing is recorded.
+
+Usage:
+    with telemetry.span("draw.board"):
+        drawBoard(...)
+    telemetry.observe("engine.depth", info["depth"])
+    telemetry.count("moves")
+"""
+import array
+import json
+import os
+import threading
+import time
+
+
+RING_SIZE = 1024  # samples kept per series
+EXPORT_MAX_BYTES = 1 << 20  # size of a JSON lines export before it is rotated
+
+
+class Series:
+    """Ring buffer of the most recent samples of one value."""
+    __slots__ = ('values', 'size', 'index', 'total')
+
+    def __init__(self, size=RING_SIZE):
+        self.values = array.array('d', bytes(8 * size))
+        self.size = size
+        self.index = 0  # next slot to write
+        self.total = 0  # samples ever recorded
+
+    def add(self, value):
+        self.values[self.index] = value
+        self.index = (self.index + 1) % self.size
+        self.total += 1
+
+    def samples(self):
+        if self.total < self.size:
+            return self.values[:self.total].tolist()
+        return self.values.tolist()
+
+    def last(self):
+        return self.values[self.index - 1] if self.total else None
+
+    def summary(self):
+        samples = sorted(self.samples())
+        if not samples:
+            return {'count': self.total}
+        n = len(samples)
+        return {'count': self.total, 'mean': sum(samples) / n, 'p50': samples[n // 2],
+                'p90': samples[min(n - 1, int(n * 0.9))], 'p99': samples[min(n - 1, int(n * 0.99))],
+                'max': samples[-1], 'last': self.last()}
+
+
+class Span:
+    __slots__ = ('series', 'start')
+
+    def __init__(self, series):
+        self.series = series
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.series.add((time.perf_counter() - self.start) * 1000)  # milliseconds
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Telemetry:
+    def __init__(self):
+        self.enabled = False
+        self.series = {}
+        self.counters = {}
+        self.export_path = None
+        self.export_interval = 10.0
+        self.export_max_bytes = EXPORT_MAX_BYTES
+        self._last_export = time.monotonic()
+        self._lock = threading.Lock()  # spans are also recorded from worker threads
+
+    def _series(self, name):
+        series = self.series.get(name)
+        if series is None:
+            with self._lock:
+                series = self.series.setdefault(name, Series())
+        return series
+
+    def span(self, name):
+        """Context manager timing a block into the series `name` (milliseconds)."""
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self._series(name))
+
+    def observe(self, name, value):
+        if self.enabled and value is not None:
+            self._series(name).add(value)
+
+    def count(self, name, amount=1):
+        if self.enabled:
+            with self._lock:
+                self.counters[name] = self.counters.get(name, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            series = list(self.series.items())
+            counters = dict(self.counters)
+        return {'time': time.time(), 'counters': counters,
+                'series': {name: values.summary() for name, values in series}}
+
+    # Export
+    def maybe_export(self):
+        """Exports a snapshot if the export interval has passed (call once per frame)."""
+        if not self.enabled or not self.export_path:
+            return
+        now = time.monotonic()
+        if now - self._last_export >= self.export_interval:
+            self._last_export = now
+            self.export()
+
+    def export(self, path=None):
+        """Writes a snapshot: appended as a JSON line, or as a Prometheus text file for paths ending in .prom."""
+        path = path or self.export_path
+        snapshot = self.snapshot()
+        if path.endswith(".prom"):
+            tmp_path = path + ".tmp"
+            with open(tmp_path, 'w') as f:
+                f.write(prometheus_text(snapshot))
+            os.replace(tmp_path, path)  # scrapers never see a half-written file
+        else:
+            if os.path.exists(path) and os.path.getsize(path) >= self.export_max_bytes:
+                os.replace(path, path + ".1")  # keeps the previous file only: at most twice the cap on disk
+            with open(path, 'a') as f:
+                f.write(json.dumps(snapshot) + "\n")
+
+
+def prometheus_name(name):
+    return "chess_" + "".join(c if c.isalnum() else "_" for c in name)
+
+
+def prometheus_text(snapshot):
+    lines = []
+    for name, value in sorted(snapshot['counters'].items()):
+        metric = prometheus_name(name) + "_total"
+        lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+    for name, summary in sorted(snapshot['series'].items()):
+        metric = prometheus_name(name)
+        lines.append(f"# TYPE {metric} summary")
+        for quantile in ('p50', 'p90', 'p99'):
+            if quantile in summary:
+                lines.append(f'{metric}{{quantile="0.{quantile[1:]}"}} {summary[quantile]:.6g}')
+        lines.append(f"{metric}_count {summary['count']}")
+    return "\n".join(lines) + "\n"
+
+
+# the process-wide instance used by the module level helpers
+TELEMETRY = Telemetry()
+
+
+def configure(enabled=True, export_path=None, export_interval=10.0, export_max_bytes=EXPORT_MAX_BYTES):
+    TELEMETRY.enabled = enabled
+    TELEMETRY.export_path = export_path
+    TELEMETRY.export_interval = export_interval
+    TELEMETRY.export_max_bytes = export_max_bytes
+
+
+def span(name):
+    return TELEMETRY.span(name)
+
+
+def observe(name, value):
+    TELEMETRY.observe(name, value)
+
+
+def count(name, amount=1):
+    TELEMETRY.count(name, amount)
+
+
+def record_engine_info(info):
+    """Records the search statistics of an engine result (python-chess info dict)."""
+    if TELEMETRY.enabled:
+        for key in ('depth', 'nps', 'hashfull'):
+            TELEMETRY.observe("engine." + key, info.get(key))
@@ -0,0 +1,211 @@
+"""
+Variation tree for the analysis board.
+
+Every move is a node with a parent and an ordered list of children, the first child being the main
+continuation, so all variations share the moves of their common prefix. Nodes store only the move; positions
+are rebuilt on demand by replaying moves from the nearest ancestor whose board is known. Boards of recently
+used nodes are kept in an LRU of bounded size; boards at checkpoint plies (every CHECKPOINT_INTERVAL plies)
+are kept in a separate store that is never evicted, about one board per CHECKPOINT_INTERVAL nodes. A tree with
+tens of thousands of nodes thus costs a small object per node plus a fraction of the boards, and rebuilding a
+position replays at most CHECKPOINT_INTERVAL moves once its nearest checkpoint ancestor has been built.
+
+Usage:
+    tree = VariationTree.from_board(board)
+    node = tree.add(move, parent)  # returns the existing child if the move was played before
+    tree.board(node)               # position after node (without move history)
+    tree.promote(node)             # make its branch the main line
+    tree.to_pgn()                  # PGN with all variations
+"""
+import collections
+
+import chess
+
+
+CHECKPOINT_INTERVAL = 16  # plies between boards kept as rebuild starting points
+CACHE_SIZE = 256  # boards kept in the LRU
+
+
+class Node:
+    __slots__ = ('move', 'parent', 'children', 'ply')
+
+    def __init__(self, move, parent):
+        self.move = move
+        self.parent = parent
+        self.children = []
+        self.ply = parent.ply + 1 if parent is not None else 0
+
+    def __repr__(self):
+        return f"<Node {self.move} ply={self.ply}>"
+
+
+class VariationTree:
+    def __init__(self, start_fen=chess.STARTING_FEN, checkpoint_interval=CHECKPOINT_INTERVAL, cache_size=CACHE_SIZE):
+        self.start_fen = start_fen
+        self.root = Node(None, None)
+        self.current = self.root
+        self.checkpoint_interval = checkpoint_interval
+        self.cache_size = cache_size
+        self.nodes = 1
+        self._boards = collections.OrderedDict()  # node -> board after it (no move stack), LRU
+        self._checkpoints = {}  # node at a checkpoint ply -> board after it, kept until the node is removed
+
+    @classmethod
+    def from_board(cls, board, **kwargs):
+        """A tree whose main line is the game on board; the current node is its last move."""
+        tree = cls(board.root().fen(), **kwargs)
+        for move in board.move_stack:
+            tree.push(move)
+        return tree
+
+    # Building and walking
+    def add(self, move, parent=None):
+        """
+        Adds a move after parent (default: the current node). A move that already exists there is not
+        duplicated: its node is returned.
+        """
+        parent = parent or self.current
+        for child in parent.children:
+            if child.move == move:
+                return child
+        child = Node(move, parent)
+        parent.children.append(child)
+        self.nodes += 1
+        return child
+
+    def push(self, move):
+        """Adds a move after the current node and makes it current."""
+        self.current = self.add(move)
+        return self.current
+
+    def pop(self):
+        """Steps back to the parent; the branch stays in the tree."""
+        if self.current.parent is not None:
+            self.current = self.current.parent
+        return self.current
+
+    def path(self, node, ancestor=None):
+        """Moves leading from ancestor (default: the root) to node."""
+        ancestor = ancestor or self.root
+        moves = []
+        while node is not ancestor:
+            moves.append(node.move)
+            node = node.parent
+        moves.reverse()
+        return moves
+
+    def common_ancestor(self, a, b):
+        while a.ply > b.ply:
+            a = a.parent
+        while b.ply > a.ply:
+            b = b.parent
+        while a is not b:
+            a, b = a.parent, b.parent
+        return a
+
+    def mainline(self, node=None):
+        """Nodes of the main continuation after node (default: the root)."""
+        node = node or self.root
+        nodes = []
+        while node.children:
+            node = node.children[0]
+            nodes.append(node)
+        return nodes
+
+    def variations(self, node):
+        """The node and its siblings, main continuation first."""
+        return list(node.parent.children) if node.parent is not None else [node]
+
+    # Positions
+    def board(self, node=None):
+        """
+        The position after node (default: the current one), without move history: replayed from the nearest
+        cached ancestor or checkpoint. The returned board is a copy and may be modified.
+        """
+        node = node or self.current
+        moves = []
+        start = node
+        while start not in self._boards and start not in self._checkpoints and start.parent is not None:
+            moves.append(start)
+            start = start.parent
+        if start in self._boards:
+            self._boards.move_to_end(start)
+            board = self._boards[start].copy(stack=False)
+        elif start in self._checkpoints:
+            board = self._checkpoints[start].copy(stack=False)
+        else:  # the root
+            board = chess.Board(self.start_fen)
+        for step in reversed(moves):
+            board.push(step.move)
+            if step.ply % self.checkpoint_interval == 0:
+                self._checkpoints[step] = board.copy(stack=False)
+        self._remember(node, board)
+        return board.copy(stack=False)
+
+    def _remember(self, node, board):
+        if node in self._boards:
+            self._boards.move_to_end(node)
+            return
+        self._boards[node] = board.copy(stack=False)
+        if len(self._boards) > self.cache_size:
+            self._boards.popitem(last=False)
+
+    def san(self, node):
+        """The move of node in SAN."""
+        return self.board(node.parent).san(node.move)
+
+    # Editing
+    def promote(self, node=None):
+        """
+        Makes the branch containing node (default: the current one) the main line: every ancestor on the way
+        to the root becomes the first child of its parent.
+        """
+        node = node or self.current
+        while node.parent is not None:
+            siblings = node.parent.children
+            if siblings[0] is not node:
+                siblings.remove(node)
+                siblings.insert(0, node)
+            node = node.parent
+
+    def promote_once(self, node=None):
+        """Moves the variation containing node one place up among its siblings, like a PGN editor."""
+        node = node or self.current
+        while node.parent is not None and node.parent.children[0] is node:
+            node = node.parent  # find where the branch leaves the main continuation
+        if node.parent is not None:
+            siblings = node.parent.children
+            index = siblings.index(node)
+            siblings[index - 1], siblings[index] = siblings[index], siblings[index - 1]
+
+    def remove(self, node):
+        """Deletes node and everything after it. If the current node was among them, its parent becomes current."""
+        if node.parent is None:
+            raise ValueError("the root cannot be removed")
+        ancestor = self.current
+        while ancestor is not None and ancestor is not node:
+            ancestor = ancestor.parent
+        if ancestor is node:
+            self.current = node.parent
+        node.parent.children.remove(node)
+        removed = [node]
+        for removed_node in removed:  # grows while iterating: every node of the subtree
+            removed.extend(removed_node.children)
+            self._boards.pop(removed_node, None)
+            self._checkpoints.pop(removed_node, None)
+        self.nodes -= len(removed)
+
+    # Export
+    def to_pgn(self, tags=None):
+        """The whole tree as PGN text, variations included."""
+        import chess.pgn  # only needed for export
+        game = chess.pgn.Game()
+        if self.start_fen != chess.STARTING_FEN:
+            game.setup(self.start_fen)
+        for name, value in (tags or {}).items():
+            game.headers[name] = str(value)
+        stack = [(self.root, game)]  # iterative, deep lines would exceed the recursion limit
+        while stack:
+            node, game_node = stack.pop()
+            for child in node.children:
+                stack.append((child, game_node.add_variation(child.move)))
+        return str(game) + "\n"